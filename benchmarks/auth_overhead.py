@@ -0,0 +1,76 @@
+"""Benchmark the cost of authenticating a request.
+
+Every authenticated http request and websocket handshake validates a CSRF token and a user
+JWT. This times validating that pair with a full HS256 decode every time (what the auth
+decorators used to do) against `pykcworkshop.chat.tokens.validate_token` answering from its
+`TokenCache`, and then times a whole authenticated GET request through the app's test
+client with the cache disabled and enabled.
+
+The benchmark uses a throwaway SQLite file in a temporary directory, so it doesn't touch
+the application db.
+
+Run with `hatch run python benchmarks/auth_overhead.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import os
+import pathlib
+import tempfile
+import time
+
+import jwt
+
+from pykcworkshop import SubApp, async_create_app
+from pykcworkshop.chat import db, tokens
+
+ITERATIONS = 20_000
+REQUESTS = 2000
+
+
+def decode_pair(csrf_token: str, user_token: str) -> None:
+    jwt.decode(csrf_token, os.environ["JWT_SECRET"], algorithms=["HS256"])
+    jwt.decode(user_token, os.environ["JWT_SECRET"], algorithms=["HS256"])
+
+
+def validate_pair(csrf_token: str, user_token: str) -> None:
+    tokens.validate_token(csrf_token)
+    tokens.validate_token(user_token)
+
+
+async def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_uri = f"sqlite+aiosqlite:///{pathlib.Path(tmp_dir) / 'benchmark.db'}"
+        app = await async_create_app(SubApp.CHAT, chat_config={"DB_URI": db_uri})
+        await db.initialize(drop_tables=True)
+        async with db.get_session() as session:
+            user, _ = await db.create_user(session, user_name="Benchmark")
+            await session.commit()
+            assert user.token is not None
+            user_token = user.token.token
+        csrf_token = tokens.generate_csrf()
+
+        print(f"{'token validation':>24} {'us/request':>10}")
+        for name, validate in [("jwt.decode", decode_pair), ("cached", validate_pair)]:
+            start = time.perf_counter()
+            for _ in range(ITERATIONS):
+                validate(csrf_token, user_token)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>24} {elapsed / ITERATIONS * 1e6:>10.2f}")
+
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {user_token}", "X-CSRF-TOKEN": csrf_token}
+        print(f"{'GET /user/rooms/owned':>24} {'us/request':>10}")
+        for name, maxsize in [("uncached", 0), ("cached", tokens.TOKEN_CACHE_SIZE)]:
+            tokens.token_cache = tokens.TokenCache(maxsize=maxsize)
+            start = time.perf_counter()
+            for _ in range(REQUESTS):
+                res = await client.get("/chat/api/v1/user/rooms/owned", headers=headers)
+                assert res.status_code == 200
+            elapsed = time.perf_counter() - start
+            print(f"{name:>24} {elapsed / REQUESTS * 1e6:>10.2f}")
+
+
+asyncio.run(run_benchmark())
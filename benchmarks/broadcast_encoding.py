@@ -0,0 +1,79 @@
+"""Benchmark JSON encoding cost per room broadcast.
+
+Compares encoding the chat message dict once per recipient (what `send_json` does for each
+connection) against publishing a shared `Frame` through the broker, and reports the number
+of `json.dumps` calls and the time spent per broadcast for a few room sizes.
+
+Run with `hatch run python benchmarks/broadcast_encoding.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import time
+
+from pykcworkshop import json_codec, utils
+from pykcworkshop.chat.api.websockets import broker
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+ROOM_SIZES = [10, 100, 500]
+BROADCASTS = 200
+
+_real_dumps = json_codec.dumps
+_encode_calls = 0
+
+
+def _counting_dumps(*args, **kwargs):
+    global _encode_calls
+    _encode_calls += 1
+    return _real_dumps(*args, **kwargs)
+
+
+json_codec.dumps = _counting_dumps
+
+
+def _message(i: int) -> dict:
+    return {
+        "user_name": "Testy",
+        "content": f"Message number {i} with a little bit of realistic chat content.",
+        "timestamp": utils.now().isoformat(),
+    }
+
+
+def per_recipient(room_size: int) -> tuple[float, float]:
+    """Encode the message dict separately for every recipient."""
+
+    global _encode_calls
+    _encode_calls = 0
+    start = time.perf_counter()
+    for i in range(BROADCASTS):
+        message = _message(i)
+        for _ in range(room_size):
+            _counting_dumps(message)
+    elapsed = time.perf_counter() - start
+    return _encode_calls / BROADCASTS, elapsed / BROADCASTS
+
+
+def serialize_once(room_size: int) -> tuple[float, float]:
+    """Publish a shared `Frame` through the broker and read `data` for every recipient."""
+
+    global _encode_calls
+    _encode_calls = 0
+    room_broker = broker.Broker("benchmark")
+    subscribers = [broker.Subscriber() for _ in range(room_size)]
+    for subscriber in subscribers:
+        room_broker.subscribe("room", subscriber)
+    start = time.perf_counter()
+    for i in range(BROADCASTS):
+        room_broker.publish("room", Frame(_message(i)))
+        for subscriber in subscribers:
+            subscriber.queue.get_nowait().data
+    elapsed = time.perf_counter() - start
+    return _encode_calls / BROADCASTS, elapsed / BROADCASTS
+
+
+print(f"{'room size':>10} {'strategy':>16} {'encodes/broadcast':>18} {'us/broadcast':>13}")
+for room_size in ROOM_SIZES:
+    for name, strategy in [("per-recipient", per_recipient), ("serialize-once", serialize_once)]:
+        calls, seconds = strategy(room_size)
+        print(f"{room_size:>10} {name:>16} {calls:>18.1f} {seconds * 1e6:>13.1f}")
@@ -0,0 +1,83 @@
+"""Benchmark chat message persistence throughput.
+
+Simulates many websocket connections sending chat messages at once and compares committing
+each message in its own transaction (what the chat message socket used to do) against
+buffering the messages with `pykcworkshop.chat.db.writer.ChatMessageWriter`. Reports the
+number of messages persisted per second and the number of commits for each strategy.
+
+The benchmark uses a throwaway SQLite file in a temporary directory, so it doesn't touch
+the application db.
+
+Run with `hatch run python benchmarks/chat_message_persistence.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import pathlib
+import tempfile
+import time
+
+from pykcworkshop import utils
+from pykcworkshop.chat import db
+
+CONNECTIONS = 50
+MESSAGES_PER_CONNECTION = 100
+
+
+async def per_message_commit(author_id: int, room_id: str) -> int:
+    """Commit every message in its own transaction."""
+
+    async def _connection(n: int) -> None:
+        for i in range(MESSAGES_PER_CONNECTION):
+            async with db.get_session() as session:
+                await db.create_chat_message(
+                    session, author_id=author_id, room_id=room_id, content=f"{n}:{i}"
+                )
+                await session.commit()
+
+    await asyncio.gather(*[asyncio.create_task(_connection(n)) for n in range(CONNECTIONS)])
+    return CONNECTIONS * MESSAGES_PER_CONNECTION
+
+
+async def write_behind(author_id: int, room_id: str) -> int:
+    """Buffer every message with a `ChatMessageWriter` and flush them in batches."""
+
+    writer = db.writer.ChatMessageWriter()
+
+    async def _connection(n: int) -> None:
+        for i in range(MESSAGES_PER_CONNECTION):
+            await writer.submit(
+                author_id=author_id, room_id=room_id, content=f"{n}:{i}", timestamp=utils.now()
+            )
+            await asyncio.sleep(0)  # Yield like a handler waiting on the next frame.
+
+    await asyncio.gather(*[asyncio.create_task(_connection(n)) for n in range(CONNECTIONS)])
+    await writer.stop()
+    return writer.batches_written
+
+
+async def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db.connect(f"sqlite+aiosqlite:///{pathlib.Path(tmp_dir) / 'benchmark.db'}")
+        await db.initialize(drop_tables=True)
+        async with db.get_session() as session:
+            user, _ = await db.create_user(session, user_name="Benchmark")
+            room = await db.create_room(session, room_name="Benchmark", creator_id=user.id)
+            await session.commit()
+
+        total = CONNECTIONS * MESSAGES_PER_CONNECTION
+        print(f"{total} messages from {CONNECTIONS} concurrent connections")
+        print(f"{'strategy':>20} {'commits':>8} {'msgs/sec':>10}")
+        for name, strategy in [
+            ("per-message commit", per_message_commit),
+            ("write-behind", write_behind),
+        ]:
+            start = time.perf_counter()
+            commits = await strategy(user.id, room.id)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>20} {commits:>8} {total / elapsed:>10.0f}")
+
+
+asyncio.run(run_benchmark())
@@ -0,0 +1,135 @@
+"""Benchmark chat history page latency by depth in a very large room.
+
+Fills one room with millions of messages, where every `TIED` consecutive messages share a
+timestamp like a batch import would produce, and then times fetching one page at
+increasing depths with the keyset pagination of
+`pykcworkshop.chat.db.get_chat_history_page` against the same page fetched with OFFSET.
+Keyset pages are an index range scan from the cursor, so their latency should stay flat no
+matter how deep the page is, while OFFSET pages get slower the deeper they are.
+
+The benchmark uses a throwaway SQLite file in a temporary directory, so it doesn't touch
+the application db. Filling it takes a while, so the number of rows can be passed as the
+first argument.
+
+Run with `hatch run python benchmarks/history_pagination.py [rows]`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import datetime
+import pathlib
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert, select, text
+
+from pykcworkshop.chat import db
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+TIED = 10
+BATCH = 50_000
+PAGE_SIZE = 50
+REPEATS = 20
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC)
+
+
+async def fill(author_id: int, room_id: str) -> None:
+    for offset in range(0, ROWS, BATCH):
+        rows = [
+            {
+                "author_id": author_id,
+                "room_id": room_id,
+                "content": f"Message {i} with a little bit of realistic chat content.",
+                "timestamp": START + datetime.timedelta(seconds=i // TIED),
+            }
+            for i in range(offset, min(offset + BATCH, ROWS))
+        ]
+        async with db.get_session() as session:
+            await session.execute(insert(db.models.ChatMessage), rows)
+            await session.commit()
+        print(f"\rInserted {offset + len(rows)}/{ROWS} messages", end="", flush=True)
+    print()
+
+
+async def key_at(room_id: str, depth: int) -> tuple[datetime.datetime, int]:
+    """Return the (timestamp, id) key of the message `depth` messages from the newest."""
+
+    message = db.models.ChatMessage
+    stmt = (
+        select(message.timestamp, message.id)
+        .where(message.room_id == room_id)
+        .order_by(message.timestamp.desc(), message.id.desc())
+        .offset(depth)
+        .limit(1)
+    )
+    async with db.get_session() as session:
+        timestamp, message_id = (await session.execute(stmt)).one()
+    return timestamp, message_id
+
+
+async def keyset_page(room_id: str, depth: int) -> float:
+    after = await key_at(room_id, depth - 1) if depth else None
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        async with db.get_session() as session:
+            rows = await db.get_chat_history_page(
+                session, room_id=room_id, after=after, limit=PAGE_SIZE
+            )
+    assert len(rows) == PAGE_SIZE
+    return (time.perf_counter() - start) / REPEATS
+
+
+async def offset_page(room_id: str, depth: int) -> float:
+    message = db.models.ChatMessage
+    stmt = (
+        select(db.models.User.name, message.content, message.timestamp)
+        .join(db.models.User, message.author_id == db.models.User.id)
+        .where(message.room_id == room_id)
+        .order_by(message.timestamp.desc(), message.id.desc())
+        .offset(depth)
+        .limit(PAGE_SIZE)
+    )
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        async with db.get_session() as session:
+            rows = (await session.execute(stmt)).all()
+    assert len(rows) == PAGE_SIZE
+    return (time.perf_counter() - start) / REPEATS
+
+
+async def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db.connect(f"sqlite+aiosqlite:///{pathlib.Path(tmp_dir) / 'benchmark.db'}")
+        await db.initialize(drop_tables=True)
+        async with db.get_session() as session:
+            user, _ = await db.create_user(session, user_name="Benchmark")
+            room = await db.create_room(session, room_name="Benchmark", creator_id=user.id)
+            await session.commit()
+        await fill(user.id, room.id)
+
+        async with db.get_session() as session:
+            after = await key_at(room.id, ROWS // 2)
+            explained = await session.execute(
+                text(
+                    "EXPLAIN QUERY PLAN SELECT id FROM chat_message WHERE room_id = :room_id"
+                    " AND (timestamp, id) < (:timestamp, :id)"
+                    " ORDER BY timestamp DESC, id DESC LIMIT 50"
+                ),
+                {"room_id": room.id, "timestamp": after[0].replace(tzinfo=None), "id": after[1]},
+            )
+            print("Keyset query plan:", *[row[-1] for row in explained], sep="\n  ")
+
+        print(f"{ROWS} messages, {PAGE_SIZE} per page")
+        print(f"{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+        depth = 0
+        while depth < ROWS - PAGE_SIZE:
+            keyset = await keyset_page(room.id, depth)
+            offset = await offset_page(room.id, depth)
+            print(f"{depth:>10} {keyset * 1000:>10.2f} {offset * 1000:>10.2f}")
+            depth = depth * 10 if depth else 1000
+
+
+asyncio.run(run_benchmark())
@@ -0,0 +1,86 @@
+"""Benchmark the JSON codecs of `pykcworkshop.json_codec` on realistic payloads.
+
+Encodes and decodes chat history chunks, as sent by the chat-history socket, and room member
+lists, as returned by the room members route, with every installed codec, and also times
+building the members response through the app's Quart JSON provider. Reports the time per
+payload for each codec.
+
+Run with `hatch run python benchmarks/json_codec.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import datetime
+import pathlib
+import random
+import tempfile
+import time
+from typing import Any, Callable
+
+from pykcworkshop import SubApp, async_create_app, json_codec, utils
+
+ITERATIONS = 2000
+USER_NAMES = ["Testy", "Testier", "Testiest", "Some Longer User Name", "Ümlaut Üser"]
+WORDS = "the quick brown fox jumps over lazy dogs while chatting about websockets".split()
+
+random.seed(0)
+
+
+def _history(chunk_size: int) -> list[dict]:
+    start = utils.now()
+    return [
+        {
+            "user_name": random.choice(USER_NAMES),
+            "content": " ".join(random.choices(WORDS, k=random.randint(2, 40))),
+            "timestamp": (start - datetime.timedelta(seconds=i * 7)).isoformat(),
+        }
+        for i in range(chunk_size)
+    ]
+
+
+def _members(count: int) -> list[dict]:
+    return [{"id": i, "name": f"{random.choice(USER_NAMES)} {i}"} for i in range(count)]
+
+
+def _time(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+async def run_benchmark():
+    codecs = [json_codec.choose_codec("stdlib")]
+    try:
+        codecs.append(json_codec.choose_codec("orjson"))
+    except ValueError:
+        print("orjson isn't installed, only the stdlib codec is benchmarked")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_uri = f"sqlite+aiosqlite:///{pathlib.Path(tmp_dir) / 'benchmark.db'}"
+        app = await async_create_app(SubApp.CHAT, chat_config={"DB_URI": db_uri})
+
+    payloads = [
+        ("history x50", _history(50)),
+        ("history x300", _history(300)),
+        ("members x50", {"members": _members(50)}),
+        ("members x1000", {"members": _members(1000)}),
+    ]
+    print(f"{'payload':>14} {'codec':>8} {'encode us':>10} {'decode us':>10} {'jsonify us':>11}")
+    for name, payload in payloads:
+        for codec in codecs:
+            json_codec.set_codec(codec)
+            encoded = json_codec.dumps(payload)
+            encode = _time(lambda: json_codec.dumps(payload))
+            decode = _time(lambda: json_codec.loads(encoded))
+            async with app.app_context():
+                jsonify = _time(lambda: app.json.response(payload))
+            print(
+                f"{name:>14} {codec.name:>8} {encode * 1e6:>10.1f} {decode * 1e6:>10.1f}"
+                f" {jsonify * 1e6:>11.1f}"
+            )
+
+
+asyncio.run(run_benchmark())
@@ -0,0 +1,69 @@
+"""Benchmark how much a burst of logins stalls the event loop.
+
+Runs a burst of Argon2 password verifications, like a wave of users logging in at once,
+while a ticker task measures how late the event loop wakes it up, which is how late every
+chat message would be delivered during the burst. Compares verifying on the event loop
+(what the login route used to do) against `pykcworkshop.chat.tokens.PasswordHashPool`.
+
+Run with `hatch run python benchmarks/login_burst.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from pykcworkshop.chat import tokens
+
+LOGINS = 20
+TICK = 0.005
+
+PASSWORD_HASH = tokens.pw_hasher().hash("password")
+
+
+async def on_loop() -> None:
+    tokens.pw_hasher().verify(PASSWORD_HASH, "password")
+
+
+async def measure(verify: Callable[[], Awaitable[None]]) -> tuple[float, float]:
+    """Return the duration of the burst and the worst event loop lag during it."""
+
+    lag = 0.0
+
+    async def tick():
+        nonlocal lag
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lag = max(lag, time.perf_counter() - start - TICK)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(TICK)
+    start = time.perf_counter()
+    await asyncio.gather(*[verify() for _ in range(LOGINS)])
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(TICK * 2)  # Let the ticker see the last stall.
+    ticker.cancel()
+    return elapsed, lag
+
+
+async def run_benchmark():
+    print(f"{LOGINS} concurrent logins")
+    print(f"{'strategy':>16} {'burst ms':>9} {'max lag ms':>11}")
+    thread_pool = tokens.PasswordHashPool()
+    process_pool = tokens.PasswordHashPool(processes=True)
+    for name, verify in [
+        ("event loop", on_loop),
+        ("thread pool", lambda: thread_pool.verify(PASSWORD_HASH, "password")),
+        ("process pool", lambda: process_pool.verify(PASSWORD_HASH, "password")),
+    ]:
+        elapsed, lag = await measure(verify)
+        print(f"{name:>16} {elapsed * 1000:>9.1f} {lag * 1000:>11.1f}")
+    print(f"thread pool mean queue wait: {thread_pool.queue_wait_total / LOGINS * 1000:.1f} ms")
+    thread_pool.shutdown()
+    process_pool.shutdown()
+
+
+asyncio.run(run_benchmark())
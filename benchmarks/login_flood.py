@@ -0,0 +1,111 @@
+"""Benchmark a flood of logins against the admission queue.
+
+Sends a flood of login requests from a few clients through the app's test client while a
+ticker task measures how late the event loop wakes it up, which is how late chat messages
+would be delivered during the flood. Compares an effectively unbounded admission queue
+(every login waits for the hash pool, as before admission control) against the default
+`pykcworkshop.chat.api.http.admission.AdmissionQueue`, and reports the login latency of the
+requests that got an answer and how many were accepted, queued, and shed.
+
+The benchmark uses a throwaway SQLite file in a temporary directory, so it doesn't touch
+the application db.
+
+Run with `hatch run python benchmarks/login_flood.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import asyncio
+import pathlib
+import statistics
+import tempfile
+import time
+
+from pykcworkshop import SubApp, async_create_app
+from pykcworkshop.chat import db, tokens
+from pykcworkshop.chat.api.http import admission
+
+CLIENTS = 10
+REQUESTS_PER_CLIENT = 20
+INTERVAL = 0.02
+TICK = 0.005
+
+
+async def flood(client, password: str) -> tuple[list[float], dict[int, int], float]:
+    """Return the latency of every login, the count of each status, and the worst event
+    loop lag during the flood."""
+
+    lag = 0.0
+
+    async def tick():
+        nonlocal lag
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lag = max(lag, time.perf_counter() - start - TICK)
+
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    headers = {"X-CSRF-TOKEN": tokens.generate_csrf()}
+
+    async def login(address: str) -> None:
+        start = time.perf_counter()
+        res = await client.post(
+            "/chat/api/v1/user/login",
+            json={"user_hash": password},
+            headers=headers,
+            scope_base={"client": (address, 1234)},
+        )
+        latencies.append(time.perf_counter() - start)
+        statuses[res.status_code] = statuses.get(res.status_code, 0) + 1
+
+    async def client_flood(address: str) -> None:
+        # Fire requests at a fixed rate without waiting for the answers, like a flood does.
+        requests = []
+        for _ in range(REQUESTS_PER_CLIENT):
+            requests.append(asyncio.create_task(login(address)))
+            await asyncio.sleep(INTERVAL)
+        await asyncio.gather(*requests)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.gather(*[client_flood(f"10.0.0.{n}") for n in range(CLIENTS)])
+    await asyncio.sleep(TICK * 2)  # Let the ticker see the last stall.
+    ticker.cancel()
+    return latencies, statuses, lag
+
+
+async def run_benchmark():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_uri = f"sqlite+aiosqlite:///{pathlib.Path(tmp_dir) / 'benchmark.db'}"
+        app = await async_create_app(SubApp.CHAT, chat_config={"DB_URI": db_uri})
+        await db.initialize(drop_tables=True)
+        async with db.get_session() as session:
+            _, password = await db.create_user(session, user_name="Benchmark")
+            await session.commit()
+        client = app.test_client()
+        capacity = admission.queue.capacity
+
+        print(
+            f"{CLIENTS * REQUESTS_PER_CLIENT} logins from {CLIENTS} clients, "
+            f"each sending one every {INTERVAL * 1000:.0f} ms"
+        )
+        print(
+            f"{'queue':>10} {'p50 ms':>8} {'max ms':>8} {'max lag ms':>11} "
+            f"{'accepted':>9} {'queued':>7} {'shed':>5}  statuses"
+        )
+        for name, queue in [
+            ("unbounded", admission.AdmissionQueue(capacity, 10**6, 10**6, 10**6)),
+            ("default", admission.AdmissionQueue(capacity)),
+        ]:
+            admission.queue = queue
+            latencies, statuses, lag = await flood(client, password)
+            print(
+                f"{name:>10} {statistics.median(latencies) * 1000:>8.0f} "
+                f"{max(latencies) * 1000:>8.0f} {lag * 1000:>11.1f} "
+                f"{queue.accepted:>9} {queue.queued:>7} {queue.shed:>5}  {statuses}"
+            )
+        tokens.get_hash_pool().shutdown()
+
+
+asyncio.run(run_benchmark())
@@ -0,0 +1,95 @@
+"""Benchmark the JSON and compact binary encodings of websocket frames.
+
+Encodes realistic chat history chunks, chat messages, and member-status snapshots with both
+encodings and reports the size on the wire and the time to encode and decode each frame.
+The compact encoding is described in `pykcworkshop.chat.api.websockets.compact`.
+
+Run with `hatch run python benchmarks/wire_encoding.py`.
+"""
+
+if __name__ != "__main__":
+    raise ImportError("Standalone script cannot be imported!")
+
+import datetime
+import json
+import random
+import time
+from typing import Any, Callable
+
+from pykcworkshop import utils
+from pykcworkshop.chat.api.websockets import compact
+
+ITERATIONS = 2000
+USER_NAMES = ["Testy", "Testier", "Testiest", "Some Longer User Name", "Ümlaut Üser"]
+WORDS = "the quick brown fox jumps over lazy dogs while chatting about websockets".split()
+
+random.seed(0)
+
+
+def _message(timestamp: datetime.datetime) -> dict:
+    content = " ".join(random.choices(WORDS, k=random.randint(2, 40)))
+    return {
+        "user_name": random.choice(USER_NAMES),
+        "content": content,
+        "timestamp": timestamp.isoformat(),
+    }
+
+
+def _history(chunk_size: int) -> list[dict]:
+    start = utils.now()
+    return [_message(start - datetime.timedelta(seconds=i * 7)) for i in range(chunk_size)]
+
+
+def _snapshot(members: int) -> list[dict]:
+    return [
+        {
+            "user_id": i,
+            "user_name": f"{random.choice(USER_NAMES)} {i}",
+            "user_status": random.choice(["Online", "Away", "Typing..."]),
+            "last_changed": utils.now().isoformat(),
+        }
+        for i in range(members)
+    ]
+
+
+def _time(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+CASES: list[tuple[str, Any, compact.Encoder]] = [
+    ("chat message", _message(utils.now()), compact.encode_chat_message),
+    ("history x10", _history(10), compact.encode_chat_history),
+    ("history x50", _history(50), compact.encode_chat_history),
+    ("history x100", _history(100), compact.encode_chat_history),
+    ("snapshot x50", _snapshot(50), compact.encode_member_status),
+]
+
+print(
+    f"{'frame':>14} {'encoding':>9} {'bytes':>8} {'ratio':>6} "
+    f"{'encode us':>10} {'decode us':>10}"
+)
+for name, payload, encoder in CASES:
+    as_json = json.dumps(payload).encode()
+    as_compact = encoder(payload)
+    rows = [
+        (
+            "json",
+            len(as_json),
+            _time(lambda: json.dumps(payload)),
+            _time(lambda: json.loads(as_json)),
+        ),
+        (
+            "compact",
+            len(as_compact),
+            _time(lambda: encoder(payload)),
+            _time(lambda: compact.decode(as_compact)),
+        ),
+    ]
+    for encoding, size, encode_time, decode_time in rows:
+        print(
+            f"{name:>14} {encoding:>9} {size:>8} {size / len(as_json):>6.2f} "
+            f"{encode_time * 1e6:>10.1f} {decode_time * 1e6:>10.1f}"
+        )
@@ -15,6 +15,11 @@ envlines = [
     f"QUART_SECRET={secrets.token_hex(16)}",
     "SITE_ROOT=http://localhost:8000",
     "LOG_LEVEL=DEBUG",
+    "BROKER_BACKEND=local",
+    "HASH_POOL=thread",
+    "HASH_WORKERS=2",
+    "FORM_VALIDATION_DEBOUNCE=0",
+    "JSON_CODEC=auto",
 ]
 serverlines = [
     '# certfile = "certs/pykcworkshop.pem"',
@@ -7,7 +7,7 @@ from typing import Any
 import dotenv
 from quart import Quart, Response, jsonify
 
-from . import chat, logs, utils  # noqa: F401
+from . import chat, json_codec, logs, utils  # noqa: F401
 
 __version__ = "0.0.1"
 
@@ -38,13 +38,59 @@ async def init_chat(app: Quart, custom_config: dict[str, Any] = {}) -> None:
     async def cleanup_sqlalchemy_session(exception=None):
         await chat.db.get_session_proxy().remove()
 
+    # Setup the websocket broker backend. The unix relay is needed to run multiple workers.
+    broker = chat.api.websockets.broker
+    broker_backend = custom_config.get("BROKER_BACKEND", os.environ.get("BROKER_BACKEND", "local"))
+    if broker_backend == "unix":
+        relay_path = custom_config.get(
+            "BROKER_RELAY_PATH",
+            os.environ.get("BROKER_RELAY_PATH", f"{app.instance_path}/broker.sock"),
+        )
+        broker.set_backend(chat.api.websockets.relay.UnixSocketRelay(relay_path))
+    elif broker_backend != "local":
+        raise ValueError(f"Unknown broker backend: {broker_backend}")
+
+    # Argon2 runs on a bounded worker pool so that logins don't block the event loop.
+    hash_pool = custom_config.get("HASH_POOL", os.environ.get("HASH_POOL", "thread"))
+    if hash_pool not in ("thread", "process"):
+        raise ValueError(f"Unknown hash pool: {hash_pool}")
+    hash_workers = custom_config.get("HASH_WORKERS", os.environ.get("HASH_WORKERS"))
+    pool = chat.tokens.PasswordHashPool(
+        workers=int(hash_workers) if hash_workers else chat.tokens.HASH_WORKERS,
+        processes=hash_pool == "process",
+    )
+    chat.tokens.set_hash_pool(pool)
+    # Only admit as many logins and sign-ups at once as the pool can hash.
+    chat.api.http.admission.queue.capacity = pool.workers
+
+    # Form validation waits this many seconds per round to skip forms superseded meanwhile.
+    debounce = custom_config.get(
+        "FORM_VALIDATION_DEBOUNCE", os.environ.get("FORM_VALIDATION_DEBOUNCE", "0")
+    )
+    chat.api.websockets.channels.FORM_VALIDATION_DEBOUNCE = float(debounce)
+
+    @app.before_serving
+    async def start_background_tasks():
+        await broker.get_backend().start()
+        await chat.db.get_message_writer().start()
+
+    @app.after_serving
+    async def stop_background_tasks():
+        await broker.get_backend().stop()
+        await chat.db.get_message_writer().stop()  # Flush buffered chat messages.
+        chat.tokens.get_hash_pool().shutdown()
+
 
 async def async_create_app(
     enabled_subapps: int = ALL_SUBAPPS, **subapp_configs: dict[str, Any]
 ) -> Quart:
     """Quart application factory."""
 
+    # Every response, websocket frame, and log line is JSON, so use the fastest codec we can.
+    json_codec.set_codec(json_codec.choose_codec(os.environ.get("JSON_CODEC", "auto")))
+
     app = Quart(__name__, instance_relative_config=True)
+    app.json = json_codec.CodecJSONProvider(app)
 
     Path(app.instance_path).mkdir(parents=True, exist_ok=True)
 
@@ -57,6 +103,12 @@ async def async_create_app(
         }
     )
 
+    # Logs are written on a background thread while serving. Registered before any sub-app so
+    # that it starts first.
+    @app.before_serving
+    async def start_log_writer():
+        logs.writer.start()
+
     @app.route("/coffee", methods=["GET"])
     async def coffee() -> Response:
         """Endpoint that returns a status 418 response for compliance
@@ -88,6 +140,11 @@ This endpoint is maintained for compliance with the HTCPCP/1.0 standard as defin
     if SubApp.CHAT & enabled_subapps:
         await init_chat(app, subapp_configs.get("chat_config", {}))
 
+    # Registered after every sub-app so that it stops last, after their final logs.
+    @app.after_serving
+    async def stop_log_writer():
+        await asyncio.to_thread(logs.writer.stop)
+
     return app
 
 
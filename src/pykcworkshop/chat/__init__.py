@@ -2,7 +2,7 @@
 
 from quart import Blueprint, render_template
 
-from . import api, db, tokens  # noqa: F401
+from . import api, db, membership, names, presence, tokens  # noqa: F401
 
 bp = Blueprint(
     "chat",
@@ -2,7 +2,7 @@
 
 from quart import Blueprint
 
-from . import helpers, v1  # noqa: F401
+from . import admission, helpers, v1  # noqa: F401
 
 bp = Blueprint("http", __name__)
 """This blueprint contains all http-based routes for the api."""
@@ -0,0 +1,179 @@
+"""Admission control for the http routes that hash or verify a password with Argon2.
+
+Each login or sign-up costs a 12 MB Argon2 run, so a flood of them is a cheap way to use up
+the CPU the chat sockets need. The `AdmissionQueue` lets at most `capacity` of these
+requests run at once, which is the size of the hash pool, and holds a bounded number of
+others in a queue that is served round-robin by client, so a single client flooding the
+route can't starve everyone else. Requests beyond the limits are shed straight away with a
+429 response if the client already has too many requests queued, or a 503 response if the
+queue is full or the request waited too long, both with a `Retry-After` header.
+
+Clients are told apart by the remote address of the request. Behind a reverse proxy, the
+proxy has to be configured to pass the client address on.
+"""
+
+import asyncio
+import collections
+import contextlib
+import math
+import time
+from typing import AsyncIterator
+
+from pykcworkshop.chat import tokens
+
+MAX_QUEUED: int = 32
+"""The number of requests that can wait for admission at once."""
+
+MAX_QUEUED_PER_CLIENT: int = 2
+"""The number of requests a single client can have waiting for admission at once."""
+
+MAX_WAIT: float = 5.0
+"""The number of seconds a request waits for admission before it is shed."""
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of being admitted.
+
+    Args:
+        status:
+            429 if the client has too many requests waiting, 503 if the server does.
+        retry_after:
+            The number of seconds the client should wait before retrying.
+    """
+
+    def __init__(self, status: int, retry_after: int) -> None:
+        super().__init__(f"Shed with status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionQueue:
+    """A bounded, per-client fair queue in front of a limited number of request slots."""
+
+    def __init__(
+        self,
+        capacity: int = tokens.HASH_WORKERS,
+        max_queued: int = MAX_QUEUED,
+        max_queued_per_client: int = MAX_QUEUED_PER_CLIENT,
+        max_wait: float = MAX_WAIT,
+    ) -> None:
+        self.capacity = capacity
+        """The number of requests that run at once."""
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiting = 0
+        self._clients: collections.OrderedDict[str, collections.deque[asyncio.Future[None]]] = (
+            collections.OrderedDict()
+        )
+        self._service_time = 0.05
+        """A moving average of the number of seconds an admitted request runs for."""
+        self.accepted = 0
+        """The number of requests admitted without waiting."""
+        self.queued = 0
+        """The number of requests admitted after waiting in the queue."""
+        self.shed = 0
+        """The number of requests turned away."""
+
+    @property
+    def depth(self) -> int:
+        """The number of requests currently waiting for admission."""
+
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Estimate the number of seconds until the queue has room again."""
+
+        backlog = (self._active + self._waiting) / max(self.capacity, 1)
+        return max(1, math.ceil(backlog * self._service_time))
+
+    async def acquire(self, client: str) -> None:
+        """Wait until a request from `client` is admitted.
+
+        Every call that returns MUST be followed by a call to `release`.
+
+        Raises:
+            Overloaded:
+                If the request is shed instead.
+        """
+
+        if self._active < self.capacity and not self._waiting:
+            self._active += 1
+            self.accepted += 1
+            return
+        waiters = self._clients.get(client)
+        if waiters is not None and len(waiters) >= self.max_queued_per_client:
+            self.shed += 1
+            raise Overloaded(429, self.retry_after())
+        if self._waiting >= self.max_queued:
+            self.shed += 1
+            raise Overloaded(503, self.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        self._clients.setdefault(client, collections.deque()).append(future)
+        self._waiting += 1
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the request gave up on it.
+                self.release()
+            else:
+                self._forget(client, future)
+            if isinstance(e, TimeoutError):
+                self.shed += 1
+                raise Overloaded(503, self.retry_after())
+            raise
+        self.queued += 1
+
+    def release(self, elapsed: float | None = None) -> None:
+        """Free the slot of an admitted request that ran for `elapsed` seconds, handing it to
+        the next client in line."""
+
+        if elapsed is not None:
+            self._service_time += (elapsed - self._service_time) * 0.2
+        while self._clients:
+            client, waiters = next(iter(self._clients.items()))
+            future = waiters.popleft()
+            self._waiting -= 1
+            if waiters:
+                self._clients.move_to_end(client)
+            else:
+                del self._clients[client]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @contextlib.asynccontextmanager
+    async def admit(self, client: str) -> AsyncIterator[None]:
+        """Hold a slot for a request from `client` for the duration of the block.
+
+        Raises:
+            Overloaded:
+                On entry, if the request is shed instead.
+        """
+
+        await self.acquire(client)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def _forget(self, client: str, future: asyncio.Future[None]) -> None:
+        waiters = self._clients.get(client)
+        if waiters is None or future not in waiters:
+            return
+        waiters.remove(future)
+        self._waiting -= 1
+        if not waiters:
+            del self._clients[client]
+
+
+queue = AdmissionQueue()
+"""The admission queue shared by the login and sign-up routes of this process.
+
+Its `capacity` is set to the size of the hash pool when the app is created.
+"""
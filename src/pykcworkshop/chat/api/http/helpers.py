@@ -8,6 +8,7 @@ from quart import Response, jsonify, request
 
 from pykcworkshop import logs
 from pykcworkshop.chat import tokens
+from pykcworkshop.chat.api.http import admission
 
 logger = logs.make_logger("http")
 
@@ -49,6 +50,27 @@ def unauthorized() -> Response:
     return Response("401 UNAUTHORIZED", status=401)
 
 
+def forbidden() -> Response:
+    """Helper function to construct a status 403 error response with no debugging details.
+
+    Used when the user is authenticated but isn't allowed to access the resource.
+    """
+
+    return Response("403 FORBIDDEN", status=403)
+
+
+def shed(err: admission.Overloaded) -> Response:
+    """Helper function to construct the 429 or 503 response for a request that was shed by
+    an admission queue, with a `Retry-After` header and no debugging details."""
+
+    logs.debug(
+        logger,
+        {"msg": "Shed request", "status": err.status, "queue_depth": admission.queue.depth},
+    )
+    status = "429 TOO MANY REQUESTS" if err.status == 429 else "503 SERVICE UNAVAILABLE"
+    return Response(status, status=err.status, headers={"Retry-After": str(err.retry_after)})
+
+
 def validate_required_fields(data: dict | None, required_fields: list[str]) -> Response | None:
     """Checks that the `data` dictionary contains the `required_fields` and returns
     a 400 response with appropriate error information if not.
@@ -135,3 +157,21 @@ def auth_required(
         return _wrapper
 
     return _decorator
+
+
+def admission_controlled(func: Callable[P, Awaitable[Any]]) -> Callable[P, Awaitable[Any]]:
+    """Decorator for http routes that are expensive enough to need admission control, which
+    runs the route through `pykcworkshop.chat.api.http.admission.queue`.
+
+    Requests that are shed get a 429 or 503 response without running the route.
+    """
+
+    @functools.wraps(func)
+    async def _wrapper(*args: P.args, **kwargs: P.kwargs) -> Response | Awaitable[Any]:
+        try:
+            async with admission.queue.admit(request.remote_addr or ""):
+                return await func(*args, **kwargs)
+        except admission.Overloaded as e:
+            return shed(e)
+
+    return _wrapper
@@ -4,12 +4,12 @@ from __future__ import annotations
 
 import jwt
 from quart import Blueprint, Response, jsonify, request
-from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError, NoResultFound
 
 from pykcworkshop import logs
-from pykcworkshop.chat import db, tokens
-from pykcworkshop.chat.api.http import helpers
+from pykcworkshop.chat import db, membership, names, presence, tokens
+from pykcworkshop.chat.api.http import admission, helpers
+from pykcworkshop.chat.api.websockets import history
 from pykcworkshop.chat.types import UserData
 
 bp = Blueprint("v1-http", __name__, url_prefix="/v1")
@@ -19,11 +19,23 @@ bp = Blueprint("v1-http", __name__, url_prefix="/v1")
 @bp.route("/user/login", methods=["POST"])
 async def user_login() -> Response:
     """Validate a user token and authenticate the client session.
-    Returns the name, id, and full base64 JWT for the authenticated user.
+    Returns the name, id, and full base64 JWT for the authenticated user, and a
+    `resume_token` for logging in again cheaply.
 
     POST body required fields:
         `user_hash`: `str`
 
+    POST body optional fields:
+        `resume_token`: `str`
+
+    Verifying the `user_hash` with Argon2 is deliberately expensive, so it goes through the
+    admission queue and can be answered with a 429 or 503 response under load. A browser
+    that sends back the `resume_token` from an earlier login together with the same
+    `user_hash` skips the Argon2 verification until the resume token expires, which is
+    after `pykcworkshop.chat.tokens.RESUME_TOKEN_LIFETIME`. The response carries the same
+    resume token in that case, so logging in again never extends its lifetime. An invalid
+    or expired resume token is ignored, and the `user_hash` is verified as usual.
+
     Note:
         Currently, the raw base64 JWT is returned in the `user_token` field of the
         response body, but this may change at any time, so the frontend should not
@@ -45,22 +57,34 @@ async def user_login() -> Response:
     try:
         password, user_id = tokens.parse_login_hash(user_hash)
         async with db.get_session() as session:
-            user = await db.get_user_by_id(session, user_id)
+            user = await db.get_user_by_id(session, user_id, with_token=True)
         # token column is optional in db. All current users should have a token, but
         # it's possible we could get one without, so we assert to break the try block
         # if we can't validate the login.
         assert user.token is not None
-        tokens.pw_hasher().verify(user.token.password_hash, password)
+        password_hash = user.token.password_hash
+        resume_token = body.get("resume_token")
+        if (
+            not isinstance(resume_token, str)
+            or user.token.is_revoked
+            or not tokens.check_resume_token(resume_token, user_hash, password_hash)
+        ):
+            async with admission.queue.admit(request.remote_addr or ""):
+                await tokens.get_hash_pool().verify(password_hash, password)
+            resume_token = tokens.issue_resume_token(user_hash, password_hash)
         user_data = tokens.validate_token(user.token.token)
         res = jsonify(
             {
                 "user_id": user_data["user_id"],
                 "user_name": user_data["user_name"],
                 "user_token": user.token.token,
+                "resume_token": resume_token,
             }
         )
         res.status_code = 200
         return res
+    except admission.Overloaded as e:
+        return helpers.shed(e)
     except (jwt.InvalidTokenError, NoResultFound) as e:
         logs.debug(
             helpers.logger,
@@ -88,8 +112,8 @@ async def get_room_data(room_token: str) -> Response:
 
     try:
         async with db.get_session() as session:
-            room = await db.get_room_by_id(session, room_token)
-            return jsonify({"room_hash": room.id, "room_name": room.name})
+            room_id, room_name = await db.get_room_summary(session, room_token)
+        return jsonify({"room_hash": room_id, "room_name": room_name})
     except NoResultFound as e:
         logs.debug(
             helpers.logger,
@@ -113,6 +137,7 @@ async def get_room_data(room_token: str) -> Response:
 
 
 @bp.route("/user/create", methods=["POST"])
+@helpers.admission_controlled
 async def create_new_user_token() -> Response:
     """Create a new user and token and return the hash and user name in the response."""
 
@@ -126,9 +151,12 @@ async def create_new_user_token() -> Response:
             async with db.get_session() as session:
                 new_user, new_user_password = await db.create_user(session, user_name=user_name)
                 await session.commit()
+            names.announce_user_name(new_user.name)
         except IntegrityError as e:
             constraint_violation = db.parse_constraint_error(e)
             if constraint_violation == db.ConstraintViolation.UNIQUE:
+                # The index missed the name, which can happen when an announcement was lost.
+                names.announce_user_name(user_name)
                 return helpers.bad_request("Username already taken")
             else:  # pragma: no cover
                 logs.error(
@@ -170,9 +198,13 @@ async def create_new_room_token(user_data: UserData) -> Response:
                     session, room_name=room_name, creator_id=user_data["user_id"]
                 )
                 await session.commit()
+            membership.index.add(new_room.id, user_data["user_id"])
+            names.announce_room_name(user_data["user_id"], new_room.name)
         except IntegrityError as e:
             constraint_violation = db.parse_constraint_error(e)
             if constraint_violation == db.ConstraintViolation.UNIQUE:
+                # The index missed the name, which can happen when an announcement was lost.
+                names.announce_room_name(user_data["user_id"], room_name)
                 return helpers.bad_request("User already owns room with this name")
             else:  # pragma: no cover
                 logs.error(
@@ -207,11 +239,8 @@ async def get_all_joined_rooms(user_data: UserData) -> Response:
     """Return a list of all chatrooms that the authenticated user has joined."""
 
     async with db.get_session() as session:
-        stmt = select(db.models.Room)
-        stmt = stmt.where(db.models.Room.members.any(db.models.User.id == user_data["user_id"]))
-        rooms = (await session.execute(stmt)).scalars().all()
-        results = [{"room_hash": room.id, "room_name": room.name} for room in rooms]
-        return jsonify(results)
+        rooms = await db.get_joined_rooms(session, user_data["user_id"])
+    return jsonify([{"room_hash": room_id, "room_name": room_name} for room_id, room_name in rooms])
 
 
 @bp.route("/user/rooms/owned", methods=["GET"])
@@ -220,11 +249,8 @@ async def get_all_owned_rooms(user_data: UserData) -> Response:
     """Return a list of all chatrooms that the authenticated user owns."""
 
     async with db.get_session() as session:
-        stmt = select(db.models.Room)
-        stmt = stmt.where(db.models.Room.owner_id == user_data["user_id"])
-        rooms = (await session.execute(stmt)).scalars().all()
-        results = [{"room_hash": room.id, "room_name": room.name} for room in rooms]
-        return jsonify(results)
+        rooms = await db.get_owned_rooms(session, user_data["user_id"])
+    return jsonify([{"room_hash": room_id, "room_name": room_name} for room_id, room_name in rooms])
 
 
 @bp.route("/room/<room_token>/join", methods=["PUT"])
@@ -240,6 +266,9 @@ async def join_room(room_token: str, user_data: UserData) -> Response:
             async with db.get_session() as session:
                 await db.add_user_to_room(session, user_id=user_data["user_id"], room_id=room_token)
                 await session.commit()
+            membership.index.add(room_token, user_data["user_id"])
+            # Joining writes a system message to the room's history without broadcasting it.
+            history.invalidate(room_token)
         except IntegrityError as e:
             constraint_violation = db.parse_constraint_error(e)
             if constraint_violation == db.ConstraintViolation.UNIQUE:
@@ -256,11 +285,10 @@ async def join_room(room_token: str, user_data: UserData) -> Response:
                 raise e
         else:
             async with db.get_session() as session:
-                room = await db.get_room_by_id(session, room_token)
-                await session.commit()
-                res = jsonify({"room_token": room.id, "room_name": room.name})
-                res.status_code = 200
-                return res
+                room_id, room_name = await db.get_room_summary(session, room_token)
+            res = jsonify({"room_token": room_id, "room_name": room_name})
+            res.status_code = 200
+            return res
     except Exception as e:  # pragma: no cover
         logs.error(
             helpers.logger,
@@ -276,7 +304,18 @@ async def get_all_room_members(room_token: str) -> Response:
     """Return user names and ids for all users that have joined this chatroom."""
 
     async with db.get_session() as session:
-        room = await db.get_room_by_id(session, room_token)
-        members = room.members
-        results = [{"user_name": member.name, "user_id": member.id} for member in members]
-        return jsonify(results)
+        members = await db.get_room_members(session, room_token)
+    return jsonify([{"user_name": user_name, "user_id": user_id} for user_id, user_name in members])
+
+
+@bp.route("/room/<room_token>/presence", methods=["GET"])
+@helpers.auth_required(inject_user_data=False)
+async def get_room_presence(room_token: str) -> Response:
+    """Return the current status of every member connected to this chatroom.
+
+    This is the same snapshot that the member-status websocket sends on connection:
+    an array of member-status messages with the ISO 8601 time of each member's last status
+    change in the `last_changed` field. Members who are offline are not included.
+    """
+
+    return jsonify(presence.registry.snapshot(room_token))
@@ -2,9 +2,24 @@
 
 from quart import Blueprint
 
-from . import helpers, v1  # noqa: F401
+from . import (  # noqa: F401
+    broker,
+    channels,
+    coalesce,
+    compact,
+    frames,
+    helpers,
+    history,
+    multiplex,
+    relay,
+    replay,
+    v1,
+    v2,
+    validation,
+)
 
 bp = Blueprint("websockets", __name__)
 """This blueprint contains all websockets-based routes for the api."""
 
 bp.register_blueprint(v1.bp)
+bp.register_blueprint(v2.bp)
@@ -0,0 +1,323 @@
+"""In-process publish/subscribe broker for the many;many room websockets.
+
+Every room socket (chat-message, member-status, client-sync) has the same job: take a
+message from one client and fan it out to every client connected to the same chatroom.
+A `Broker` keeps a registry of room id -> subscribers for one socket type, and each
+`Subscriber` owns a bounded queue that its websocket handler drains on a separate
+writer task. Publishing never awaits a client, so one slow connection can't hold up
+delivery to the rest of the room.
+
+Publishing delivers a frame to the subscribers in this process and then hands it to the
+configured `Backend`, which is responsible for delivering it to the subscribers in every
+other process serving the app. The default `LocalBackend` assumes a single process. See
+`pykcworkshop.chat.api.websockets.relay` for a backend that works across hypercorn workers.
+"""
+
+import asyncio
+import contextlib
+import enum
+from typing import Callable, Iterator, Protocol
+
+from pykcworkshop.chat.api.websockets import replay
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+QUEUE_SIZE: int = 64
+"""The default number of undelivered messages a subscriber can hold before its overflow
+policy kicks in."""
+
+
+class Overflow(enum.Enum):
+    """What a `Subscriber` does when a frame is delivered while its queue is full."""
+
+    DROP_OLDEST = enum.auto()
+    """Discard the oldest undelivered frame to make room, for streams where only the most
+    recent messages matter, such as member statuses."""
+
+    DISCONNECT = enum.auto()
+    """Stop accepting frames, flag the subscriber as `overflowed`, and call its
+    `on_overflow` callback, so its writer can close the connection even while it is blocked
+    sending to the client. This is for streams where a gap would silently lose data, such
+    as chat messages."""
+
+
+class Subscriber:
+    """A single websocket connection's bounded mailbox for outbound frames."""
+
+    __slots__ = ("queue", "peer", "overflow", "overflowed", "on_overflow", "dropped", "peak_depth")
+
+    def __init__(
+        self,
+        maxsize: int = QUEUE_SIZE,
+        peer: int | None = None,
+        overflow: Overflow = Overflow.DROP_OLDEST,
+    ) -> None:
+        self.queue: asyncio.Queue[Frame] = asyncio.Queue(maxsize)
+        self.peer = peer
+        """The other user of the conversation, for connections registered in a `UserIndex`."""
+        self.overflow = overflow
+        self.overflowed = False
+        """Whether the queue overflowed under the `Overflow.DISCONNECT` policy."""
+        self.on_overflow: Callable[[], object] | None = None
+        """Called once when the queue overflows under the `Overflow.DISCONNECT` policy."""
+        self.dropped = 0
+        """The number of frames discarded because the queue was full."""
+        self.peak_depth = 0
+        """The largest number of frames that were waiting in the queue at once."""
+
+    @property
+    def depth(self) -> int:
+        """The number of frames currently waiting to be sent."""
+
+        return self.queue.qsize()
+
+    def deliver(self, frame: Frame) -> None:
+        """Queue `frame` for this subscriber without blocking.
+
+        If the queue is full, the subscriber's `overflow` policy decides whether the oldest
+        undelivered frame is discarded to make room or the subscriber stops accepting
+        frames, so a client that falls behind never stalls the publisher.
+        """
+
+        if self.overflowed:
+            self.dropped += 1
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow is Overflow.DISCONNECT:
+                self.overflowed = True
+                if self.on_overflow is not None:
+                    self.on_overflow()
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(frame)
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+
+
+class Broker:
+    """A registry of room id -> subscribers for one type of room socket.
+
+    Subscribing and unsubscribing are O(1) set operations, and the entry for a room is
+    dropped as soon as its last subscriber leaves, so the registry only ever holds
+    rooms with at least one open connection.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._rooms: dict[str, set[Subscriber]] = {}
+        self._listeners: list[Callable[[str, Frame], None]] = []
+        _BROKERS[name] = self
+
+    def add_listener(self, listener: Callable[[str, Frame], None]) -> None:
+        """Call `listener` with the room id and frame of every broadcast delivered in this
+        process, including broadcasts relayed from other processes and broadcasts to rooms
+        without any subscribers."""
+
+        self._listeners.append(listener)
+
+    def subscribe(self, room_id: str, subscriber: Subscriber) -> None:
+        """Add `subscriber` to the set of connections receiving broadcasts for `room_id`."""
+
+        self._rooms.setdefault(room_id, set()).add(subscriber)
+
+    def unsubscribe(self, room_id: str, subscriber: Subscriber) -> None:
+        """Remove `subscriber` from `room_id`. This is a no-op if it isn't subscribed."""
+
+        subscribers = self._rooms.get(room_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._rooms[room_id]
+
+    @contextlib.contextmanager
+    def subscription(
+        self, room_id: str, maxsize: int = QUEUE_SIZE, subscriber: Subscriber | None = None
+    ) -> Iterator[Subscriber]:
+        """Context manager that subscribes `subscriber`, or a new `Subscriber` if it isn't
+        given, to `room_id` for the duration of the block and always unsubscribes it on
+        exit, including when the websocket handler is cancelled because the client
+        disconnected."""
+
+        if subscriber is None:
+            subscriber = Subscriber(maxsize)
+        self.subscribe(room_id, subscriber)
+        try:
+            yield subscriber
+        finally:
+            self.unsubscribe(room_id, subscriber)
+
+    def publish(self, room_id: str, frame: Frame) -> None:
+        """Deliver `frame` to every subscriber of `room_id` in every process serving the app.
+
+        Every local subscriber receives the same `Frame` instance, so the message is
+        serialized once per broadcast rather than once per recipient.
+        """
+
+        self.deliver(room_id, frame)
+        _backend.publish(self.name, room_id, frame)
+
+    def deliver(self, room_id: str, frame: Frame) -> int:
+        """Deliver `frame` to the subscribers of `room_id` in this process only.
+
+        Returns the number of subscribers the frame was delivered to.
+        """
+
+        for listener in self._listeners:
+            listener(room_id, frame)
+        subscribers = self._rooms.get(room_id, ())
+        for subscriber in subscribers:
+            subscriber.deliver(frame)
+        return len(subscribers)
+
+    def subscriber_count(self, room_id: str) -> int:
+        """Return the number of connections currently subscribed to `room_id`."""
+
+        return len(self._rooms.get(room_id, ()))
+
+
+class SequencedBroker(Broker):
+    """A broker that stamps every frame it delivers with a replay cursor and keeps it in a
+    `pykcworkshop.chat.api.websockets.replay.ReplayBuffer`.
+
+    Frames are stamped on delivery in each process rather than on publish, so the frames
+    relayed to other processes carry no cursor and every process issues cursors for its
+    own buffer.
+    """
+
+    def __init__(self, name: str, buffer: replay.ReplayBuffer) -> None:
+        super().__init__(name)
+        self.buffer = buffer
+
+    def deliver(self, room_id: str, frame: Frame) -> int:
+        return super().deliver(room_id, self.buffer.record(room_id, frame))
+
+
+class UserIndex(Broker):
+    """A registry of user id -> the open connections of that user, for sockets that carry
+    messages addressed to a user rather than a room.
+
+    Each connection is registered under its own user's id together with the `peer` it is
+    talking to, so sending a message to a user only touches that user's connections, no
+    matter how many sockets are open in total. Like the rooms of a `Broker`, the entry for
+    a user is dropped as soon as their last connection closes.
+    """
+
+    @contextlib.contextmanager
+    def connection(
+        self,
+        user_id: int,
+        peer: int,
+        maxsize: int = QUEUE_SIZE,
+        subscriber: Subscriber | None = None,
+    ) -> Iterator[Subscriber]:
+        """Context manager that registers `subscriber`, or a new `Subscriber` if it isn't
+        given, for `user_id`'s conversation with `peer` for the duration of the block and
+        always removes it on exit."""
+
+        with self.subscription(str(user_id), maxsize, subscriber) as subscriber:
+            subscriber.peer = peer
+            yield subscriber
+
+    def send(self, user_id: int, peer: int, frame: Frame) -> None:
+        """Deliver `frame` to every connection of `user_id` that is talking to `peer`, in
+        every process serving the app."""
+
+        self.publish(f"{user_id}:{peer}", frame)
+
+    def deliver(self, key: str, frame: Frame) -> int:
+        """Deliver `frame` to the local connections addressed by `key`, which is
+        `"<user_id>:<peer>"`.
+
+        Returns the number of connections the frame was delivered to.
+        """
+
+        for listener in self._listeners:
+            listener(key, frame)
+        user_id, _, peer = key.partition(":")
+        delivered = 0
+        for subscriber in self._rooms.get(user_id, ()):
+            if str(subscriber.peer) == peer:
+                subscriber.deliver(frame)
+                delivered += 1
+        return delivered
+
+    def connection_count(self, user_id: int) -> int:
+        """Return the number of connections `user_id` currently has registered."""
+
+        return self.subscriber_count(str(user_id))
+
+
+class Backend(Protocol):
+    """Transport that carries published frames to the other processes serving the app."""
+
+    def publish(self, channel: str, room_id: str, frame: Frame) -> None:
+        """Forward `frame` to the other processes without blocking. Frames published here
+        have already been delivered to this process's subscribers."""
+        ...
+
+    async def start(self) -> None:
+        """Called once on the serving event loop before the app starts serving requests."""
+        ...
+
+    async def stop(self) -> None:
+        """Called once on the serving event loop after the app stops serving requests."""
+        ...
+
+
+class LocalBackend:
+    """Backend for running the app in a single process, where every subscriber is local."""
+
+    def publish(self, channel: str, room_id: str, frame: Frame) -> None:
+        pass
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+_BROKERS: dict[str, Broker] = {}
+_backend: Backend = LocalBackend()
+
+
+def get_backend() -> Backend:
+    """Return the backend used to reach the other processes serving the app."""
+
+    return _backend
+
+
+def set_backend(backend: Backend) -> None:
+    """Replace the backend used to reach the other processes serving the app.
+
+    This should be called while setting up the app, before the backend is started.
+    """
+
+    global _backend
+    _backend = backend
+
+
+def deliver(channel: str, room_id: str, frame: Frame) -> int:
+    """Deliver a frame received from another process to the local subscribers of `room_id`
+    on the broker named `channel`.
+
+    Returns the number of subscribers the frame was delivered to.
+    """
+
+    room_broker = _BROKERS.get(channel)
+    if room_broker is None:
+        return 0
+    return room_broker.deliver(room_id, frame)
+
+
+chat_message = SequencedBroker("chat-message", replay.ReplayBuffer())
+"""Broker for the chat-message socket. Its buffer serves reconnecting clients."""
+
+member_status = Broker("member-status")
+"""Broker for the member-status socket."""
+
+client_sync = Broker("client-sync")
+"""Broker for the client-sync socket."""
+
+direct_message = UserIndex("direct-message")
+"""Index of the open direct-message connections of each user."""
@@ -0,0 +1,566 @@
+"""Channel handlers shared by every version of the websocket api.
+
+A channel is one logical message stream between a client and the server, such as the
+chat messages of one room. In the v1 api every channel has its own websocket connection,
+while the v2 api carries any number of channels over a single multiplexed connection. The
+handlers in this module implement the behavior of each channel against the small `Channel`
+interface, so both apis share the same logic and only differ in how messages get on and
+off the wire.
+
+Every handler validates its arguments, opens the channel with `Channel.open`, and then
+runs until it is cancelled, which happens when the client disconnects or unsubscribes from
+the channel.
+"""
+
+import asyncio
+import base64
+import contextlib
+import datetime
+from typing import AsyncIterator, NamedTuple
+
+from quart import websocket
+
+from pykcworkshop import json_codec, logs, utils
+from pykcworkshop.chat import db, membership, presence
+from pykcworkshop.chat.api.websockets import (
+    broker,
+    coalesce,
+    compact,
+    helpers,
+    history,
+    validation,
+)
+from pykcworkshop.chat.api.websockets.frames import Frame
+from pykcworkshop.chat.types import UserData
+
+OVERFLOW: dict[str, broker.Overflow] = {
+    "chat-message": broker.Overflow.DISCONNECT,
+    "member-status": broker.Overflow.DROP_OLDEST,
+    "client-sync": broker.Overflow.DROP_OLDEST,
+    "chat-history": broker.Overflow.DISCONNECT,
+    "direct-message": broker.Overflow.DISCONNECT,
+    "form-validation": broker.Overflow.DROP_OLDEST,
+}
+"""The overflow policy of the outbox of each type of channel.
+
+Channels whose clients can't recover from a missing message disconnect a client that falls
+too far behind, while channels where only the latest messages matter drop the oldest
+unsent messages instead.
+"""
+
+SLOW_CONSUMER_REASON = "Too slow"
+"""The reason given to a client that is disconnected because its outbox overflowed."""
+
+
+FORM_VALIDATION_DEBOUNCE: float = 0.0
+"""The number of seconds the form-validation channel waits before each round of validation,
+collecting newer forms that supersede the pending ones. Set from the app config."""
+
+NOT_A_MEMBER_REASON = "Not a member of this room"
+"""The reason given to a client that opens a room channel of a room it hasn't joined."""
+
+
+class ChannelError(Exception):
+    """Raised by a channel handler when the channel can't be opened.
+
+    The message is sent to the client, so it MUST NOT include any sensitive information.
+    """
+
+
+class Channel:
+    """Interface between a channel handler and the connection that carries the channel."""
+
+    name: str
+    """The name of the channel, used when logging."""
+
+    async def accept(self, encoder: compact.Encoder | None = None) -> None:
+        """Accept the channel.
+
+        If `encoder` is given, the channel supports the compact binary encoding of
+        `pykcworkshop.chat.api.websockets.compact`, and uses it to send frames if the
+        client opted into it.
+        """
+
+        raise NotImplementedError
+
+    async def receive(self) -> str | bytes:
+        """Wait for the next message sent by the client on this channel."""
+
+        raise NotImplementedError
+
+    async def send(self, frame: Frame) -> None:
+        """Send `frame` to the client on this channel.
+
+        Handlers never call this directly. Everything they send goes through the outbox
+        returned by `open`, whose writer task is the only caller.
+        """
+
+        raise NotImplementedError
+
+    async def disconnect(self) -> None:
+        """Close the connection carrying this channel because the client can't keep up."""
+
+        raise NotImplementedError
+
+    @contextlib.asynccontextmanager
+    async def open(
+        self,
+        overflow: broker.Overflow,
+        maxsize: int = broker.QUEUE_SIZE,
+        encoder: compact.Encoder | None = None,
+    ) -> AsyncIterator[broker.Subscriber]:
+        """Accept the channel and yield its outbox for the duration of the block.
+
+        The outbox is a bounded `pykcworkshop.chat.api.websockets.broker.Subscriber` that
+        is drained by a writer task started on entry and cancelled on exit, so neither the
+        handler nor a broker publishing to the outbox ever waits on the client. When the
+        outbox is full, `overflow` decides whether the oldest unsent frame is dropped or the
+        client is disconnected. `encoder` is passed on to `accept`. Handlers call this once
+        their arguments are validated.
+
+        Example:
+
+            >>> async def client_sync(channel: Channel, room_id: str):
+            ...     async with channel.open(OVERFLOW["client-sync"]) as outbox:
+            ...         with broker.client_sync.subscription(room_id, subscriber=outbox):
+            ...             while True:
+            ...                 frame = Frame.raw(await channel.receive())
+            ...                 broker.client_sync.publish(room_id, frame)
+        """
+
+        await self.accept(encoder)
+        outbox = broker.Subscriber(maxsize, overflow=overflow)
+        writer = asyncio.create_task(self._write(outbox))
+        # The writer is most likely stuck sending to the client, so it has to be interrupted.
+        outbox.on_overflow = writer.cancel
+        try:
+            yield outbox
+        finally:
+            writer.cancel()
+            stats = {"ch": self.name, "dropped": outbox.dropped, "peak_depth": outbox.peak_depth}
+            if outbox.dropped:
+                logs.info(helpers.logger, {"msg": "Channel closed with dropped frames", **stats})
+            else:
+                logs.debug(helpers.logger, {"msg": "Channel closed", **stats})
+
+    async def _write(self, outbox: broker.Subscriber) -> None:
+        try:
+            while True:
+                await self.send(await outbox.queue.get())
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            assert task is not None
+            # The outbox cancels the writer once to disconnect the client. Any other
+            # cancellation means the channel is closing anyway.
+            if not outbox.overflowed or task.uncancel() > 0:
+                raise
+        logs.info(
+            helpers.logger,
+            {"msg": "Disconnecting slow consumer", "ch": self.name, "dropped": outbox.dropped},
+        )
+        await self.disconnect()
+
+
+class WebsocketChannel(Channel):
+    """A channel that has the current websocket connection to itself, as in the v1 api."""
+
+    def __init__(self) -> None:
+        self.name = websocket.path
+        self._encoder: compact.Encoder | None = None
+
+    async def accept(self, encoder: compact.Encoder | None = None) -> None:
+        # Only echo the subprotocol when the client asked for it, since a client that didn't
+        # would reject the handshake.
+        if encoder is not None and compact.PROTOCOL in websocket.requested_subprotocols:
+            self._encoder = encoder
+            await websocket.accept(subprotocol=compact.PROTOCOL)
+        else:
+            await websocket.accept()
+
+    async def receive(self) -> str | bytes:
+        return await websocket.receive()
+
+    async def send(self, frame: Frame) -> None:
+        if self._encoder is None:
+            await websocket.send(frame.data)
+        else:
+            await websocket.send(frame.compact(self._encoder))
+
+    async def disconnect(self) -> None:
+        await websocket.close(1008, SLOW_CONSUMER_REASON)
+
+
+async def chat_message(channel: Channel, room_id: str, user_data: UserData) -> None:
+    """Broadcast chat messages between the clients connected to a room and save them.
+
+    See `pykcworkshop.chat.api.websockets.v1.chat_message_socket` for the protocol.
+
+    Raises:
+        ChannelError:
+            If the user isn't a member of the room.
+    """
+
+    await _authorize(room_id, user_data)
+    async with channel.open(
+        OVERFLOW["chat-message"], encoder=compact.encode_chat_message
+    ) as outbox:
+        with broker.chat_message.subscription(room_id, subscriber=outbox):
+            while True:
+                message = helpers.parse_chat_message(await channel.receive())
+                if message is None or message[1] == "":
+                    continue
+                _, content = message
+                timestamp = utils.now()
+                await db.get_message_writer().submit(
+                    author_id=user_data["user_id"],
+                    room_id=room_id,
+                    content=content,
+                    timestamp=timestamp,
+                )
+                frame = Frame(
+                    {
+                        "user_name": user_data["user_name"],
+                        "content": content,
+                        "timestamp": timestamp.isoformat(),
+                    }
+                )
+                broker.chat_message.publish(room_id, frame)
+
+
+async def member_status(channel: Channel, room_id: str, user_data: UserData) -> None:
+    """Broadcast status updates between the clients connected to a room.
+
+    See `pykcworkshop.chat.api.websockets.v1.member_status_socket` for the protocol.
+
+    Raises:
+        ChannelError:
+            If the user isn't a member of the room.
+    """
+
+    await _authorize(room_id, user_data)
+    presence.registry.connect(room_id, user_data["user_id"])
+    try:
+        async with channel.open(
+            OVERFLOW["member-status"], encoder=compact.encode_member_status
+        ) as outbox:
+            with broker.member_status.subscription(room_id, subscriber=outbox):
+                snapshot = presence.registry.snapshot(room_id, exclude_user_id=user_data["user_id"])
+                if snapshot:
+                    outbox.deliver(Frame(snapshot))
+                while True:
+                    frame = Frame.raw(await channel.receive())
+                    if not _is_own_status(frame, user_data["user_id"]):
+                        logs.debug(
+                            helpers.logger,
+                            {
+                                "msg": "Rejected status of another user",
+                                "user_id": user_data["user_id"],
+                            },
+                        )
+                        continue
+                    coalesce.member_status.submit(room_id, user_data["user_id"], frame)
+    finally:
+        # The user is still online while they have another connection to the room.
+        if presence.registry.disconnect(room_id, user_data["user_id"]):
+            offline_frame = Frame(
+                {
+                    "user_id": user_data["user_id"],
+                    "user_name": user_data["user_name"],
+                    "user_status": presence.OFFLINE,
+                }
+            )
+            coalesce.member_status.publish_now(room_id, user_data["user_id"], offline_frame)
+
+
+async def client_sync(channel: Channel, room_id: str, user_data: UserData) -> None:
+    """Broadcast arbitrary messages between the clients connected to a room.
+
+    See `pykcworkshop.chat.api.websockets.v1.client_sync_socket` for the protocol.
+
+    Raises:
+        ChannelError:
+            If the user isn't a member of the room.
+    """
+
+    await _authorize(room_id, user_data)
+    async with channel.open(OVERFLOW["client-sync"]) as outbox:
+        with broker.client_sync.subscription(room_id, subscriber=outbox):
+            while True:
+                broker.client_sync.publish(room_id, Frame.raw(await channel.receive()))
+
+
+async def chat_history(channel: Channel, room_id: str, user_data: UserData) -> None:
+    """Send chunks of a room's chat history on request.
+
+    See `pykcworkshop.chat.api.websockets.v1.stream_chat_history` for the protocol.
+
+    Raises:
+        ChannelError:
+            If the user isn't a member of the room.
+    """
+
+    await _authorize(room_id, user_data)
+    async with channel.open(
+        OVERFLOW["chat-history"], encoder=compact.encode_chat_history
+    ) as outbox:
+        while True:
+            request = _parse_history_request(await channel.receive())
+            if request is None:
+                continue
+            if request.keyset:
+                outbox.deliver(await _history_page(room_id, request))
+                continue
+            assert request.reference is not None
+            newer = request.newer
+            if request.after is not None:
+                missed = broker.chat_message.buffer.after(
+                    room_id, request.after, request.chunk_size
+                )
+                if missed is not None:
+                    outbox.deliver(Frame(missed))
+                    continue
+                newer = True
+            frame = await history.cache.get(room_id, request.reference, request.chunk_size, newer)
+            if frame is None:
+                async with db.get_session() as session:
+                    rows = await db.get_chat_history(
+                        session,
+                        room_id=room_id,
+                        reference=request.reference,
+                        limit=request.chunk_size,
+                        newer=newer,
+                    )
+                frame = Frame(
+                    [
+                        {
+                            "user_name": user_name,
+                            "content": content,
+                            "timestamp": timestamp.isoformat(),
+                        }
+                        for user_name, content, timestamp in rows
+                    ]
+                )
+            outbox.deliver(frame)
+
+
+async def _history_page(room_id: str, request: "_HistoryRequest") -> Frame:
+    """Answer a chat-history request that pages with a page cursor."""
+
+    async with db.get_session() as session:
+        rows = await db.get_chat_history_page(
+            session,
+            room_id=room_id,
+            after=request.page,
+            limit=request.chunk_size,
+            newer=request.newer,
+        )
+    next_page_cursor = None
+    if rows and len(rows) == request.chunk_size:
+        message_id, _, _, timestamp = rows[-1]
+        next_page_cursor = _encode_page_cursor(timestamp, message_id)
+    return Frame(
+        {
+            "messages": [
+                {"user_name": user_name, "content": content, "timestamp": timestamp.isoformat()}
+                for _, user_name, content, timestamp in rows
+            ],
+            "next_page_cursor": next_page_cursor,
+        }
+    )
+
+
+async def direct_message(channel: Channel, interlocutor_id: str | int, user_data: UserData) -> None:
+    """Send private messages between the logged in user and the user with id
+    `interlocutor_id`.
+
+    See `pykcworkshop.chat.api.websockets.v1.slide_in_those_dms` for the protocol.
+
+    Raises:
+        ChannelError:
+            If `interlocutor_id` isn't a valid user id.
+    """
+
+    try:
+        interlocutor = int(interlocutor_id)
+    except ValueError:
+        raise ChannelError("Invalid user id")
+    user_id = user_data["user_id"]
+    async with channel.open(OVERFLOW["direct-message"]) as outbox:
+        with broker.direct_message.connection(user_id, interlocutor, subscriber=outbox):
+            while True:
+                message = helpers.parse_chat_message(await channel.receive())
+                if message is None or message[1] == "":
+                    continue
+                _, content = message
+                frame = Frame(
+                    {
+                        "user_name": user_data["user_name"],
+                        "content": content,
+                        "timestamp": utils.now().isoformat(),
+                    }
+                )
+                # Echo to the sender's other tabs as well as the interlocutor's.
+                broker.direct_message.send(user_id, interlocutor, frame)
+                if interlocutor != user_id:
+                    broker.direct_message.send(interlocutor, user_id, frame)
+
+
+async def form_validation(channel: Channel) -> None:
+    """Validate form fields as the user types.
+
+    See `pykcworkshop.chat.api.websockets.v1.form_validation` for the protocol.
+
+    Only the newest form of each type is validated. Forms that are superseded by a newer
+    form of the same type before their turn comes are skipped, and each round of
+    validation waits `FORM_VALIDATION_DEBOUNCE` seconds first, so a fast typist costs
+    about one validation per form type per window rather than one per keystroke.
+
+    A form whose validation raises is logged and gets no answer, since the error says
+    nothing about the form data. The client's next change to the form is validated again.
+    """
+
+    # Form type -> the newest form of that type that hasn't been validated.
+    pending: dict[str, tuple[validation.Form, dict]] = {}
+    # Form type -> validator of every form type the client sent.
+    used: dict[str, validation.Form] = {}
+    validated = superseded = errors = 0
+
+    async def validate_pending(outbox: broker.Subscriber) -> None:
+        nonlocal validated, errors
+        while pending:
+            await asyncio.sleep(FORM_VALIDATION_DEBOUNCE)
+            for form_type in list(pending):
+                validator, form_data = pending.pop(form_type)
+                try:
+                    failure_reason = await validator(form_data)
+                except Exception as e:
+                    errors += 1
+                    logs.error(
+                        helpers.logger,
+                        {"msg": "Form validation failed", "type": form_type},
+                        err=e,
+                    )
+                    continue
+                validated += 1
+                outbox.deliver(
+                    Frame(
+                        {
+                            "form_data": form_data,
+                            "validation_failed": failure_reason != "",
+                            "failure_reason": failure_reason,
+                        }
+                    )
+                )
+
+    worker: asyncio.Task[None] | None = None
+    async with channel.open(OVERFLOW["form-validation"]) as outbox:
+        try:
+            while True:
+                raw_message = await channel.receive()
+                try:
+                    message = json_codec.loads(raw_message)
+                    form_type = message["type"]
+                    validator = validation.VALIDATORS[form_type]
+                    form_data = message["form_data"]
+                    if not isinstance(form_data, dict):
+                        raise TypeError("form_data must be an object")
+                except (ValueError, KeyError, TypeError) as e:
+                    logs.debug(helpers.logger, {"msg": "Malformed form-validation message"}, err=e)
+                    continue
+                if form_type in pending:
+                    superseded += 1
+                pending[form_type] = (validator, form_data)
+                used[form_type] = validator
+                if worker is None or worker.done():
+                    worker = asyncio.create_task(validate_pending(outbox))
+        finally:
+            if worker is not None:
+                worker.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await worker
+            logs.debug(
+                helpers.logger,
+                {
+                    "msg": "Form validation closed",
+                    "validated": validated,
+                    "superseded": superseded,
+                    "errors": errors,
+                    "rules": {form_type: form.stats() for form_type, form in used.items()},
+                },
+            )
+
+
+async def _authorize(room_id: str, user_data: UserData) -> None:
+    if not await membership.index.is_member(room_id, user_data["user_id"]):
+        raise ChannelError(NOT_A_MEMBER_REASON)
+
+
+class _HistoryRequest(NamedTuple):
+    reference: datetime.datetime | None
+    """The reference time. `None` for requests that page with a page cursor."""
+    chunk_size: int
+    newer: bool
+    after: str | None
+    """The replay cursor of the last chat message the client received."""
+    keyset: bool
+    """Whether the request pages with a page cursor."""
+    page: tuple[datetime.datetime, int] | None
+    """The (timestamp, id) key decoded from the page cursor."""
+
+
+def _parse_history_request(raw_message: str | bytes) -> _HistoryRequest | None:
+    """Parse a chat-history request.
+
+    Returns `None` and logs the problem if the request is malformed.
+    """
+
+    try:
+        data = json_codec.loads(raw_message)
+        chunk_size = data["chunk_size"]
+        newer = bool(data.get("newer", False))
+        if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 0:
+            raise ValueError("chunk_size must be a non-negative integer")
+        if "page_cursor" in data:
+            page_cursor = data["page_cursor"]
+            page = None if page_cursor is None else _decode_page_cursor(page_cursor)
+            return _HistoryRequest(None, chunk_size, newer, None, True, page)
+        after = data.get("after")
+        if after is not None and not isinstance(after, str):
+            raise ValueError("after must be a string")
+        reference = datetime.datetime.fromtimestamp(data["timestamp"] / 1000, datetime.UTC)
+        return _HistoryRequest(reference, chunk_size, newer, after, False, None)
+    except (ValueError, KeyError, TypeError, OverflowError, AttributeError) as e:
+        logs.debug(helpers.logger, {"msg": "Malformed chat-history request"}, err=e)
+        return None
+
+
+def _encode_page_cursor(timestamp: datetime.datetime, message_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{message_id}".encode()).decode()
+
+
+def _decode_page_cursor(page_cursor: str) -> tuple[datetime.datetime, int]:
+    """Raises `ValueError` or `TypeError` if `page_cursor` isn't a valid page cursor."""
+
+    timestamp, message_id = base64.urlsafe_b64decode(page_cursor).decode().split("|")
+    return datetime.datetime.fromisoformat(timestamp), int(message_id)
+
+
+def _is_own_status(frame: Frame, user_id: int) -> bool:
+    """Whether `frame` can be relayed for `user_id`, because it isn't the status of someone
+    else. Malformed messages are still relayed, but they aren't a status."""
+
+    try:
+        return int(frame.payload["user_id"]) == user_id
+    except (ValueError, KeyError, TypeError):
+        return True
+
+
+def _track_presence(room_id: str, frame: Frame) -> None:
+    try:
+        status = frame.payload
+    except ValueError:
+        return  # Malformed messages are still relayed, but they aren't a status.
+    presence.registry.update(room_id, status)
+
+
+broker.member_status.add_listener(_track_presence)
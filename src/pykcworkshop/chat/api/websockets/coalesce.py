@@ -0,0 +1,84 @@
+"""Last-write-wins coalescing for the member-status room socket.
+
+Clients send a "Typing" status on nearly every keystroke, and relaying each one to every
+member of the room makes status fan-out grow with the number of keystrokes instead of the
+number of members. A `StatusCoalescer` sits in front of a `Broker` and collapses the status
+updates for each room into tick windows. The first update in an idle room is published
+right away, and any updates that arrive while the room's window is open only replace the
+pending status for their user. When the window closes, the latest pending status of each
+user is published and a new window opens, so each user publishes at most one status per
+tick while the room is busy.
+
+Statuses that have to be seen immediately, such as the server-originated "Offline" status
+sent when a client disconnects, should be sent with `StatusCoalescer.publish_now`, which
+also discards that user's pending status so a stale update can't overwrite it.
+"""
+
+import asyncio
+
+from pykcworkshop.chat.api.websockets import broker
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+TICK_INTERVAL: float = 0.5
+"""The default length in seconds of a room's coalescing window."""
+
+
+class StatusCoalescer:
+    """Coalesces status frames per room and user before publishing them on `room_broker`.
+
+    Args:
+        room_broker:
+            The broker that coalesced statuses are published on.
+        interval:
+            The length in seconds of each room's coalescing window.
+    """
+
+    def __init__(self, room_broker: broker.Broker, interval: float = TICK_INTERVAL) -> None:
+        self.room_broker = room_broker
+        self.interval = interval
+        self.received = 0
+        """The number of status frames submitted to this coalescer."""
+        self.published = 0
+        """The number of status frames this coalescer has published to the broker."""
+
+        # A room has an entry for as long as its window is open, even if nothing is pending.
+        self._pending: dict[str, dict[int, Frame]] = {}
+
+    def submit(self, room_id: str, user_id: int, frame: Frame) -> None:
+        """Publish `frame` as the latest status of `user_id` in `room_id` when the room's
+        current window closes, or right away if the room has no open window."""
+
+        self.received += 1
+        pending = self._pending.get(room_id)
+        if pending is None:
+            self._pending[room_id] = {}
+            self._publish(room_id, frame)
+            asyncio.get_running_loop().call_later(self.interval, self._tick, room_id)
+        else:
+            pending[user_id] = frame
+
+    def publish_now(self, room_id: str, user_id: int, frame: Frame) -> None:
+        """Publish `frame` immediately and discard any pending status for `user_id`."""
+
+        self.received += 1
+        pending = self._pending.get(room_id)
+        if pending is not None:
+            pending.pop(user_id, None)
+        self._publish(room_id, frame)
+
+    def _tick(self, room_id: str) -> None:
+        pending = self._pending.pop(room_id, None)
+        if not pending:
+            return  # The room went quiet, so the next status is published right away.
+        self._pending[room_id] = {}
+        for frame in pending.values():
+            self._publish(room_id, frame)
+        asyncio.get_running_loop().call_later(self.interval, self._tick, room_id)
+
+    def _publish(self, room_id: str, frame: Frame) -> None:
+        self.published += 1
+        self.room_broker.publish(room_id, frame)
+
+
+member_status = StatusCoalescer(broker.member_status)
+"""Coalesces the statuses published by the member-status socket."""
@@ -0,0 +1,210 @@
+"""Compact binary encoding for the busiest v1 websocket frames.
+
+JSON stays the default wire format. A client opts into the compact encoding by including
+`PROTOCOL` in its `Sec-WebSocket-Protocol` header alongside the `Bearer` and `csrf`
+entries, and the server confirms by echoing `PROTOCOL` back in the handshake response. The
+server only echoes it on the chat-message, member-status, and chat-history sockets, and
+only when the client asked for it, so clients that don't opt in see no change at all.
+
+On a socket that negotiated the compact encoding, the server sends chat messages, member
+statuses, and chat history chunks as binary frames in the format below. Anything that
+can't be represented in this format, such as a malformed status relayed from another
+client, is still sent as a JSON text frame, so clients must handle both. Messages sent by
+the client are always JSON.
+
+All integers are big-endian. A string is a `u16` byte length followed by that many bytes
+of UTF-8, and a timestamp is an `i64` count of milliseconds since the Unix epoch. Every
+frame starts with a `u8` tag:
+
+    0x01 chat message:   timestamp, user_name, content, cursor
+    0x02 chat history:   u16 count, then count * (timestamp, user_name, content, cursor)
+    0x03 member status:  u64 user_id, user_name, user_status
+    0x04 status snapshot: u16 count, then count * (u64 user_id, timestamp last_changed,
+                          user_name, user_status)
+
+The cursor is the replay cursor of the message, see
+`pykcworkshop.chat.api.websockets.replay`. It is empty for messages without one, such as
+chat history loaded from the db, and those decode without a `cursor` field.
+
+Timestamps are truncated to millisecond precision, which is all the browser can represent
+anyway, and fields that aren't part of the format are not sent.
+"""
+
+import datetime
+import functools
+import struct
+from typing import Any, Callable
+
+PROTOCOL: str = "pykc.compact.v1"
+"""The subprotocol a client offers to opt into the compact encoding."""
+
+CHAT_MESSAGE = 0x01
+CHAT_HISTORY = 0x02
+MEMBER_STATUS = 0x03
+MEMBER_SNAPSHOT = 0x04
+
+Encoder = Callable[[Any], bytes]
+"""Encodes the payload of a frame. Raises `ValueError` if the payload doesn't fit the
+format."""
+
+_TAG = struct.Struct(">B")
+_COUNTED = struct.Struct(">BH")
+_LENGTH = struct.Struct(">H")
+_TIMESTAMP = struct.Struct(">q")
+_USER_ID = struct.Struct(">Q")
+_SNAPSHOT_ENTRY = struct.Struct(">Qq")
+
+
+def _strict(encoder: Callable[[Any], bytes]) -> Encoder:
+    """Report every way a payload can fail to encode as a `ValueError`."""
+
+    @functools.wraps(encoder)
+    def _wrapper(payload: Any) -> bytes:
+        try:
+            return encoder(payload)
+        except (KeyError, TypeError, AttributeError, IndexError, struct.error) as e:
+            raise ValueError(f"Payload doesn't fit the compact format: {e!r}") from e
+
+    return _wrapper
+
+
+def _pack_str(out: bytearray, value: str) -> None:
+    encoded = value.encode()
+    out += _LENGTH.pack(len(encoded))
+    out += encoded
+
+
+def _to_ms(timestamp: str) -> int:
+    return round(datetime.datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def _pack_message(out: bytearray, message: dict) -> None:
+    out += _TIMESTAMP.pack(_to_ms(message["timestamp"]))
+    _pack_str(out, message["user_name"])
+    _pack_str(out, message["content"])
+    _pack_str(out, message.get("cursor") or "")
+
+
+@_strict
+def encode_chat_message(payload: dict) -> bytes:
+    """Encode a chat-message broadcast."""
+
+    out = bytearray(_TAG.pack(CHAT_MESSAGE))
+    _pack_message(out, payload)
+    return bytes(out)
+
+
+@_strict
+def encode_chat_history(payload: list[dict]) -> bytes:
+    """Encode a chunk of chat history."""
+
+    out = bytearray(_COUNTED.pack(CHAT_HISTORY, len(payload)))
+    for message in payload:
+        _pack_message(out, message)
+    return bytes(out)
+
+
+@_strict
+def encode_member_status(payload: dict | list[dict]) -> bytes:
+    """Encode a member-status broadcast or the snapshot sent to a newly connected client."""
+
+    if isinstance(payload, list):
+        out = bytearray(_COUNTED.pack(MEMBER_SNAPSHOT, len(payload)))
+        for status in payload:
+            out += _SNAPSHOT_ENTRY.pack(int(status["user_id"]), _to_ms(status["last_changed"]))
+            _pack_str(out, status["user_name"])
+            _pack_str(out, status["user_status"])
+        return bytes(out)
+    out = bytearray(_TAG.pack(MEMBER_STATUS))
+    out += _USER_ID.pack(int(payload["user_id"]))
+    _pack_str(out, payload["user_name"])
+    _pack_str(out, payload["user_status"])
+    return bytes(out)
+
+
+def decode(data: bytes) -> Any:
+    """Decode a compact frame back into the payload of the equivalent JSON frame.
+
+    This is what a client does with the binary frames it receives, and is mainly useful for
+    testing.
+
+    Raises:
+        ValueError:
+            If `data` isn't a valid compact frame.
+
+    Example:
+
+        >>> from pykcworkshop.chat.api.websockets import compact
+        >>> status = {"user_id": 1, "user_name": "Testy", "user_status": "Online"}
+        >>> compact.decode(compact.encode_member_status(status)) == status
+        True
+    """
+
+    reader = _Reader(data)
+    try:
+        tag = reader.unpack(_TAG)[0]
+        match tag:
+            case 0x01:
+                payload: Any = reader.message()
+            case 0x02:
+                payload = [reader.message() for _ in range(reader.unpack(_LENGTH)[0])]
+            case 0x03:
+                payload = {
+                    "user_id": reader.unpack(_USER_ID)[0],
+                    "user_name": reader.string(),
+                    "user_status": reader.string(),
+                }
+            case 0x04:
+                payload = []
+                for _ in range(reader.unpack(_LENGTH)[0]):
+                    user_id, last_changed = reader.unpack(_SNAPSHOT_ENTRY)
+                    payload.append(
+                        {
+                            "user_id": user_id,
+                            "user_name": reader.string(),
+                            "user_status": reader.string(),
+                            "last_changed": _from_ms(last_changed),
+                        }
+                    )
+            case _:
+                raise ValueError(f"Unknown frame tag {tag:#04x}")
+    except struct.error as e:
+        raise ValueError("Truncated compact frame") from e
+    if reader.offset != len(data):
+        raise ValueError("Trailing bytes after compact frame")
+    return payload
+
+
+def _from_ms(timestamp: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp / 1000, datetime.UTC).isoformat()
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def string(self) -> str:
+        length = self.unpack(_LENGTH)[0]
+        end = self.offset + length
+        if end > len(self.data):
+            raise struct.error("string runs past the end of the frame")
+        value = self.data[self.offset : end].decode()
+        self.offset = end
+        return value
+
+    def message(self) -> dict:
+        timestamp = self.unpack(_TIMESTAMP)[0]
+        message = {
+            "user_name": self.string(),
+            "content": self.string(),
+            "timestamp": _from_ms(timestamp),
+        }
+        if cursor := self.string():
+            message["cursor"] = cursor
+        return message
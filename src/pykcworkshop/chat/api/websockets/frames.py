@@ -0,0 +1,119 @@
+"""Wire frames for messages that are broadcast to many websocket clients.
+
+A `Frame` wraps one outgoing message and encodes it lazily, at most once, no matter how
+many subscribers it is delivered to. The broker hands the same `Frame` instance to every
+subscriber, and every subscriber sends the same `Frame.data` object, so a broadcast to a
+500 member room costs one `json.dumps` call instead of 500.
+
+Frames sent over the multiplexed v2 socket are additionally wrapped in an envelope that
+names the channel they belong to. Every subscriber of a room channel uses the same channel
+name, so the envelope is cached on the frame as well and is also encoded once per broadcast.
+The same goes for the binary encoding of `pykcworkshop.chat.api.websockets.compact`.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from pykcworkshop import json_codec
+
+_UNSET: Any = object()
+
+
+class Frame:
+    """A single outgoing websocket message that is serialized once and shared by every
+    recipient.
+
+    Frames are either built from a JSON-serializable payload, in which case the payload is
+    encoded the first time `data` is read, or from an already encoded message with
+    `Frame.raw`, in which case `data` is the message exactly as it was received.
+
+    Example:
+
+        >>> from pykcworkshop.chat.api.websockets.frames import Frame
+        >>> frame = Frame({"user_name": "Testy", "content": "Hello"})
+        >>> frame.data
+        '{"user_name": "Testy", "content": "Hello"}'
+        >>> frame.data is frame.data
+        True
+        >>> Frame.raw("member-status").data
+        'member-status'
+    """
+
+    __slots__ = ("_payload", "_data", "_envelope", "_compact")
+
+    def __init__(self, payload: Any) -> None:
+        self._payload = payload
+        self._data: str | bytes | None = None
+        self._envelope: tuple[str, str] | None = None
+        self._compact: str | bytes | None = None
+
+    @classmethod
+    def raw(cls, data: str | bytes) -> Frame:
+        """Create a frame from a message that is already encoded for the wire.
+
+        The message is forwarded unaltered, which is what the relay sockets need, and the
+        payload is only decoded if something asks for it.
+        """
+
+        frame = cls(_UNSET)
+        frame._data = data
+        return frame
+
+    @property
+    def data(self) -> str | bytes:
+        """The encoded message that should be passed to `websocket.send`."""
+
+        if self._data is None:
+            self._data = json_codec.dumps(self._payload)
+        return self._data
+
+    @property
+    def payload(self) -> Any:
+        """The decoded message. Raw frames are decoded from JSON on first access."""
+
+        if self._payload is _UNSET:
+            self._payload = json_codec.loads(self.data)
+        return self._payload
+
+    def compact(self, encoder: Callable[[Any], bytes]) -> str | bytes:
+        """The message encoded with `encoder`, one of the encoders in
+        `pykcworkshop.chat.api.websockets.compact`.
+
+        If the message can't be decoded or doesn't fit the encoder's format, this is `data`
+        instead. Either way, the result is cached, so a frame should only ever be passed one
+        encoder, which is the case since each broker carries one type of message.
+        """
+
+        if self._compact is None:
+            try:
+                self._compact = encoder(self.payload)
+            except ValueError:
+                self._compact = self.data
+        return self._compact
+
+    def envelope(self, channel: str) -> str:
+        """The message wrapped in a v2 envelope for `channel`.
+
+        The most recently encoded envelope is cached, so sending the frame to every
+        subscriber of the same channel encodes it once.
+
+        Raises:
+            TypeError:
+                If the message is binary, since envelopes can only carry text.
+
+        Example:
+
+            >>> from pykcworkshop.chat.api.websockets.frames import Frame
+            >>> Frame.raw("member-status").envelope("room/abc/client-sync")
+            '{"op": "message", "ch": "room/abc/client-sync", "data": "member-status"}'
+        """
+
+        if self._envelope is not None and self._envelope[0] == channel:
+            return self._envelope[1]
+        data = self.data
+        if not isinstance(data, str):
+            raise TypeError("Binary frames can't be sent in an envelope")
+        encoded = json_codec.dumps({"op": "message", "ch": channel, "data": data})
+        self._envelope = (channel, encoded)
+        return encoded
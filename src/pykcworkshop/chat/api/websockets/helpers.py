@@ -6,7 +6,7 @@ from typing import Any, Awaitable, Callable, ParamSpec, TypeVar
 import jwt
 from quart import Response, websocket
 
-from pykcworkshop import logs
+from pykcworkshop import json_codec, logs
 from pykcworkshop.chat import tokens
 from pykcworkshop.chat.api import http
 
@@ -92,3 +92,19 @@ def auth_required(inject_user_data: bool) -> Callable[[Callable[P, AR]], Callabl
         return _wrapper
 
     return _decorator
+
+
+def parse_chat_message(raw_message: str | bytes) -> tuple[str, str] | None:
+    """Parse the `user_name` and `content` fields out of a JSON chat message received from
+    the client.
+
+    Returns `None` and logs the problem if the message is malformed, so callers can simply
+    skip it.
+    """
+
+    try:
+        data = json_codec.loads(raw_message)
+        return data["user_name"], data["content"]
+    except (ValueError, KeyError, TypeError) as e:
+        logs.debug(logger, {"msg": "Malformed chat message", "url": websocket.url}, err=e)
+        return None
@@ -0,0 +1,232 @@
+"""Hot cache of the most recent chat messages of each room for the chat-history socket.
+
+Almost every client that opens a room asks the chat-history socket for the latest page of
+messages, which is the same query for everyone in the room. The `HistoryCache` keeps the
+most recent `CACHE_SIZE` messages of the most recently active rooms, each already encoded
+in the shape of a chat-history response, so the first page and the typical scroll-back
+are served from memory.
+
+A room is loaded from the db the first time someone asks for its first page, and is then
+kept up to date incrementally from the chat messages delivered by
+`pykcworkshop.chat.api.websockets.broker.chat_message`, including those relayed from other
+worker processes. Messages broadcast in a room that isn't cached are kept for
+`RECENT_WINDOW` seconds and merged into the room when it is loaded, since the db may not
+have them yet while they wait in the write-behind buffer of the process that sent them.
+Messages that are written to the db without being broadcast, such as
+the system message for a user joining the room, go through `invalidate` instead, which
+drops the room from the cache of every worker process.
+"""
+
+import asyncio
+import bisect
+import collections
+import datetime
+import time
+
+from pykcworkshop import json_codec, logs, utils
+from pykcworkshop.chat import db
+from pykcworkshop.chat.api.websockets import broker, helpers
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+CACHE_SIZE: int = 300
+"""The number of recent messages cached for each room."""
+
+MAX_ROOMS: int = 256
+"""The number of rooms cached at once. The least recently used room is dropped first."""
+
+FIRST_PAGE_WINDOW = datetime.timedelta(minutes=1)
+"""How close to the current time a request's reference has to be to load an uncached room.
+
+Requests further back in time are only answered from rooms that are already cached, since
+a client that is that far into the history is past what the cache holds anyway.
+"""
+
+RECENT_WINDOW: float = 5.0
+"""The seconds a message broadcast in an uncached room is kept to be merged into the room
+when it is loaded. This covers the time the message can wait to be written to the db."""
+
+RECENT_SIZE: int = 1024
+"""The number of recent messages of uncached rooms kept at once, across every room."""
+
+
+class _RoomHistory:
+    __slots__ = ("timestamps", "entries", "complete")
+
+    def __init__(self, complete: bool) -> None:
+        self.timestamps: list[datetime.datetime] = []
+        self.entries: list[str] = []
+        """The JSON-encoded history entries, in the same order as `timestamps`."""
+        self.complete = complete
+        """Whether `entries` holds every message of the room rather than the newest ones."""
+
+    def add(self, timestamp: datetime.datetime, entry: str) -> None:
+        index = bisect.bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(index, timestamp)
+        self.entries.insert(index, entry)
+        if len(self.entries) > CACHE_SIZE:
+            del self.timestamps[0], self.entries[0]
+            self.complete = False
+
+    def page(self, reference: datetime.datetime, limit: int, newer: bool) -> Frame | None:
+        if newer:
+            # Everything newer than the oldest cached message is cached.
+            if not self.complete and (not self.timestamps or reference < self.timestamps[0]):
+                return None
+            start = bisect.bisect_right(self.timestamps, reference)
+            selected = self.entries[start : start + limit]
+        else:
+            end = bisect.bisect_left(self.timestamps, reference)
+            if end < limit and not self.complete:
+                return None
+            selected = self.entries[max(0, end - limit) : end][::-1]
+        return Frame.raw("[" + ", ".join(selected) + "]")
+
+
+def _encode(user_name: str, content: str, timestamp: datetime.datetime) -> str:
+    return json_codec.dumps(
+        {"user_name": user_name, "content": content, "timestamp": timestamp.isoformat()}
+    )
+
+
+def _entry(frame: Frame) -> tuple[datetime.datetime, str] | None:
+    """Return the timestamp and history entry of a broadcast chat message."""
+
+    try:
+        message = frame.payload
+        timestamp = datetime.datetime.fromisoformat(message["timestamp"])
+        return timestamp, _encode(message["user_name"], message["content"], timestamp)
+    except (ValueError, KeyError, TypeError) as e:
+        logs.debug(helpers.logger, {"msg": "Uncacheable chat message"}, err=e)
+        return None
+
+
+class HistoryCache:
+    """Recent chat history of the most recently used rooms, ready to send."""
+
+    def __init__(self) -> None:
+        self._rooms: collections.OrderedDict[str, _RoomHistory] = collections.OrderedDict()
+        self._loads: dict[str, asyncio.Future[_RoomHistory | None]] = {}
+        self._loading: dict[str, object] = {}
+        self._recent: collections.deque[tuple[float, str, Frame]] = collections.deque(
+            maxlen=RECENT_SIZE
+        )
+        self.hits = 0
+        """The number of requests answered from the cache."""
+        self.misses = 0
+        """The number of requests that had to go to the db."""
+
+    async def get(
+        self, room_id: str, reference: datetime.datetime, limit: int, newer: bool
+    ) -> Frame | None:
+        """Return the chat-history response for the request, or `None` if the request has
+        to be answered from the db.
+
+        See `pykcworkshop.chat.db.get_chat_history` for the meaning of the arguments.
+        """
+
+        room = self._rooms.get(room_id)
+        if room is not None:
+            self._rooms.move_to_end(room_id)
+        elif not newer and reference >= utils.now() - FIRST_PAGE_WINDOW:
+            room = await self._load(room_id)
+        frame = None if room is None else room.page(reference, limit, newer)
+        if frame is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return frame
+
+    def record(self, room_id: str, frame: Frame) -> None:
+        """Add a chat message broadcast in `room_id` to the room's cached history."""
+
+        room = self._rooms.get(room_id)
+        if room is None:
+            # Decoded only if the room is loaded while the message is still recent.
+            recorded_at = time.monotonic()
+            while self._recent and self._recent[0][0] < recorded_at - RECENT_WINDOW:
+                self._recent.popleft()
+            self._recent.append((recorded_at, room_id, frame))
+        elif (entry := _entry(frame)) is not None:
+            room.add(*entry)
+
+    def discard(self, room_id: str) -> None:
+        """Drop `room_id` from this process's cache, including a load that is in progress."""
+
+        self._rooms.pop(room_id, None)
+        self._loading.pop(room_id, None)
+
+    async def _load(self, room_id: str) -> _RoomHistory | None:
+        """Load the newest messages of `room_id` from the db, or wait for the load that is
+        already in progress, so a burst of clients opening the room costs one query."""
+
+        load = self._loads.get(room_id)
+        if load is not None:
+            return await asyncio.shield(load)
+        load = self._loads[room_id] = asyncio.get_running_loop().create_future()
+        token = self._loading[room_id] = object()
+        room = None
+        try:
+            async with db.get_session() as session:
+                rows = await db.get_chat_history(
+                    session,
+                    room_id=room_id,
+                    reference=datetime.datetime.max.replace(tzinfo=datetime.UTC),
+                    limit=CACHE_SIZE,
+                )
+            if self._loading.get(room_id) is token:
+                room = _RoomHistory(complete=len(rows) < CACHE_SIZE)
+                for user_name, content, timestamp in reversed(rows):
+                    room.timestamps.append(timestamp)
+                    room.entries.append(_encode(user_name, content, timestamp))
+                self._merge_recent(room_id, room)
+                self._rooms[room_id] = room
+                if len(self._rooms) > MAX_ROOMS:
+                    self._rooms.popitem(last=False)
+        finally:
+            if self._loading.get(room_id) is token:
+                del self._loading[room_id]
+            del self._loads[room_id]
+            load.set_result(room)
+        return room
+
+    def _merge_recent(self, room_id: str, room: _RoomHistory) -> None:
+        """Add the recent messages of `room_id` that the db didn't return to `room`.
+
+        Each loaded entry accounts for at most one recent message with the same entry, so
+        two messages that only look the same, like the same user sending the same text
+        twice at the same time, are both kept.
+        """
+
+        loaded = collections.Counter(room.entries)
+        since = time.monotonic() - RECENT_WINDOW
+        for recorded_at, recent_room_id, frame in self._recent:
+            if recent_room_id != room_id or recorded_at < since:
+                continue
+            entry = _entry(frame)
+            if entry is None:
+                continue
+            if loaded[entry[1]]:
+                loaded[entry[1]] -= 1
+            else:
+                room.add(*entry)
+
+
+cache = HistoryCache()
+"""The history cache for this process."""
+
+invalidations = broker.Broker("history-invalidation")
+"""Carries the ids of rooms whose cached history is stale to every worker process."""
+
+
+def invalidate(room_id: str) -> None:
+    """Drop `room_id` from the history cache of every worker process.
+
+    This MUST be called after writing a chat message to the db without broadcasting it
+    on the chat-message socket.
+    """
+
+    invalidations.publish(room_id, Frame.raw(""))
+
+
+broker.chat_message.add_listener(cache.record)
+invalidations.add_listener(lambda room_id, _: cache.discard(room_id))
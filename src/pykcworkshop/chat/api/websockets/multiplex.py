@@ -0,0 +1,190 @@
+"""Channel multiplexing for the version 2 websocket api.
+
+A `Multiplexer` owns every channel a client has open on one v2 websocket connection. It
+reads the client's envelopes, runs each subscribed channel's handler from
+`pykcworkshop.chat.api.websockets.channels` on its own task, and wraps everything the
+handlers send in envelopes naming the channel. See
+`pykcworkshop.chat.api.websockets.v2.multiplexed_socket` for the envelope protocol.
+"""
+
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable
+
+from quart import websocket
+
+from pykcworkshop import json_codec, logs
+from pykcworkshop.chat.api.websockets import channels, compact, helpers
+from pykcworkshop.chat.api.websockets.frames import Frame
+from pykcworkshop.chat.types import UserData
+
+MAX_CHANNELS: int = 16
+"""The number of channels a single connection can have open at once."""
+
+INBOX_SIZE: int = 64
+"""The number of messages a channel can have waiting to be handled before the connection
+stops reading from the client."""
+
+Handler = Callable[[channels.Channel], Awaitable[None]]
+
+
+class MultiplexedChannel(channels.Channel):
+    """A channel carried by a multiplexed connection."""
+
+    def __init__(self, name: str, connection: "Multiplexer") -> None:
+        self.name = name
+        self.inbox: asyncio.Queue[str] = asyncio.Queue(INBOX_SIZE)
+        self._connection = connection
+
+    async def accept(self, encoder: compact.Encoder | None = None) -> None:
+        # Envelopes are JSON, so the compact encoding doesn't apply to multiplexed channels.
+        await self._connection.send_control("subscribed", self.name)
+
+    async def receive(self) -> str:
+        return await self.inbox.get()
+
+    async def send(self, frame: Frame) -> None:
+        try:
+            data = frame.envelope(self.name)
+        except TypeError as e:
+            logs.debug(helpers.logger, {"msg": "Dropped binary frame", "ch": self.name}, err=e)
+            return
+        await websocket.send(data)
+
+    async def disconnect(self) -> None:
+        await self._connection.disconnect()
+
+
+class Multiplexer:
+    """The channels open on the current v2 websocket connection for the user `user_data`."""
+
+    def __init__(self, user_data: UserData) -> None:
+        self.user_data = user_data
+        self._channels: dict[str, tuple[MultiplexedChannel, asyncio.Task]] = {}
+        self._disconnecting = False
+
+    async def dispatch(self, raw_message: str | bytes) -> None:
+        """Handle one envelope received from the client."""
+
+        try:
+            envelope = json_codec.loads(raw_message)
+            op, name = envelope["op"], envelope["ch"]
+            if not isinstance(name, str):
+                raise TypeError("ch must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            logs.debug(helpers.logger, {"msg": "Malformed envelope"}, err=e)
+            await self.send_control("error", None, reason="Malformed envelope")
+            return
+        match op:
+            case "subscribe":
+                await self.subscribe(name)
+            case "unsubscribe":
+                await self.unsubscribe(name)
+            case "send":
+                await self.send_to(name, envelope.get("data"))
+            case _:
+                await self.send_control("error", name, reason="Unknown op")
+
+    async def subscribe(self, name: str) -> None:
+        """Open the channel `name` and start its handler."""
+
+        if name in self._channels:
+            await self.send_control("error", name, reason="Already subscribed")
+            return
+        if len(self._channels) >= MAX_CHANNELS:
+            await self.send_control("error", name, reason="Too many channels")
+            return
+        handler = self._route(name)
+        if handler is None:
+            await self.send_control("error", name, reason="Unknown channel")
+            return
+        channel = MultiplexedChannel(name, self)
+        self._channels[name] = (channel, asyncio.create_task(self._run(channel, handler)))
+
+    async def unsubscribe(self, name: str) -> None:
+        """Close the channel `name` and wait for its handler to clean up."""
+
+        entry = self._channels.pop(name, None)
+        if entry is None:
+            await self.send_control("error", name, reason="Not subscribed")
+            return
+        _, task = entry
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        await self.send_control("unsubscribed", name)
+
+    async def send_to(self, name: str, data: Any) -> None:
+        """Pass `data` to the handler of the channel `name` as a message from the client."""
+
+        entry = self._channels.get(name)
+        if entry is None:
+            await self.send_control("error", name, reason="Not subscribed")
+            return
+        channel, _ = entry
+        await channel.inbox.put(data if isinstance(data, str) else json_codec.dumps(data))
+
+    async def close(self) -> None:
+        """Close every open channel. Called when the client disconnects."""
+
+        tasks = [task for _, task in self._channels.values()]
+        self._channels.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def disconnect(self) -> None:
+        """Close the websocket connection because the client can't keep up with one of its
+        channels.
+
+        Every channel shares the one connection, so a client that is too slow for one
+        channel is too slow for all of them.
+        """
+
+        if self._disconnecting:
+            return
+        self._disconnecting = True
+        await websocket.close(1008, channels.SLOW_CONSUMER_REASON)
+
+    async def send_control(self, op: str, name: str | None, **fields: Any) -> None:
+        """Send a control envelope that isn't a channel message to the client."""
+
+        await websocket.send(json_codec.dumps({"op": op, "ch": name, **fields}))
+
+    async def _run(self, channel: MultiplexedChannel, handler: Handler) -> None:
+        try:
+            await handler(channel)
+        except channels.ChannelError as e:
+            await self.send_control("error", channel.name, reason=str(e))
+        except Exception as e:
+            logs.error(helpers.logger, {"msg": "Channel handler failed", "ch": channel.name}, err=e)
+            await self.send_control("error", channel.name, reason="Channel closed")
+        finally:
+            entry = self._channels.get(channel.name)
+            if entry is not None and entry[0] is channel:
+                del self._channels[channel.name]
+
+    def _route(self, name: str) -> Handler | None:
+        """Return the handler for the channel `name`, or `None` if there is no such channel.
+
+        Channel names are the paths of the equivalent v1 websocket endpoints, optionally
+        followed by a `#` and a tag, so that a client can open the same channel more than
+        once.
+        """
+
+        user_data = self.user_data
+        match name.split("#", 1)[0].split("/"):
+            case ["room", room_id, "chat-message"]:
+                return lambda channel: channels.chat_message(channel, room_id, user_data)
+            case ["room", room_id, "member-status"]:
+                return lambda channel: channels.member_status(channel, room_id, user_data)
+            case ["room", room_id, "client-sync"]:
+                return lambda channel: channels.client_sync(channel, room_id, user_data)
+            case ["room", room_id, "chat-history"]:
+                return lambda channel: channels.chat_history(channel, room_id, user_data)
+            case [interlocutor_id, "direct-message"]:
+                return lambda channel: channels.direct_message(channel, interlocutor_id, user_data)
+            case ["form-validation"]:
+                return channels.form_validation
+            case _:
+                return None
@@ -0,0 +1,247 @@
+"""Unix-domain-socket relay that lets the websocket brokers span several worker processes.
+
+When hypercorn runs more than one worker, clients in the same chatroom can be connected to
+different processes, so a frame published in one worker also has to reach the subscribers
+in every other worker. `UnixSocketRelay` is a `pykcworkshop.chat.api.websockets.broker.Backend`
+that does this on a single host without any outside service.
+
+One worker is elected as the hub by taking an exclusive `flock` on a lock file next to the
+socket path. The hub listens on the socket and forwards every record it receives to every
+other connected worker. All workers, including the hub, connect to the socket as ordinary
+peers. If the hub process exits, the OS releases its lock, and the first worker to notice the
+dropped connection takes over as the new hub.
+
+The relay is best-effort. Frames are always delivered to local subscribers immediately, and
+frames published while a worker is (re)connecting to the hub, or while the hub connection is
+backed up, are dropped for the other workers and counted in `UnixSocketRelay.dropped`. A
+relayed frame that can't be decoded or delivered is logged and skipped, without affecting the
+frames after it.
+
+This backend is only available on platforms with Unix domain sockets and `fcntl`.
+"""
+
+import asyncio
+import contextlib
+import os
+import struct
+from typing import Callable
+
+from pykcworkshop import logs
+from pykcworkshop.chat.api.websockets import broker
+from pykcworkshop.chat.api.websockets.frames import Frame
+from pykcworkshop.chat.api.websockets.helpers import logger
+
+RECONNECT_DELAY: float = 0.25
+"""Seconds to wait between attempts to connect to, or become, the hub."""
+
+MAX_BUFFERED: int = 4 * 1024 * 1024
+"""The number of unsent bytes a relay connection can buffer before frames are dropped."""
+
+_HEADER = struct.Struct(">BHHI")
+"""Record header: flags, channel length, room id length, data length."""
+
+_BINARY_FLAG = 1
+
+
+def encode_record(channel: str, room_id: str, frame: Frame) -> bytes:
+    """Encode a published frame as a length-prefixed relay record."""
+
+    data = frame.data
+    if isinstance(data, str):
+        flags, body = 0, data.encode()
+    else:
+        flags, body = _BINARY_FLAG, data
+    channel_bytes, room_bytes = channel.encode(), room_id.encode()
+    header = _HEADER.pack(flags, len(channel_bytes), len(room_bytes), len(body))
+    return b"".join([header, channel_bytes, room_bytes, body])
+
+
+def decode_record(record: bytes) -> tuple[str, str, Frame]:
+    """Decode a relay record into the channel, room id, and frame that were published."""
+
+    flags, channel_len, room_len, _ = _HEADER.unpack_from(record)
+    room_start = _HEADER.size + channel_len
+    data_start = room_start + room_len
+    channel = record[_HEADER.size : room_start].decode()
+    room_id = record[room_start:data_start].decode()
+    body = record[data_start:]
+    data = body if flags & _BINARY_FLAG else body.decode()
+    return channel, room_id, Frame.raw(data)
+
+
+async def read_record(reader: asyncio.StreamReader) -> bytes:
+    """Read one complete record from `reader` without decoding it.
+
+    Raises:
+        asyncio.IncompleteReadError:
+            If the connection is closed before a full record is read.
+    """
+
+    header = await reader.readexactly(_HEADER.size)
+    _, channel_len, room_len, data_len = _HEADER.unpack(header)
+    return header + await reader.readexactly(channel_len + room_len + data_len)
+
+
+def _write(writer: asyncio.StreamWriter, record: bytes) -> bool:
+    """Write `record` unless the connection is closing or backed up.
+
+    Returns whether the record was written.
+    """
+
+    if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+        return False
+    writer.write(record)
+    return True
+
+
+class _Hub:
+    """The relay server that forwards records between worker processes."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._server: asyncio.Server | None = None
+        self._peers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        # Only the lock holder gets here, so any existing socket file is stale.
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_peer, self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for peer in list(self._peers):
+            peer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                record = await read_record(reader)
+                for peer in self._peers:
+                    if peer is not writer and not _write(peer, record):
+                        logs.warning(logger, {"msg": "Dropped relay record for a slow worker"})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+
+class UnixSocketRelay:
+    """`pykcworkshop.chat.api.websockets.broker.Backend` that relays frames between worker
+    processes on one host over the Unix domain socket at `path`.
+
+    Args:
+        path:
+            Filesystem path for the relay socket. Every worker must use the same path.
+            A lock file is created at `path` + `".lock"` for electing the hub.
+        deliver:
+            Callback that delivers a frame received from another worker to this process's
+            subscribers. Defaults to `pykcworkshop.chat.api.websockets.broker.deliver`.
+    """
+
+    def __init__(
+        self, path: str, deliver: Callable[[str, str, Frame], int] = broker.deliver
+    ) -> None:
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.dropped = 0
+        """The number of frames that could not be forwarded to the other workers."""
+
+        self._deliver = deliver
+        self._hub: _Hub | None = None
+        self._lock_fd: int | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_hub(self) -> bool:
+        """Whether this process is currently the relay hub."""
+
+        return self._hub is not None
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether this process is currently connected to the relay hub."""
+
+        return self._writer is not None
+
+    def publish(self, channel: str, room_id: str, frame: Frame) -> None:
+        if self._writer is None or not _write(self._writer, encode_record(channel, room_id, frame)):
+            self.dropped += 1
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        if self._hub is not None:
+            await self._hub.stop()
+            self._hub = None
+        self._release_lock()
+
+    def _try_lock(self) -> bool:
+        """Try to take the hub lock without blocking."""
+
+        import fcntl
+
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _release_lock(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Closing the descriptor releases the flock.
+            self._lock_fd = None
+
+    async def _become_hub(self) -> None:
+        """Start the hub, or release the hub lock for another worker if it can't start."""
+
+        hub = _Hub(self.path)
+        try:
+            await hub.start()
+        except OSError as e:
+            logs.error(
+                logger, {"msg": "Failed to start broker relay hub", "path": self.path}, err=e
+            )
+            self._release_lock()
+            return
+        self._hub = hub
+        logs.info(logger, {"msg": "Became broker relay hub", "path": self.path})
+
+    async def _run(self) -> None:
+        while True:
+            if self._hub is None and self._try_lock():
+                await self._become_hub()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionError):
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            self._writer = writer
+            try:
+                while True:
+                    record = await read_record(reader)
+                    try:
+                        self._deliver(*decode_record(record))
+                    except Exception as e:
+                        logs.error(logger, {"msg": "Failed to deliver relayed frame"}, err=e)
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                logs.warning(logger, {"msg": "Lost connection to broker relay hub"}, err=e)
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(RECONNECT_DELAY)
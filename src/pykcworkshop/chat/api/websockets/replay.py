@@ -0,0 +1,97 @@
+"""In-memory replay of recent chat messages for clients catching up after a reconnect.
+
+Every chat message delivered in this process is stamped with a `cursor` and kept in a
+bounded per-room ring buffer. A client that reconnects sends the cursor of the last message
+it saw on the chat-history socket and gets the messages it missed straight from memory, so
+a reconnect storm after a network blip or a deploy doesn't turn into a DB storm. See
+`pykcworkshop.chat.api.websockets.v1.stream_chat_history` for the protocol.
+
+A cursor is `"<epoch>-<seq>"`. The epoch is random per process, and sequence numbers
+increase monotonically across every room in the process, so a cursor issued by another
+worker or by a process that has since restarted is recognized as foreign. `ReplayBuffer.after`
+returns `None` for those, and for cursors whose messages have already been evicted, and the
+caller falls back to the DB.
+"""
+
+import collections
+import secrets
+from typing import Any
+
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+EPOCH: str = secrets.token_hex(4)
+"""Identifies the cursors issued by this process."""
+
+ROOM_SIZE: int = 256
+"""The number of recent messages kept for each room."""
+
+MAX_ROOMS: int = 1024
+"""The number of rooms kept in memory. The least recently active room is dropped first."""
+
+
+class _RoomLog:
+    __slots__ = ("entries", "floor")
+
+    def __init__(self, floor: int) -> None:
+        self.entries: collections.deque[tuple[int, Frame]] = collections.deque(maxlen=ROOM_SIZE)
+        self.floor = floor
+        """Every message of the room with a sequence number up to this one is gone."""
+
+
+class ReplayBuffer:
+    """Ring buffers of the recent chat messages of the most recently active rooms."""
+
+    def __init__(self) -> None:
+        self._rooms: collections.OrderedDict[str, _RoomLog] = collections.OrderedDict()
+        self._seq = 0
+
+    def record(self, room_id: str, frame: Frame) -> Frame:
+        """Stamp `frame` with the next cursor, keep it for `room_id`, and return the stamped
+        frame that should be delivered in its place.
+
+        Frames that aren't JSON objects can't carry a cursor, so they are returned as is and
+        not kept.
+        """
+
+        try:
+            payload = frame.payload
+        except ValueError:
+            return frame
+        if not isinstance(payload, dict):
+            return frame
+        log = self._rooms.get(room_id)
+        if log is None:
+            log = self._rooms[room_id] = _RoomLog(self._seq)
+            if len(self._rooms) > MAX_ROOMS:
+                self._rooms.popitem(last=False)
+        else:
+            self._rooms.move_to_end(room_id)
+        self._seq += 1
+        stamped = Frame({**payload, "cursor": f"{EPOCH}-{self._seq}"})
+        if len(log.entries) == log.entries.maxlen:
+            log.floor = log.entries[0][0]
+        log.entries.append((self._seq, stamped))
+        return stamped
+
+    def after(self, room_id: str, cursor: str, limit: int) -> list[Any] | None:
+        """Return the payloads of up to `limit` of the oldest messages in `room_id` sent
+        after the message with `cursor`, in chronological order.
+
+        Returns `None` if the cursor is malformed, was issued by another process, or the
+        messages after it are no longer in memory.
+        """
+
+        epoch, _, seq_str = cursor.partition("-")
+        if epoch != EPOCH or not seq_str.isdigit():
+            return None
+        seq = int(seq_str)
+        log = self._rooms.get(room_id)
+        if log is None or seq < log.floor:
+            return None
+        missed: list[Any] = []
+        for entry_seq, frame in log.entries:
+            if len(missed) >= limit:
+                break
+            if entry_seq > seq:
+                missed.append(frame.payload)
+        return missed
@@ -1,12 +1,18 @@
 """This module provides the version 1 websocket-based api endpoints of the backend.
 
 All endpoints in this module need to authenticate the logged in user on connection except
-for the form-validation endpoint, which is usable outside of a logged in session.
+for the form-validation endpoint, which is usable outside of a logged in session. The room
+endpoints also reject the handshake with a 403 response if the user hasn't joined the room.
+
+Every endpoint speaks JSON by default. The chat-message, member-status, and chat-history
+endpoints can also send their messages in the compact binary encoding described in
+`pykcworkshop.chat.api.websockets.compact` if the client opts into it during the handshake.
 """
 
 from quart import Blueprint
 
-from pykcworkshop.chat.api.websockets import helpers
+from pykcworkshop.chat.api import http
+from pykcworkshop.chat.api.websockets import channels, helpers
 from pykcworkshop.chat.types import UserData
 
 bp = Blueprint("v1-websockets", __name__, url_prefix="/v1")
@@ -43,15 +49,27 @@ async def chat_message_socket(room_token: str, user_data: UserData):
     parse the date and localize the timezone information in Javascript, so that the correct
     date and time are displayed based on the location of the user.
 
+    The `user_name` field that is sent is always the name of the authenticated user, whatever
+    the client put in the message, so a client can't post messages under someone else's name.
+    The db only stores the author's id, so the chat-history endpoint couldn't repeat a
+    different name anyway.
+
     This websocket should also silently discard any messages with an empty `content` field.
     The client's UI should prevent sending empty messages, but UI programming can be flaky, so
     we also want to ensure that we don't store empty messages in the db and/or broadcast them
     to all clients. We don't need to send back any kind of error or anything, so if a message
     comes in with a `content` field that is an empty string, then we can simply discard the
     message without queueing anything to send back.
+
+    Every message the server sends also has a `cursor` field, an opaque string that a
+    reconnecting client can pass to the chat-history endpoint to catch up on the messages it
+    missed. See `stream_chat_history`.
     """
 
-    return "NOT FOUND", 404
+    try:
+        await channels.chat_message(channels.WebsocketChannel(), room_token, user_data)
+    except channels.ChannelError:
+        return http.helpers.forbidden()
 
 
 @bp.websocket("/room/<room_token>/member-status")
@@ -75,12 +93,14 @@ async def member_status_socket(room_token: str, user_data: UserData):
     This handler doesn't need to transform the data that it receives from
     the client in any way. It simply has to broadcast the JSON messages
     received to all connected clients including the client that the message came from.
+    Messages whose `user_id` isn't the id of the connected user are not broadcast.
 
     This handler also needs to send a message with the status 'Offline' to all connected
     clients when a client disconnects, so that the remaining clients will remain up-to-date
     with the disconnected client's status in the chatroom. This needs to be sent from the
     server since there is no way for the client to send this message when it disconnects
-    unexpectedly.
+    unexpectedly. A user who is connected more than once, for example from several tabs,
+    only goes offline when their last connection closes.
 
     The offline message needs to have the same structure as the messages that are
     receive()d from the clients, so it should look like this:
@@ -90,14 +110,26 @@ async def member_status_socket(room_token: str, user_data: UserData):
             user_name: disconnected_user_name,
             user_status: 'Offline',
         }
+
+    Status updates are coalesced per room, so while a room is busy, each user's status is
+    broadcast at most once per `pykcworkshop.chat.api.websockets.coalesce.TICK_INTERVAL`
+    with only the latest status they sent. The 'Offline' message is always sent immediately.
+
+    When a client connects, the server first sends it a snapshot of the current statuses of
+    every other member in the room as a single JSON array of these messages, each with an
+    added `last_changed` field holding the ISO 8601 time of the member's last status change.
+    The snapshot is not sent if no other members are present.
     """
 
-    return "NOT FOUND", 404
+    try:
+        await channels.member_status(channels.WebsocketChannel(), room_token, user_data)
+    except channels.ChannelError:
+        return http.helpers.forbidden()
 
 
 @bp.websocket("/room/<room_token>/client-sync")
-@helpers.auth_required(inject_user_data=False)
-async def client_sync_socket(room_token: str):
+@helpers.auth_required(inject_user_data=True)
+async def client_sync_socket(room_token: str, user_data: UserData):
     """Many;Many Websocket connection that brokers arbitrary client-client messages.
 
     This handler should receive() arbitrary string messages from connected clients
@@ -126,12 +158,15 @@ async def client_sync_socket(room_token: str):
     without requesting changes to the backend.
     """
 
-    return "NOT FOUND", 404
+    try:
+        await channels.client_sync(channels.WebsocketChannel(), room_token, user_data)
+    except channels.ChannelError:
+        return http.helpers.forbidden()
 
 
 @bp.websocket("/room/<room_token>/chat-history")
-@helpers.auth_required(inject_user_data=False)
-async def stream_chat_history(room_token: str):
+@helpers.auth_required(inject_user_data=True)
+async def stream_chat_history(room_token: str, user_data: UserData):
     """1;1 WebSocket that streams older messages to the client in chunks to
     facilitate features such as infinite scroll and chat history without
     laggy or clunky interfaces. The client will send JSON messages with the following structure:
@@ -174,9 +209,49 @@ async def stream_chat_history(room_token: str):
 
     In other words, this corresponds to a SQL query for messages older|newer than the reference
     timestamp, ordered by their timestamps descending|ascending, and with a limit of `chunk_size`.
+
+    A client that reconnects to a room can also add an `after` field with the `cursor` of the
+    last chat message it received, in which case `newer` is implied:
+
+        {
+            timestamp: int,
+            chunk_size: int,
+            after: str,
+        }
+
+    If the server still has the messages sent after that cursor in memory, it returns them
+    from there, each with its own `cursor`, without touching the db. Otherwise, for example
+    after a server restart, the request is answered from the db exactly as if `after` was
+    left out, so `timestamp` should be the timestamp of the same message. Either way, a
+    response shorter than `chunk_size` means the client has caught up.
+
+    Paging by timestamp skips or repeats messages that share a timestamp at a page boundary.
+    Clients that need exact paging can send a `page_cursor` field instead of `timestamp`:
+
+        {
+            page_cursor: str | null,
+            chunk_size: int,
+            newer: bool,
+        }
+
+    A `page_cursor` of `null` asks for the first page, which holds the newest messages if
+    `newer` is False and the oldest messages if `newer` is True. The server then responds
+    with an object instead of an array:
+
+        {
+            messages: {user_name: str, content: str, timestamp: str}[],
+            next_page_cursor: str | null,
+        }
+
+    The `messages` are ordered as described above, and `next_page_cursor` is the opaque
+    cursor to send for the next page in the same direction, or `null` once the end of the
+    history is reached.
     """
 
-    return "NOT FOUND", 404
+    try:
+        await channels.chat_history(channels.WebsocketChannel(), room_token, user_data)
+    except channels.ChannelError:
+        return http.helpers.forbidden()
 
 
 @bp.websocket("/<interlocutor_id>/direct-message")
@@ -200,7 +275,10 @@ async def slide_in_those_dms(interlocutor_id: int, user_data: UserData):
     clean.
     """
 
-    return "NOT FOUND", 404
+    try:
+        await channels.direct_message(channels.WebsocketChannel(), interlocutor_id, user_data)
+    except channels.ChannelError as e:
+        return http.helpers.bad_request(str(e))
 
 
 @bp.websocket("/form-validation")
@@ -297,4 +375,4 @@ async def form_validation():
       - See `pykcworkshop.chat.db.models.ChatMessage` for this limit.
     """
 
-    return "NOT FOUND", 404
+    await channels.form_validation(channels.WebsocketChannel())
@@ -0,0 +1,63 @@
+"""This module provides the version 2 websocket-based api endpoints of the backend.
+
+Version 2 carries every channel of the version 1 api over a single multiplexed websocket
+connection per client, so the client only pays for one connection and one CSRF and JWT
+handshake no matter how many channels it has open.
+"""
+
+from quart import Blueprint, websocket
+
+from pykcworkshop.chat.api.websockets import helpers, multiplex
+from pykcworkshop.chat.types import UserData
+
+bp = Blueprint("v2-websockets", __name__, url_prefix="/v2")
+"""This blueprint contains all version 2 websocket routes for the chat app."""
+
+
+@bp.websocket("/socket")
+@helpers.auth_required(inject_user_data=True)
+async def multiplexed_socket(user_data: UserData):
+    """Websocket connection that carries any number of channels for the logged in user.
+
+    Every message sent in either direction is a JSON envelope with an `op` field naming the
+    operation and a `ch` field naming the channel it applies to. Channel names are the paths
+    of the equivalent v1 websocket endpoints without the `/chat/api/v1/` prefix, for example
+    `"room/<room_token>/chat-message"`, `"<user_id>/direct-message"`, or `"form-validation"`.
+    A channel name can end with `#` followed by any tag to open the same channel more than
+    once on one connection, for example `"form-validation#dm"`.
+
+    The client sends the following envelopes:
+
+        {op: "subscribe", ch: str}
+        {op: "unsubscribe", ch: str}
+        {op: "send", ch: str, data: str}
+
+    The `data` field of a `send` envelope is the message the client would send on the
+    equivalent v1 websocket, encoded exactly as it would be sent there.
+
+    The server sends the following envelopes:
+
+        {op: "subscribed", ch: str}
+        {op: "unsubscribed", ch: str}
+        {op: "message", ch: str, data: str}
+        {op: "error", ch: str | null, reason: str}
+
+    A channel is open once the server sends `subscribed` for it. From then on, the channel
+    behaves exactly like the equivalent v1 websocket, and every message the v1 websocket
+    would send is sent in the `data` field of a `message` envelope. Messages the client
+    sends before the `subscribed` envelope arrives are handled once the channel opens.
+
+    The server sends `unsubscribed` once the channel is closed and all of its cleanup, such
+    as broadcasting the 'Offline' member status, is done. An `error` envelope means the
+    envelope the client sent was rejected or the channel could not be opened, and the
+    `reason` is safe to log in the browser console. If the error closed a channel, the client
+    has to subscribe again to reopen it.
+    """
+
+    await websocket.accept()
+    connection = multiplex.Multiplexer(user_data)
+    try:
+        while True:
+            await connection.dispatch(await websocket.receive())
+    finally:
+        await connection.close()
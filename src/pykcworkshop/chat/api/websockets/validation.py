@@ -0,0 +1,178 @@
+"""Realtime form validation for the form-validation websocket channel.
+
+Each supported form type is a `Form`, a list of `Rule`s that each return the reason the
+form data failed the rule, or an empty string if it passed. A form runs its rules from the
+cheapest `Tier` to the most expensive one and stops at the first failure, so a form that
+fails a cheap check never pays for a lookup. Whether a name is taken is answered from
+`pykcworkshop.chat.names.index`, so validation doesn't query the db on every keystroke.
+
+A new form type is supported by adding its `Form` to `VALIDATORS`. Every rule counts how
+often it ran and how long it took, which shows where validation time goes. The
+form-validation channel logs the counters of the forms it validated when it closes.
+"""
+
+import enum
+import inspect
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy.orm import InstrumentedAttribute
+
+from pykcworkshop.chat import db, names
+
+Check = Callable[[dict], str | Awaitable[str]]
+
+
+class Tier(enum.IntEnum):
+    """How expensive a rule is to check. Rules of a cheaper tier always run first."""
+
+    SHAPE = enum.auto()
+    """Checks on the presence and type of a field."""
+
+    LENGTH = enum.auto()
+    """Checks of a field against the limits of the db column it is saved in."""
+
+    LOOKUP = enum.auto()
+    """Checks that look the field up in an index or the db."""
+
+
+class Rule:
+    """A single check on the form data, with counters of how often and how long it ran."""
+
+    def __init__(self, name: str, tier: Tier, check: Check) -> None:
+        self.name = name
+        self.tier = tier
+        self.check = check
+        self.calls = 0
+        """The number of times the rule was checked."""
+        self.failures = 0
+        """The number of times the form data failed the rule."""
+        self.seconds = 0.0
+        """The total number of seconds spent checking the rule."""
+
+
+class Form:
+    """The rules of one form type, checked from the cheapest tier up until one fails."""
+
+    def __init__(self, *rules: Rule) -> None:
+        self.rules = sorted(rules, key=lambda rule: rule.tier)
+        """The rules of the form, in the order they are checked."""
+
+    async def __call__(self, form_data: dict) -> str:
+        """Return the reason `form_data` failed validation, or an empty string if it passed."""
+
+        for rule in self.rules:
+            start = time.perf_counter()
+            failure_reason = rule.check(form_data)
+            if inspect.isawaitable(failure_reason):
+                failure_reason = await failure_reason
+            rule.seconds += time.perf_counter() - start
+            rule.calls += 1
+            if failure_reason:
+                rule.failures += 1
+                return failure_reason
+        return ""
+
+    def stats(self) -> dict[str, dict]:
+        """Return rule name -> the counters of the rule, totalled over the whole process."""
+
+        return {
+            rule.name: {
+                "calls": rule.calls,
+                "failures": rule.failures,
+                "seconds": round(rule.seconds, 6),
+            }
+            for rule in self.rules
+        }
+
+
+def column_length(column: InstrumentedAttribute) -> int:
+    """Return the character limit of a string column.
+
+    Example:
+
+        >>> from pykcworkshop.chat import db
+        >>> from pykcworkshop.chat.api.websockets.validation import column_length
+        >>> column_length(db.models.ChatMessage.content)
+        512
+    """
+
+    return column.type.length
+
+
+def is_text(field: str, failure_reason: str, allow_empty: bool = False) -> Rule:
+    """A rule that `field` is a string, which is also non-empty unless `allow_empty`."""
+
+    def check(form_data: dict) -> str:
+        value = form_data.get(field)
+        if not isinstance(value, str) or (value == "" and not allow_empty):
+            return failure_reason
+        return ""
+
+    return Rule(f"{field} is text", Tier.SHAPE, check)
+
+
+def is_int(field: str, failure_reason: str) -> Rule:
+    """A rule that `field` is an integer. Booleans are rejected, even though `bool` is a
+    subclass of `int`."""
+
+    def check(form_data: dict) -> str:
+        value = form_data.get(field)
+        return "" if isinstance(value, int) and not isinstance(value, bool) else failure_reason
+
+    return Rule(f"{field} is an integer", Tier.SHAPE, check)
+
+
+def fits(field: str, label: str, column: InstrumentedAttribute) -> Rule:
+    """A rule that the string in `field` fits in the db column `column`."""
+
+    limit = column_length(column)
+    failure_reason = f"{label} must be at most {limit} characters"
+
+    def check(form_data: dict) -> str:
+        return failure_reason if len(form_data[field]) > limit else ""
+
+    return Rule(f"{field} fits", Tier.LENGTH, check)
+
+
+async def _user_name_is_free(form_data: dict) -> str:
+    user_name = form_data["user_name"]
+    if await names.index.is_user_name_taken(user_name):
+        return f"User name {user_name} is already taken"
+    return ""
+
+
+async def _room_name_is_free(form_data: dict) -> str:
+    room_name = form_data["room_name"]
+    if await names.index.is_room_name_taken(form_data["user_id"], room_name):
+        return f"You already have a room named {room_name}"
+    return ""
+
+
+validate_create_user = Form(
+    is_text("user_name", "User name is required"),
+    fits("user_name", "User name", db.models.User.name),
+    Rule("user_name is free", Tier.LOOKUP, _user_name_is_free),
+)
+"""Validate the user name for a new user."""
+
+validate_create_room = Form(
+    is_text("room_name", "Room name is required"),
+    is_int("user_id", "Invalid user"),
+    fits("room_name", "Room name", db.models.Room.name),
+    Rule("room_name is free", Tier.LOOKUP, _room_name_is_free),
+)
+"""Validate the room name for a new room owned by the user with id `user_id`."""
+
+validate_chat_message = Form(
+    is_text("content", "Message content is required", allow_empty=True),
+    fits("content", "Message", db.models.ChatMessage.content),
+)
+"""Validate the content of a chat message."""
+
+VALIDATORS: dict[str, Form] = {
+    "create-user": validate_create_user,
+    "create-room": validate_create_room,
+    "chat-message": validate_chat_message,
+}
+"""Form type -> validator for every form type the form-validation channel accepts."""
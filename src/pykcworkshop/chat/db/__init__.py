@@ -16,22 +16,33 @@ import enum
 
 from sqlalchemy.exc import IntegrityError
 
-from . import columns, models  # noqa: F401
+from . import columns, models, writer  # noqa: F401
 from .sessions import (  # noqa: F401
     add_user_to_room,
     connect,
     create_chat_message,
     create_room,
     create_user,
+    get_chat_history,
+    get_chat_history_page,
+    get_joined_rooms,
+    get_owned_rooms,
     get_room_by_id,
     get_room_by_name,
+    get_room_member_ids,
+    get_room_members,
+    get_room_names,
+    get_room_summary,
     get_session,
     get_session_proxy,
     get_system_user,
     get_user_by_id,
     get_user_by_name,
+    get_user_names,
     initialize,
+    is_room_member,
 )
+from .writer import get_message_writer  # noqa: F401
 
 
 class ConstraintViolation(enum.Enum):
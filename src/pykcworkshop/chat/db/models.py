@@ -6,7 +6,7 @@ import datetime
 from typing import Any, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import Column, ForeignKey, String, Table, UniqueConstraint
+from sqlalchemy import Column, ForeignKey, Index, String, Table, UniqueConstraint
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -16,6 +16,10 @@ from pykcworkshop.chat.db.columns import UTCDateTime
 
 load_dotenv()
 
+# Relationships are never loaded implicitly. Each query in `pykcworkshop.chat.db.sessions`
+# states the loader options it needs, and touching a relationship that wasn't loaded
+# raises instead of silently emitting another query.
+
 
 class BaseModel(AsyncAttrs, DeclarativeBase):
     """Base ORM class for all db tables."""
@@ -71,11 +75,11 @@ class Room(BaseModel):
     owner_id: Mapped[int] = mapped_column(
         ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE")
     )
-    owner: Mapped["User"] = relationship(foreign_keys=[owner_id], lazy="selectin")
+    owner: Mapped["User"] = relationship(foreign_keys=[owner_id], lazy="raise")
     members: Mapped[list["User"]] = relationship(
         secondary=table_room_member,
         back_populates="joined_rooms",
-        lazy="selectin",
+        lazy="raise",
     )
 
     __table_args__ = (UniqueConstraint(name, owner_id),)
@@ -93,11 +97,11 @@ class User(BaseModel):
     token_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("user_token.id", onupdate="CASCADE", ondelete="CASCADE")
     )
-    token: Mapped[Optional["UserToken"]] = relationship(foreign_keys=[token_id], lazy="selectin")
+    token: Mapped[Optional["UserToken"]] = relationship(foreign_keys=[token_id], lazy="raise")
     joined_rooms: Mapped[list["Room"]] = relationship(
         secondary=table_room_member,
         back_populates="members",
-        lazy="selectin",
+        lazy="raise",
     )
 
 
@@ -110,10 +114,13 @@ class ChatMessage(BaseModel):
     author_id: Mapped[int] = mapped_column(
         ForeignKey("user.id", onupdate="CASCADE", ondelete="CASCADE")
     )
-    author: Mapped["User"] = relationship(foreign_keys=[author_id], lazy="selectin")
+    author: Mapped["User"] = relationship(foreign_keys=[author_id], lazy="raise")
     room_id: Mapped[str] = mapped_column(
         ForeignKey("room.id", onupdate="CASCADE", ondelete="CASCADE")
     )
-    room: Mapped["Room"] = relationship(foreign_keys=[room_id], lazy="selectin")
+    room: Mapped["Room"] = relationship(foreign_keys=[room_id], lazy="raise")
     content: Mapped[str] = mapped_column(String(512))
     timestamp: Mapped[UTCDateTime] = mapped_column(UTCDateTime, default=utils.now)
+
+    # Every chat history query filters on the room and pages by (timestamp, id).
+    __table_args__ = (Index("ix_chat_message_room_id_timestamp_id", room_id, timestamp, id),)
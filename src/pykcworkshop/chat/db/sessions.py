@@ -16,18 +16,21 @@ import asyncio
 import datetime
 import hashlib
 import os
+from typing import Sequence
 
 import jwt
 from dotenv import load_dotenv
-from sqlalchemy import delete, event, insert, select
+from sqlalchemy import Row, delete, event, insert, select, tuple_
+from sqlalchemy.engine import Connection
 from sqlalchemy.engine.interfaces import DBAPIConnection
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.exc import IntegrityError, NoResultFound, OperationalError
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_scoped_session,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.orm import joinedload
 from sqlalchemy.pool import ConnectionPoolEntry
 
 from pykcworkshop import utils
@@ -59,17 +62,41 @@ async def initialize(drop_tables: bool = False) -> None:
 
     This function is safe to call on an existing db if `drop_tables` is False, so
     it should be called on application startup.
+
+    When several worker processes start at once, they can race to create the same tables
+    and system user, so losing that race is treated the same as finding them already there.
     """
 
-    async with _engine.begin() as conn:
-        if drop_tables:
-            await conn.run_sync(models.BaseModel.metadata.drop_all)
-        await conn.run_sync(models.BaseModel.metadata.create_all)
+    try:
+        await _create_tables(drop_tables)
+    except OperationalError as e:
+        if "already exists" not in str(e):
+            raise e
+        await _create_tables(drop_tables=False)  # Another worker created them first.
     async with get_session() as session:
         try:
             await get_system_user(session)
         except NoResultFound:
-            await create_user(session, user_name="System")  # Create system user.
+            try:
+                await create_user(session, user_name="System")  # Create system user.
+            except IntegrityError:
+                pass  # Another worker created it first.
+
+
+async def _create_tables(drop_tables: bool) -> None:
+    async with _engine.begin() as conn:
+        if drop_tables:
+            await conn.run_sync(models.BaseModel.metadata.drop_all)
+        await conn.run_sync(models.BaseModel.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+
+
+def _create_missing_indexes(conn: Connection) -> None:
+    # `create_all` only creates the indexes of new tables, so indexes added to an existing
+    # table have to be created separately.
+    for table in models.BaseModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 
 async def create_user(
@@ -100,7 +127,7 @@ async def create_user(
     token_hash = hashlib.sha512(token.encode()).hexdigest()
     shortened_hash = hashlib.sha1(token_hash.encode()).hexdigest()
     id_hash = shortened_hash + str(new_user.id)
-    pw_hash = tokens.pw_hasher().hash(shortened_hash)
+    pw_hash = await tokens.get_hash_pool().hash(shortened_hash)
     new_user_token = models.UserToken(token=token, password_hash=pw_hash)
     session.add(new_user_token)
     new_user.token = new_user_token
@@ -135,32 +162,136 @@ async def create_room(session: AsyncSession, *, room_name: str, creator_id: int)
     return new_room
 
 
-async def get_user_by_id(session: AsyncSession, user_id: int) -> models.User:
-    """Fetch a single user row by PK."""
+async def get_user_by_id(
+    session: AsyncSession, user_id: int, *, with_token: bool = False
+) -> models.User:
+    """Fetch a single user row by PK.
+
+    The user's `token` is joined in the same query if `with_token` is True. No other
+    relationships are loaded.
+    """
 
     stmt = select(models.User).where(models.User.id == user_id)
+    if with_token:
+        stmt = stmt.options(joinedload(models.User.token))
     return (await session.execute(stmt)).scalar_one()
 
 
-async def get_user_by_name(session: AsyncSession, user_name: str) -> models.User:
+async def get_user_by_name(
+    session: AsyncSession, user_name: str, *, with_token: bool = False
+) -> models.User:
+    """Fetch a single user row by name.
+
+    The user's `token` is joined in the same query if `with_token` is True. No other
+    relationships are loaded.
+    """
+
     stmt = select(models.User).where(models.User.name == user_name)
+    if with_token:
+        stmt = stmt.options(joinedload(models.User.token))
     return (await session.execute(stmt)).scalar_one()
 
 
 async def get_room_by_id(session: AsyncSession, room_id: str) -> models.Room:
-    """Fetch a single room row by PK."""
+    """Fetch a single room row by PK, without its owner or members."""
 
     stmt = select(models.Room).where(models.Room.id == room_id)
     return (await session.execute(stmt)).scalar_one()
 
 
 async def get_room_by_name(session: AsyncSession, room_name: str) -> models.Room:
+    """Fetch a single room row by name, without its owner or members."""
+
     stmt = select(models.Room).where(models.Room.name == room_name)
     return (await session.execute(stmt)).scalar_one()
 
 
+async def get_room_summary(session: AsyncSession, room_id: str) -> Row:
+    """Fetch the (id, name) of a single room by PK without loading the `Room` model and its
+    relationships.
+
+    Raises:
+        NoResultFound:
+            If there is no room with id `room_id`.
+    """
+
+    stmt = select(models.Room.id, models.Room.name).where(models.Room.id == room_id)
+    return (await session.execute(stmt)).one()
+
+
+async def get_room_members(session: AsyncSession, room_id: str) -> Sequence[Row]:
+    """Fetch the (id, name) of every member of room `room_id`.
+
+    Returns an empty sequence if there is no such room.
+    """
+
+    stmt = (
+        select(models.User.id, models.User.name)
+        .join(models.table_room_member, models.table_room_member.c.member_id == models.User.id)
+        .where(models.table_room_member.c.room_id == room_id)
+    )
+    return (await session.execute(stmt)).all()
+
+
+async def get_room_member_ids(session: AsyncSession, room_id: str) -> set[int]:
+    """Fetch the ids of every member of room `room_id` from the `room_member` table alone.
+
+    Returns an empty set if there is no such room.
+    """
+
+    stmt = select(models.table_room_member.c.member_id).where(
+        models.table_room_member.c.room_id == room_id
+    )
+    return set((await session.execute(stmt)).scalars().all())
+
+
+async def is_room_member(session: AsyncSession, room_id: str, user_id: int) -> bool:
+    """Return whether the user `user_id` is a member of the room `room_id`, without loading
+    the other members."""
+
+    stmt = (
+        select(models.table_room_member.c.member_id)
+        .where(
+            models.table_room_member.c.room_id == room_id,
+            models.table_room_member.c.member_id == user_id,
+        )
+        .limit(1)
+    )
+    return (await session.execute(stmt)).first() is not None
+
+
+async def get_user_names(session: AsyncSession) -> Sequence[str]:
+    """Fetch the name of every user."""
+
+    return (await session.execute(select(models.User.name))).scalars().all()
+
+
+async def get_room_names(session: AsyncSession) -> Sequence[Row]:
+    """Fetch the (owner_id, name) of every room."""
+
+    return (await session.execute(select(models.Room.owner_id, models.Room.name))).all()
+
+
+async def get_joined_rooms(session: AsyncSession, user_id: int) -> Sequence[Row]:
+    """Fetch the (id, name) of every room that user `user_id` has joined."""
+
+    stmt = (
+        select(models.Room.id, models.Room.name)
+        .join(models.table_room_member, models.table_room_member.c.room_id == models.Room.id)
+        .where(models.table_room_member.c.member_id == user_id)
+    )
+    return (await session.execute(stmt)).all()
+
+
+async def get_owned_rooms(session: AsyncSession, user_id: int) -> Sequence[Row]:
+    """Fetch the (id, name) of every room that user `user_id` owns."""
+
+    stmt = select(models.Room.id, models.Room.name).where(models.Room.owner_id == user_id)
+    return (await session.execute(stmt)).all()
+
+
 async def get_system_user(session: AsyncSession) -> models.User:
-    """Fetch the system user from the db."""
+    """Fetch the system user from the db, without its token or rooms."""
 
     stmt = select(models.User).where(models.User.name == "System")
     return (await session.execute(stmt)).scalar_one()
@@ -233,6 +364,82 @@ async def create_chat_message(
     return chat_message
 
 
+async def get_chat_history(
+    session: AsyncSession,
+    *,
+    room_id: str,
+    reference: datetime.datetime,
+    limit: int,
+    newer: bool = False,
+) -> Sequence[Row]:
+    """Fetch up to `limit` chat messages in room `room_id` adjacent to `reference`.
+
+    If `newer` is False, returns the newest messages older than `reference` in reverse
+    chronological order. If `newer` is True, returns the oldest messages newer than
+    `reference` in chronological order.
+
+    Returns (author name, content, timestamp) rows rather than ORM instances, since the
+    history is only ever serialized for the client.
+    """
+
+    stmt = (
+        select(models.User.name, models.ChatMessage.content, models.ChatMessage.timestamp)
+        .join(models.User, models.ChatMessage.author_id == models.User.id)
+        .where(models.ChatMessage.room_id == room_id)
+    )
+    if newer:
+        stmt = stmt.where(models.ChatMessage.timestamp > reference)
+        stmt = stmt.order_by(models.ChatMessage.timestamp.asc())
+    else:
+        stmt = stmt.where(models.ChatMessage.timestamp < reference)
+        stmt = stmt.order_by(models.ChatMessage.timestamp.desc())
+    return (await session.execute(stmt.limit(limit))).all()
+
+
+async def get_chat_history_page(
+    session: AsyncSession,
+    *,
+    room_id: str,
+    after: tuple[datetime.datetime, int] | None,
+    limit: int,
+    newer: bool = False,
+) -> Sequence[Row]:
+    """Fetch up to `limit` chat messages in room `room_id` that come after the message with
+    the (timestamp, id) key `after` in the paging direction.
+
+    This is keyset pagination over (timestamp, id), so unlike `get_chat_history`, messages
+    that share a timestamp are never skipped or repeated across pages, and every page costs
+    the same index range scan no matter how deep into the history it is.
+
+    If `newer` is False, pages go from the newest message to the oldest, and if `newer` is
+    True, from the oldest to the newest. If `after` is `None`, returns the first page in
+    that direction.
+
+    Returns (id, author name, content, timestamp) rows.
+    """
+
+    key = tuple_(models.ChatMessage.timestamp, models.ChatMessage.id)
+    stmt = (
+        select(
+            models.ChatMessage.id,
+            models.User.name,
+            models.ChatMessage.content,
+            models.ChatMessage.timestamp,
+        )
+        .join(models.User, models.ChatMessage.author_id == models.User.id)
+        .where(models.ChatMessage.room_id == room_id)
+    )
+    if newer:
+        if after is not None:
+            stmt = stmt.where(key > tuple_(*after))
+        stmt = stmt.order_by(models.ChatMessage.timestamp.asc(), models.ChatMessage.id.asc())
+    else:
+        if after is not None:
+            stmt = stmt.where(key < tuple_(*after))
+        stmt = stmt.order_by(models.ChatMessage.timestamp.desc(), models.ChatMessage.id.desc())
+    return (await session.execute(stmt.limit(limit))).all()
+
+
 def connect(db_uri: str, debug: bool = False) -> None:
     """Update the sqlalchemy async engine and scoped session to connect to
     the db at `db_uri`.
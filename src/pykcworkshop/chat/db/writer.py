@@ -0,0 +1,248 @@
+"""Write-behind persistence for chat messages.
+
+Committing every chat message in its own transaction costs one fsync per message, which
+caps a busy SQLite file at a few hundred messages per second no matter how many rooms are
+active. `ChatMessageWriter` buffers new chat message rows from every room and writes them
+with one multi-row insert and one commit per batch. A batch is flushed as soon as it holds
+`max_batch` rows or `max_delay` seconds after its first row arrived, whichever comes first.
+
+The buffer is bounded by `max_buffer` rows. When it is full, `ChatMessageWriter.submit`
+waits for the next flush instead of growing without bound, which pushes back on the
+websocket handlers that are producing the messages.
+
+A batch that fails because the db is busy or unavailable, like SQLite's "database is
+locked", is retried after each of `RETRY_DELAYS`. If it still can't be written, its rows
+go back to the front of the buffer to be retried with the next batch, so they are only
+lost if the db is still unavailable when the writer is stopped.
+"""
+
+import asyncio
+import contextlib
+import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from pykcworkshop import logs
+from pykcworkshop.chat.db import models, sessions
+
+logger = logs.make_logger("db")
+
+RETRY_DELAYS: tuple[float, ...] = (0.01, 0.05, 0.25, 1.0)
+"""The seconds to wait before each retry of a batch that failed with a transient error."""
+
+_TRANSIENT_ERRORS = (OperationalError, PoolTimeoutError)
+
+
+class ChatMessageWriter:
+    """Buffers chat message rows and flushes them to the db in batches.
+
+    Args:
+        max_batch:
+            The maximum number of rows written by a single insert.
+        max_delay:
+            The maximum number of seconds a row waits in the buffer before it is flushed.
+        max_buffer:
+            The maximum number of rows waiting to be written before `submit` blocks.
+        retry_delays:
+            The seconds to wait before each retry of a batch that failed with a transient
+            error.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 256,
+        max_delay: float = 0.005,
+        max_buffer: int = 8192,
+        retry_delays: tuple[float, ...] = RETRY_DELAYS,
+    ) -> None:
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+        self.retry_delays = retry_delays
+        self.rows_written = 0
+        """The number of rows written to the db since this writer was created."""
+        self.batches_written = 0
+        """The number of transactions committed since this writer was created."""
+        self.rows_lost = 0
+        """The number of valid rows that were never written because of db errors."""
+
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(max_buffer)
+        self._requeued: list[dict] = []
+        self._batch_full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._idle = True
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Start the background flush task if it isn't already running."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush every buffered row and stop the background flush task."""
+
+        self._stopping = True
+        if self._task is not None:
+            self._batch_full.set()
+            if self._idle:
+                # Nothing is being written, and the buffered rows are flushed below.
+                self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        try:
+            while self._requeued or not self._queue.empty():
+                await self._flush()
+        finally:
+            self._stopping = False
+
+    async def submit(
+        self,
+        *,
+        author_id: int,
+        room_id: str,
+        content: str,
+        timestamp: datetime.datetime,
+    ) -> None:
+        """Buffer a new chat message to be written with the next batch.
+
+        This returns as soon as the row is buffered, so the message is not in the db yet
+        when it returns. If the buffer is full, this waits until there is room for the row.
+        """
+
+        await self.start()
+        await self._queue.put(
+            {
+                "author_id": author_id,
+                "room_id": room_id,
+                "content": content,
+                "timestamp": timestamp,
+            }
+        )
+        if self._queue.qsize() >= self.max_batch:
+            self._batch_full.set()
+
+    async def _run(self) -> None:
+        while not (self._stopping and self._queue.empty() and not self._requeued):
+            first_row = None
+            if self._requeued:
+                # The db was still unavailable after every retry of the last batch.
+                await asyncio.sleep(max(self.retry_delays, default=self.max_delay))
+            else:
+                self._idle = True
+                first_row = await self._queue.get()
+                self._idle = False
+                if not self._stopping:
+                    with contextlib.suppress(TimeoutError):
+                        await asyncio.wait_for(self._batch_full.wait(), self.max_delay)
+            await self._flush(first_row)
+
+    async def _flush(self, first_row: dict | None = None) -> None:
+        """Write up to `max_batch` buffered rows in a single transaction, starting with the
+        rows of a batch that couldn't be written before."""
+
+        batch = self._requeued[: self.max_batch]
+        del self._requeued[: len(batch)]
+        if first_row is not None:
+            batch.append(first_row)
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if self._queue.qsize() < self.max_batch:
+            self._batch_full.clear()
+        if not batch or await self._write(batch):
+            return
+        if self._stopping:
+            logs.error(
+                logger,
+                {"msg": "Lost chat messages, the db is unavailable.", "batch_size": len(batch)},
+            )
+            self.rows_lost += len(batch)
+        else:
+            self._requeued[:0] = batch
+
+    async def _write(self, batch: list[dict]) -> bool:
+        """Write `batch`, retrying it after each of `retry_delays` while the db is busy or
+        unavailable.
+
+        Returns:
+            Whether the batch was written or dropped for good, as opposed to still waiting
+            for the db.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                try:
+                    async with sessions.get_session() as session:
+                        await session.execute(insert(models.ChatMessage), batch)
+                        await session.commit()
+                except IntegrityError as e:
+                    logs.warning(
+                        logger,
+                        {"msg": "Batched chat message insert failed, retrying rows individually."},
+                        err=e,
+                    )
+                    await self._write_rows_individually(batch)
+                else:
+                    self.rows_written += len(batch)
+                    self.batches_written += 1
+                return True
+            except _TRANSIENT_ERRORS as e:
+                logs.warning(
+                    logger,
+                    {
+                        "msg": "Writing chat messages failed, the db is unavailable.",
+                        "batch_size": len(batch),
+                        "attempt": attempt + 1,
+                    },
+                    err=e,
+                )
+                if attempt == len(self.retry_delays):
+                    return False
+                await asyncio.sleep(self.retry_delays[attempt])
+                attempt += 1
+            except Exception as e:
+                logs.error(
+                    logger,
+                    {"msg": "Unknown error writing chat messages.", "batch_size": len(batch)},
+                    err=e,
+                )
+                self.rows_lost += len(batch)
+                return True
+
+    async def _write_rows_individually(self, batch: list[dict]) -> None:
+        """Write each row of a batch that violated a constraint in its own savepoint, so
+        the bad rows are dropped without losing the rest of the batch."""
+
+        written = 0
+        async with sessions.get_session() as session:
+            for row in batch:
+                try:
+                    async with session.begin_nested():
+                        await session.execute(insert(models.ChatMessage), row)
+                except IntegrityError as e:
+                    logs.debug(
+                        logger,
+                        {"msg": "Dropped invalid chat message.", "room_id": row["room_id"]},
+                        err=e,
+                    )
+                else:
+                    written += 1
+            await session.commit()
+        self.rows_written += written
+        self.batches_written += 1
+
+
+_WRITER: ChatMessageWriter | None = None
+
+
+def get_message_writer() -> ChatMessageWriter:
+    """Return the process-wide write-behind writer for chat messages."""
+
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = ChatMessageWriter()
+    return _WRITER
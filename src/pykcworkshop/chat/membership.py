@@ -0,0 +1,109 @@
+"""In-memory index of the members of each chatroom, used to authorize room websockets.
+
+Every room websocket has to check that the connecting user is a member of the room, and a
+db query per handshake would cost more than the rest of the handshake combined at our
+connect rates. The `MembershipIndex` keeps the member ids of the most recently used rooms
+in memory, so the check is a set lookup.
+
+A room is loaded from the `room_member` table the first time one of its sockets is opened,
+and members who join later are added by the routes that write to the table. Only positive
+answers are trusted: a user who isn't in the cached set is looked up in the db again before
+being turned away, so a join that happened in another worker process, or that the index
+otherwise missed, never locks a member out. That lookup is a point query for the one user,
+so a miss on a room that is already indexed doesn't reload all of its members. Users are
+never removed from rooms, so a cached member can't go stale.
+"""
+
+import asyncio
+import collections
+
+from pykcworkshop.chat import db
+
+MAX_ROOMS: int = 4096
+"""The number of rooms indexed at once. The least recently used room is dropped first."""
+
+
+class MembershipIndex:
+    """A table of room id -> member ids for the most recently used rooms."""
+
+    def __init__(self) -> None:
+        self._rooms: collections.OrderedDict[str, set[int]] = collections.OrderedDict()
+        self._loads: dict[str, asyncio.Future[set[int]]] = {}
+        self.hits = 0
+        """The number of checks answered from memory."""
+        self.misses = 0
+        """The number of checks that had to go to the db."""
+
+    async def is_member(self, room_id: str, user_id: int) -> bool:
+        """Return whether the user `user_id` is a member of the room `room_id`."""
+
+        members = self._rooms.get(room_id)
+        if members is None:
+            self.misses += 1
+            return user_id in await self._load(room_id)
+        self._rooms.move_to_end(room_id)
+        if user_id in members:
+            self.hits += 1
+            return True
+        self.misses += 1
+        async with db.get_session() as session:
+            is_member = await db.is_room_member(session, room_id, user_id)
+        if is_member:
+            members.add(user_id)
+        return is_member
+
+    def add(self, room_id: str, user_id: int) -> None:
+        """Record that the user `user_id` has joined the room `room_id`.
+
+        This MUST be called after committing the new row in the `room_member` table.
+        """
+
+        members = self._rooms.get(room_id)
+        if members is not None:
+            members.add(user_id)
+
+    def discard(self, room_id: str) -> None:
+        """Drop `room_id` from the index."""
+
+        self._rooms.pop(room_id, None)
+
+    async def _load(self, room_id: str) -> set[int]:
+        """Load the members of `room_id` from the db, or wait for the load that is already in
+        progress, so a burst of clients opening the room costs one query.
+
+        If the load fails, every caller waiting for it gets the same error, rather than an
+        empty set of members that would turn them all away.
+        """
+
+        load = self._loads.get(room_id)
+        if load is not None:
+            return await asyncio.shield(load)
+        load = self._loads[room_id] = asyncio.get_running_loop().create_future()
+        try:
+            async with db.get_session() as session:
+                members = await db.get_room_member_ids(session, room_id)
+        except asyncio.CancelledError:
+            load.cancel()
+            raise
+        except Exception as e:
+            load.set_exception(e)
+            load.exception()  # Mark the error as retrieved, since no one may be waiting.
+            raise
+        finally:
+            del self._loads[room_id]
+        # Members added while the query ran are already committed, so the query saw them
+        # unless it started first. Keep them either way.
+        cached = self._rooms.get(room_id)
+        if cached is not None:
+            members |= cached
+        if members:
+            self._rooms[room_id] = members
+            self._rooms.move_to_end(room_id)
+            if len(self._rooms) > MAX_ROOMS:
+                self._rooms.popitem(last=False)
+        load.set_result(members)
+        return members
+
+
+index = MembershipIndex()
+"""The membership index for this process."""
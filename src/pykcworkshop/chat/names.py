@@ -0,0 +1,173 @@
+"""In-memory index of the user names and room names that are taken, used by form validation.
+
+The form-validation socket checks whether the name typed into the create-user or
+create-room form is taken on every keystroke, and a db query per keystroke adds up fast.
+The `NameIndex` keeps every taken user name and every (owner id, room name) pair in
+memory, so the check is a set lookup.
+
+Names are compared the way the `NOCASE` collation of the name columns compares them,
+which folds ASCII letters to lower case and leaves every other character alone.
+
+The index loads every name from the db on its first check. Users and rooms are never
+deleted, so a taken name never goes stale, and every check after that is answered from
+memory, including the names that aren't taken. Names created by the http routes are
+published with `announce_user_name` and `announce_room_name` as soon as they are
+committed, which adds them to the index of every worker process. The announcements are
+best-effort like everything else relayed between workers, so a name that was just taken
+can still pass validation, and it is the unique constraints on the name columns that
+reject it when the form is submitted.
+"""
+
+import asyncio
+import string
+
+from pykcworkshop import logs
+from pykcworkshop.chat import db
+from pykcworkshop.chat.api.websockets import broker, helpers
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+_FOLD = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold(name: str) -> str:
+    """Fold `name` to the form the `NOCASE` collation compares.
+
+    Example:
+
+        >>> from pykcworkshop.chat.names import fold
+        >>> fold("Testy McTestface")
+        'testy mctestface'
+        >>> fold("ÄBC")
+        'Äbc'
+    """
+
+    return name.translate(_FOLD)
+
+
+class NameIndex:
+    """The folded names of every user and every room, by owner."""
+
+    def __init__(self) -> None:
+        self._user_names: set[str] = set()
+        self._room_names: set[tuple[int, str]] = set()
+        self._loaded = False
+        self._load: asyncio.Future[None] | None = None
+        self._added: list[tuple[int, str] | str] | None = None
+        """The names added while a load is in progress, or `None` if there isn't one."""
+        self.hits = 0
+        """The number of checks answered from memory."""
+        self.loads = 0
+        """The number of times the index was loaded from the db."""
+
+    async def is_user_name_taken(self, user_name: str) -> bool:
+        """Return whether a user named `user_name` exists."""
+
+        if self._loaded:
+            self.hits += 1
+        else:
+            await self.load()
+        return fold(user_name) in self._user_names
+
+    async def is_room_name_taken(self, owner_id: int, room_name: str) -> bool:
+        """Return whether the user `owner_id` owns a room named `room_name`."""
+
+        if self._loaded:
+            self.hits += 1
+        else:
+            await self.load()
+        return (owner_id, fold(room_name)) in self._room_names
+
+    def add_user_name(self, user_name: str) -> None:
+        """Record that a user named `user_name` exists in this process's index only.
+
+        Routes call `announce_user_name` instead, which calls this in every process.
+        """
+
+        folded = fold(user_name)
+        self._user_names.add(folded)
+        if self._added is not None:
+            self._added.append(folded)
+
+    def add_room_name(self, owner_id: int, room_name: str) -> None:
+        """Record that the user `owner_id` owns a room named `room_name` in this process's
+        index only.
+
+        Routes call `announce_room_name` instead, which calls this in every process.
+        """
+
+        key = (owner_id, fold(room_name))
+        self._room_names.add(key)
+        if self._added is not None:
+            self._added.append(key)
+
+    async def load(self) -> None:
+        """Load every name from the db, or wait for the load that is already in progress.
+
+        This scans both tables, so it's only done by the first check.
+        """
+
+        load = self._load
+        if load is not None:
+            return await asyncio.shield(load)
+        load = self._load = asyncio.get_running_loop().create_future()
+        # Names added while the queries run may or may not be in their results.
+        added = self._added = []
+        try:
+            async with db.get_session() as session:
+                user_names = {fold(name) for name in await db.get_user_names(session)}
+                room_names = {
+                    (owner_id, fold(name)) for owner_id, name in await db.get_room_names(session)
+                }
+            for key in added:
+                if isinstance(key, str):
+                    user_names.add(key)
+                else:
+                    room_names.add(key)
+            self._user_names = user_names
+            self._room_names = room_names
+            self._loaded = True
+            self.loads += 1
+        finally:
+            self._added = None
+            self._load = None
+            load.set_result(None)
+
+
+index = NameIndex()
+"""The name index for this process."""
+
+announcements = broker.Broker("names")
+"""Carries the names created in any worker process to the name index of every worker."""
+
+
+def announce_user_name(user_name: str) -> None:
+    """Add `user_name` to the name index of every worker process.
+
+    This MUST be called after committing the new row in the `user` table.
+    """
+
+    announcements.publish("user", Frame({"user_name": user_name}))
+
+
+def announce_room_name(owner_id: int, room_name: str) -> None:
+    """Add the room `room_name` of the user `owner_id` to the name index of every worker
+    process.
+
+    This MUST be called after committing the new row in the `room` table.
+    """
+
+    announcements.publish("room", Frame({"owner_id": owner_id, "room_name": room_name}))
+
+
+def _add_announced(kind: str, frame: Frame) -> None:
+    try:
+        name = frame.payload
+        if kind == "user":
+            index.add_user_name(str(name["user_name"]))
+        else:
+            index.add_room_name(int(name["owner_id"]), str(name["room_name"]))
+    except (ValueError, KeyError, TypeError) as e:
+        logs.debug(helpers.logger, {"msg": "Malformed name announcement"}, err=e)
+
+
+announcements.add_listener(_add_announced)
@@ -0,0 +1,105 @@
+"""In-memory registry of the latest status of each member connected to a chatroom.
+
+The registry is fed by the member-status broadcasts, including the server-originated
+'Offline' status sent when a client disconnects, so it always holds the statuses that the
+connected clients have already seen. This lets the server hand a newly connected client
+the current statuses of the room in a single snapshot instead of every client in the room
+re-sending its status each time someone joins.
+
+A user can be connected to a room more than once, for example from two browser tabs, so the
+registry also counts each user's connections to each room. The 'Offline' status is only
+sent when a user's last connection closes, and a relayed 'Offline' status doesn't remove a
+user who still has a connection in this process.
+
+The registry lives in process memory. When the app runs with more than one worker, each
+worker builds its own registry from the broadcasts relayed between workers, so a worker
+only knows about statuses broadcast since it started.
+"""
+
+from pykcworkshop import utils
+from pykcworkshop.chat.types import MemberPresence
+
+OFFLINE = "Offline"
+"""The status that removes a user from a room's presence table."""
+
+
+class PresenceRegistry:
+    """A table of room id -> user id -> `pykcworkshop.chat.types.MemberPresence` for every
+    room with a connected member."""
+
+    def __init__(self) -> None:
+        self._rooms: dict[str, dict[int, MemberPresence]] = {}
+        self._connections: dict[tuple[str, int], int] = {}
+
+    def connect(self, room_id: str, user_id: int) -> None:
+        """Count a new connection of `user_id` to the member-status socket of `room_id`."""
+
+        key = (room_id, user_id)
+        self._connections[key] = self._connections.get(key, 0) + 1
+
+    def disconnect(self, room_id: str, user_id: int) -> bool:
+        """Stop counting a closed connection of `user_id` to `room_id`.
+
+        Returns whether it was the user's last connection to the room in this process.
+        """
+
+        key = (room_id, user_id)
+        remaining = self._connections.get(key, 1) - 1
+        if remaining > 0:
+            self._connections[key] = remaining
+            return False
+        self._connections.pop(key, None)
+        return True
+
+    def update(self, room_id: str, status: dict) -> None:
+        """Record a member-status message broadcast in `room_id`.
+
+        An 'Offline' status removes the user from the room, unless they are still connected
+        to it in this process, and the room is dropped once its last member goes offline.
+        Messages that aren't well-formed member-status messages
+        are ignored.
+        """
+
+        try:
+            user_id = int(status["user_id"])
+            user_name = str(status["user_name"])
+            user_status = str(status["user_status"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if user_status == OFFLINE:
+            if (room_id, user_id) in self._connections:
+                return
+            members = self._rooms.get(room_id)
+            if members is not None:
+                members.pop(user_id, None)
+                if not members:
+                    del self._rooms[room_id]
+            return
+        members = self._rooms.setdefault(room_id, {})
+        current = members.get(user_id)
+        if current is None or current["user_status"] != user_status:
+            last_changed = utils.now().isoformat()
+        else:
+            last_changed = current["last_changed"]
+        members[user_id] = {
+            "user_id": user_id,
+            "user_name": user_name,
+            "user_status": user_status,
+            "last_changed": last_changed,
+        }
+
+    def snapshot(self, room_id: str, exclude_user_id: int | None = None) -> list[MemberPresence]:
+        """Return the member-status messages of everyone who is present in `room_id`.
+
+        If `exclude_user_id` is given, that user's status is left out of the snapshot.
+        """
+
+        return [
+            presence
+            for user_id, presence in self._rooms.get(room_id, {}).items()
+            if user_id != exclude_user_id
+        ]
+
+
+registry = PresenceRegistry()
+"""The presence registry for this process."""
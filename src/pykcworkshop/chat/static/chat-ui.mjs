@@ -10,8 +10,11 @@ import {
 import { onPageLoad, setupLoggingHandlers } from "./utils/helpers.mjs";
 import { appendMessageToChatUI, makeErrMsgEl, prependMessageToChatUI } from "./utils/ui.mjs";
 import { openModal, getModalAnchor, makeRoomInfoModal, makeDMChatModal } from "./modals.mjs";
+import { MultiplexedSocket } from "./utils/multiplex.mjs";
 
-/** @type { {chatMessage: WebSocket | null, msgLengthValidation: WebSocket | null, chatHistory: WebSocket | null, memberStatus: WebSocket | null, clientSync: WebSocket | null, dms: WebSocket | null, dmLengthValidation: WebSocket | null }} */
+/** @typedef {import("./utils/multiplex.mjs").Channel} Channel */
+
+/** @type { {chatMessage: Channel | null, msgLengthValidation: Channel | null, chatHistory: Channel | null, memberStatus: Channel | null, clientSync: Channel | null, dms: Channel | null, dmLengthValidation: Channel | null }} */
 const connections = {
   chatMessage: null,
   msgLengthValidation: null,
@@ -22,6 +25,12 @@ const connections = {
   dmLengthValidation: null,
 };
 
+/**
+ * The single v2 websocket connection that carries every channel above.
+ * @type {MultiplexedSocket | null}
+ */
+let roomSocket = null;
+
 /** @type {number} */
 let oldestMsgTimestamp = new Date().getTime();
 
@@ -31,6 +40,14 @@ let isRoomSendDisabled = false;
 /** @type {string} */
 let connectedRoomID = "";
 
+function multiplexedSocket() {
+  if (roomSocket === null || !roomSocket.isUsable()) {
+    roomSocket = new MultiplexedSocket([`Bearer${sessionToken()}`, `csrf${csrfToken()}`]);
+    setupLoggingHandlers(roomSocket.socket, "v2");
+  }
+  return roomSocket;
+}
+
 export function isChatroomConnected() {
   return connectedRoomID !== "";
 }
@@ -63,10 +80,7 @@ export async function connectToRoom(roomID) {
     connections.chatMessage.close();
   }
   oldestMsgTimestamp = new Date().getTime();
-  const chatMessageSocket = new WebSocket(`/chat/api/v1/room/${roomID}/chat-message`, [
-    `Bearer${sessionToken()}`,
-    `csrf${csrfToken()}`,
-  ]);
+  const chatMessageSocket = multiplexedSocket().channel(`room/${roomID}/chat-message`);
   connections.chatMessage = chatMessageSocket;
   setupLoggingHandlers(chatMessageSocket, "chat-message");
   chatMessageSocket.addEventListener("message", (ev) => {
@@ -77,7 +91,7 @@ export async function connectToRoom(roomID) {
   if (connections.msgLengthValidation !== null) {
     connections.msgLengthValidation.close();
   }
-  const msgLengthSocket = new WebSocket(`/chat/api/v1/form-validation`, `csrf${csrfToken()}`);
+  const msgLengthSocket = multiplexedSocket().channel("form-validation#room");
   connections.msgLengthValidation = msgLengthSocket;
   setupLoggingHandlers(msgLengthSocket, "form-validation/chat-message");
   msgLengthSocket.addEventListener("message", (ev) => {
@@ -99,10 +113,7 @@ export async function connectToRoom(roomID) {
   if (connections.chatHistory !== null) {
     connections.chatHistory.close();
   }
-  const chatHistorySocket = new WebSocket(`/chat/api/v1/room/${roomID}/chat-history`, [
-    `Bearer${sessionToken()}`,
-    `csrf${csrfToken()}`,
-  ]);
+  const chatHistorySocket = multiplexedSocket().channel(`room/${roomID}/chat-history`);
   connections.chatHistory = chatHistorySocket;
   setupLoggingHandlers(chatHistorySocket, "chat-history");
   chatHistorySocket.addEventListener("message", (ev) => {
@@ -143,31 +154,29 @@ export async function connectToRoom(roomID) {
   if (connections.memberStatus !== null) {
     connections.memberStatus.close();
   }
-  const memberStatusSocket = new WebSocket(`/chat/api/v1/room/${roomID}/member-status`, [
-    `Bearer${sessionToken()}`,
-    `csrf${csrfToken()}`,
-  ]);
+  const memberStatusSocket = multiplexedSocket().channel(`room/${roomID}/member-status`);
   connections.memberStatus = memberStatusSocket;
   setupLoggingHandlers(memberStatusSocket, "member-status");
+  memberStatusSocket.addEventListener("open", (_ev) => {
+    sendMemberStatus("Online");
+  });
   memberStatusSocket.addEventListener("message", (ev) => {
-    /** @type {{ "user_id": string, "user_name": string, "user_status": string }} */
-    const userData = JSON.parse(ev.data);
-    updateRoomMemberStatus(userData);
+    /** @typedef {{ "user_id": string, "user_name": string, "user_status": string }} UserData */
+    /** @type {UserData | UserData[]} */
+    const data = JSON.parse(ev.data);
+    // The server sends the statuses of everyone already in the room as an array on connect.
+    for (const userData of Array.isArray(data) ? data : [data]) {
+      updateRoomMemberStatus(userData);
+    }
   });
 
   // Client Sync Socket Setup
   if (connections.clientSync !== null) {
     connections.clientSync.close();
   }
-  const clientSyncSocket = new WebSocket(`/chat/api/v1/room/${roomID}/client-sync`, [
-    `Bearer${sessionToken()}`,
-    `csrf${csrfToken()}`,
-  ]);
+  const clientSyncSocket = multiplexedSocket().channel(`room/${roomID}/client-sync`);
   connections.clientSync = clientSyncSocket;
   setupLoggingHandlers(clientSyncSocket, "client-sync");
-  clientSyncSocket.addEventListener("open", (_ev) => {
-    clientSyncSocket.send("member-status");
-  });
   clientSyncSocket.addEventListener("message", (ev) => {
     if (ev.data === "member-status") {
       sendMemberStatus("Online");
@@ -190,6 +199,10 @@ export async function disconnectFromRoom() {
       socket.close();
     }
   }
+  if (roomSocket !== null) {
+    roomSocket.close();
+    roomSocket = null;
+  }
   getModalAnchor().replaceChildren();
 }
 
@@ -233,16 +246,10 @@ async function updateRoomMemberStatus(memberData) {
           connections.dms.close();
         }
         getModalAnchor().replaceChildren();
-        const dmSocket = new WebSocket(`/chat/api/v1/${memberData.user_id}/direct-message`, [
-          `Bearer${sessionToken()}`,
-          `csrf${csrfToken()}`,
-        ]);
+        const dmSocket = multiplexedSocket().channel(`${memberData.user_id}/direct-message`);
         connections.dms = dmSocket;
         setupLoggingHandlers(dmSocket, "direct-message");
-        const validationSocket = new WebSocket(
-          "/chat/api/v1/form-validation",
-          `csrf${csrfToken()}`,
-        );
+        const validationSocket = multiplexedSocket().channel("form-validation#dm");
         connections.dmLengthValidation = validationSocket;
         setupLoggingHandlers(validationSocket, "form-validation/dm-length");
         openModal(
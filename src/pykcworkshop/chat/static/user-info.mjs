@@ -32,16 +32,24 @@ export async function repopulateJoinedRoomList() {
   container.appendChild(roomList);
 }
 
+/** Where the resume token of the last login in this browser is kept, so that logging in
+ * again skips the expensive password verification on the server. */
+const RESUME_TOKEN_KEY = "pykc.resumeToken";
+
 export async function logIn(userHash) {
   const res = await fetch("/chat/api/v1/user/login", {
     method: "POST",
-    body: JSON.stringify({ user_hash: userHash }),
+    body: JSON.stringify({
+      user_hash: userHash,
+      resume_token: localStorage.getItem(RESUME_TOKEN_KEY),
+    }),
     headers: { "Content-Type": "application/json", "X-CSRF-TOKEN": csrfToken() },
   });
   if (res.status === 200) {
-    /** @type {{ "user_id": number, "user_name": string, "user_token": string }} */
+    /** @type {{ "user_id": number, "user_name": string, "user_token": string, "resume_token": string }} */
     const newUserData = await res.json();
     setCurrentUser(newUserData);
+    localStorage.setItem(RESUME_TOKEN_KEY, newUserData.resume_token);
 
     document.querySelector("#login-ui").classList.add("hidden");
     document.querySelector("#logout-ui").classList.remove("hidden");
@@ -69,6 +77,7 @@ export function logOut() {
     disconnectFromRoom();
   }
   clearCurrentUser();
+  localStorage.removeItem(RESUME_TOKEN_KEY);
   document.querySelector("#logout-ui").classList.add("hidden");
   document.querySelector("#login-ui").classList.remove("hidden");
   document.querySelector("#manage-rooms-ui").classList.add("hidden");
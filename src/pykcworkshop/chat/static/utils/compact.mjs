@@ -0,0 +1,98 @@
+/** Decoder for the compact binary encoding of the v1 websockets.
+ *
+ * A v1 socket sends chat-message, member-status, and chat-history messages as binary frames
+ * when the client includes `PROTOCOL` in its subprotocols and the server echoes it back. See
+ * `pykcworkshop.chat.api.websockets.compact` for the format. Text frames on such a socket are
+ * still JSON, so `decodeMessage` handles both.
+ */
+
+export const PROTOCOL = "pykc.compact.v1";
+
+/** Decode a message received on a websocket that may have negotiated the compact encoding.
+ *
+ * Set `socket.binaryType = "arraybuffer"` before passing `ev.data` in here.
+ * @param {string | ArrayBuffer} data
+ * @returns {any} The same object the JSON encoding of the message decodes to.
+ */
+export function decodeMessage(data) {
+  if (typeof data === "string") {
+    return JSON.parse(data);
+  }
+  const reader = new Reader(data);
+  const tag = reader.u8();
+  switch (tag) {
+    case 0x01:
+      return reader.message();
+    case 0x02:
+      return Array.from({ length: reader.u16() }, () => reader.message());
+    case 0x03:
+      return {
+        user_id: reader.u64(),
+        user_name: reader.string(),
+        user_status: reader.string(),
+      };
+    case 0x04:
+      return Array.from({ length: reader.u16() }, () => {
+        const userId = reader.u64();
+        const lastChanged = reader.timestamp();
+        return {
+          user_id: userId,
+          user_name: reader.string(),
+          user_status: reader.string(),
+          last_changed: lastChanged,
+        };
+      });
+    default:
+      throw new Error(`Unknown compact frame tag ${tag}`);
+  }
+}
+
+class Reader {
+  /** @param {ArrayBuffer} buffer */
+  constructor(buffer) {
+    this.view = new DataView(buffer);
+    this.offset = 0;
+    this.textDecoder = new TextDecoder();
+  }
+
+  u8() {
+    const value = this.view.getUint8(this.offset);
+    this.offset += 1;
+    return value;
+  }
+
+  u16() {
+    const value = this.view.getUint16(this.offset);
+    this.offset += 2;
+    return value;
+  }
+
+  u64() {
+    const value = Number(this.view.getBigUint64(this.offset));
+    this.offset += 8;
+    return value;
+  }
+
+  timestamp() {
+    const value = Number(this.view.getBigInt64(this.offset));
+    this.offset += 8;
+    return new Date(value).toISOString();
+  }
+
+  string() {
+    const length = this.u16();
+    const bytes = new Uint8Array(this.view.buffer, this.offset, length);
+    this.offset += length;
+    return this.textDecoder.decode(bytes);
+  }
+
+  message() {
+    const timestamp = this.timestamp();
+    const message = { user_name: this.string(), content: this.string(), timestamp: timestamp };
+    const cursor = this.string();
+    if (cursor !== "") {
+      message.cursor = cursor;
+    }
+    return message;
+  }
+}
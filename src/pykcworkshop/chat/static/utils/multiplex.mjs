@@ -0,0 +1,162 @@
+/** Client for the multiplexed v2 websocket api.
+ *
+ * A `MultiplexedSocket` is one websocket connection that carries any number of channels, and
+ * each `Channel` behaves like a `WebSocket` connected to the equivalent v1 endpoint, so code
+ * written against the v1 sockets can use a channel without changes.
+ */
+
+/** One channel carried by a `MultiplexedSocket`. */
+export class Channel extends EventTarget {
+  /**
+   * @param {string} name The v1 endpoint path of the channel, e.g. `room/<room_id>/chat-message`.
+   * @param {MultiplexedSocket} connection
+   */
+  constructor(name, connection) {
+    super();
+    this.name = name;
+    this.connection = connection;
+    this.readyState = WebSocket.CONNECTING;
+  }
+
+  /** @param {string} data */
+  send(data) {
+    this.connection.sendEnvelope({ op: "send", ch: this.name, data: data });
+  }
+
+  close() {
+    if (this.readyState === WebSocket.CONNECTING || this.readyState === WebSocket.OPEN) {
+      this.readyState = WebSocket.CLOSING;
+      this.connection.unsubscribe(this);
+    }
+  }
+
+  /** @param {{ op: string, ch: string, data?: string, reason?: string }} envelope */
+  handleEnvelope(envelope) {
+    switch (envelope.op) {
+      case "subscribed":
+        this.readyState = WebSocket.OPEN;
+        this.dispatchEvent(new Event("open"));
+        break;
+      case "message":
+        if (this.readyState === WebSocket.OPEN) {
+          this.dispatchEvent(new MessageEvent("message", { data: envelope.data }));
+        }
+        break;
+      case "unsubscribed":
+        this.handleClose(true, 1000);
+        break;
+      case "error":
+        console.log(`${this.name} channel error: ${envelope.reason}`);
+        this.dispatchEvent(new Event("error"));
+        this.connection.forget(this);
+        this.handleClose(false, 1011);
+        break;
+    }
+  }
+
+  /**
+   * @param {boolean} wasClean
+   * @param {number} code
+   */
+  handleClose(wasClean, code) {
+    if (this.readyState !== WebSocket.CLOSED) {
+      this.readyState = WebSocket.CLOSED;
+      this.dispatchEvent(new CloseEvent("close", { wasClean: wasClean, code: code }));
+    }
+  }
+}
+
+/** A single websocket connection to the v2 api. */
+export class MultiplexedSocket {
+  /** @param {string[]} protocols The bearer and csrf subprotocols used to authenticate. */
+  constructor(protocols) {
+    this.socket = new WebSocket("/chat/api/v2/socket", protocols);
+    /** @type {Map<string, Channel>} */
+    this.channels = new Map();
+    /**
+     * Channels that are waiting for the server to confirm they are closed.
+     * @type {Map<string, Channel>}
+     */
+    this.closing = new Map();
+    /** @type {string[]} */
+    this.pending = [];
+
+    this.socket.addEventListener("open", () => {
+      for (const data of this.pending) {
+        this.socket.send(data);
+      }
+      this.pending = [];
+    });
+    this.socket.addEventListener("message", (ev) => {
+      /** @type {{ op: string, ch: string | null, data?: string, reason?: string }} */
+      const envelope = JSON.parse(ev.data);
+      // Envelopes for a channel that is closing belong to it until the server confirms.
+      const channel = this.closing.get(envelope.ch) ?? this.channels.get(envelope.ch);
+      if (channel === undefined) {
+        if (envelope.op === "error") {
+          console.log(`v2 socket error: ${envelope.reason}`);
+        }
+        return;
+      }
+      if (envelope.op === "unsubscribed" || envelope.op === "error") {
+        this.closing.delete(channel.name);
+      }
+      channel.handleEnvelope(envelope);
+    });
+    this.socket.addEventListener("close", (ev) => {
+      for (const channel of [...this.closing.values(), ...this.channels.values()]) {
+        channel.handleClose(ev.wasClean, ev.code);
+      }
+      this.closing.clear();
+      this.channels.clear();
+    });
+  }
+
+  /** Whether this socket can still open channels. */
+  isUsable() {
+    return (
+      this.socket.readyState === WebSocket.CONNECTING || this.socket.readyState === WebSocket.OPEN
+    );
+  }
+
+  /**
+   * Open the channel `name`. Closes the currently open channel with the same name first.
+   * @param {string} name
+   * @returns {Channel}
+   */
+  channel(name) {
+    this.channels.get(name)?.close();
+    const channel = new Channel(name, this);
+    this.channels.set(name, channel);
+    this.sendEnvelope({ op: "subscribe", ch: name });
+    return channel;
+  }
+
+  /** @param {Channel} channel */
+  unsubscribe(channel) {
+    this.forget(channel);
+    this.closing.set(channel.name, channel);
+    this.sendEnvelope({ op: "unsubscribe", ch: channel.name });
+  }
+
+  /** @param {Channel} channel */
+  forget(channel) {
+    if (this.channels.get(channel.name) === channel) {
+      this.channels.delete(channel.name);
+    }
+  }
+
+  /** @param {{ op: string, ch: string, data?: string }} envelope */
+  sendEnvelope(envelope) {
+    const data = JSON.stringify(envelope);
+    if (this.socket.readyState === WebSocket.CONNECTING) {
+      this.pending.push(data);
+    } else if (this.socket.readyState === WebSocket.OPEN) {
+      this.socket.send(data);
+    }
+  }
+
+  close() {
+    this.socket.close();
+  }
+}
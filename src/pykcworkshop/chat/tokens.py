@@ -1,8 +1,15 @@
 """This module contains helper functions for working with JWTs."""
 
+import asyncio
+import collections
+import concurrent.futures
 import datetime
+import hashlib
+import hmac
 import os
 import random
+import time
+from typing import Any, Callable, TypeVar
 
 import argon2
 import jwt
@@ -34,10 +41,81 @@ def is_token_valid(token: str) -> bool:
         return False
 
 
+TOKEN_CACHE_SIZE: int = 4096
+"""The number of validated tokens remembered at once. The least recently used is dropped
+first."""
+
+TOKEN_CACHE_TTL = datetime.timedelta(minutes=5)
+"""How long a validated token is trusted without checking its signature again."""
+
+
+class TokenCache:
+    """The payloads of recently validated JWTs, keyed by the encoded token.
+
+    Every authenticated request and websocket handshake validates both a CSRF token and a
+    user token, and the same few tokens are presented over and over by each client. A token
+    found here is trusted without verifying its signature again until the earlier of its
+    `exp` claim and `ttl` after it was validated. Only tokens that passed validation are
+    ever stored, so a forged or expired token always goes through `jwt.decode`.
+    """
+
+    def __init__(
+        self, maxsize: int = TOKEN_CACHE_SIZE, ttl: datetime.timedelta = TOKEN_CACHE_TTL
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl.total_seconds()
+        self._tokens: collections.OrderedDict[str, tuple[float, dict[str, Any]]] = (
+            collections.OrderedDict()
+        )
+        self.hits = 0
+        """The number of lookups answered from the cache."""
+        self.misses = 0
+        """The number of lookups that had to decode the token."""
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        """Return the payload of `token` if it was validated recently and hasn't expired
+        since, or `None` otherwise."""
+
+        entry = self._tokens.get(token)
+        if entry is not None:
+            expires_at, payload = entry
+            if time.time() < expires_at:
+                self._tokens.move_to_end(token)
+                self.hits += 1
+                return payload
+            del self._tokens[token]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, payload: dict[str, Any]) -> None:
+        """Remember the payload of `token`, which MUST have just passed validation."""
+
+        expires_at = time.time() + self.ttl
+        if "exp" in payload:
+            expires_at = min(expires_at, float(payload["exp"]))
+        self._tokens[token] = (expires_at, payload)
+        self._tokens.move_to_end(token)
+        while len(self._tokens) > self.maxsize:
+            self._tokens.popitem(last=False)
+
+
+token_cache = TokenCache()
+"""The validated token cache for this process."""
+
+
 def validate_token(token: str) -> dict:
-    """Validate a JWT token and return the stored payload."""
+    """Validate a JWT token and return the stored payload.
+
+    Recently validated tokens are answered from `token_cache` without checking their
+    signature again. Raises `jwt.InvalidTokenError` if the token is invalid.
+    """
 
-    return jwt.decode(token, os.environ["JWT_SECRET"], algorithms=["HS256"])
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, os.environ["JWT_SECRET"], algorithms=["HS256"])
+        token_cache.put(token, payload)
+    # Callers are free to modify the payload they get back.
+    return dict(payload)
 
 
 def parse_bearer(bearer_token: str) -> str:
@@ -86,6 +164,153 @@ def pw_hasher() -> argon2.PasswordHasher:
     return _ARGON
 
 
+T = TypeVar("T")
+
+HASH_WORKERS: int = 2
+"""The number of Argon2 hashes or verifications that run at once in each process."""
+
+
+def _hash_password(password: str) -> str:
+    return pw_hasher().hash(password)
+
+
+def _verify_password(password_hash: str, password: str) -> bool:
+    return pw_hasher().verify(password_hash, password)
+
+
+class PasswordHashPool:
+    """Runs Argon2 hashing and verification on a bounded pool of workers so that they don't
+    block the event loop.
+
+    Each Argon2 call takes tens of milliseconds of CPU time by design, which would stall
+    every websocket served by the process if it ran on the event loop. At most `workers`
+    calls run at once, and the rest wait their turn on the event loop, where the time they
+    spend waiting is recorded.
+
+    Args:
+        workers:
+            The number of calls that run at once.
+        processes:
+            If True, the calls run in a process pool instead of a thread pool. Argon2
+            releases the GIL, so threads are enough unless the process is CPU bound on
+            other work.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, processes: bool = False) -> None:
+        self.workers = workers
+        self._executor: concurrent.futures.Executor
+        if processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="argon2"
+            )
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        """The number of calls currently waiting for a worker."""
+        self.completed = 0
+        """The number of calls that have finished, successfully or not."""
+        self.queue_wait_total = 0.0
+        """The total number of seconds calls have spent waiting for a worker."""
+        self.queue_wait_max = 0.0
+        """The longest number of seconds a single call has waited for a worker."""
+
+    async def hash(self, password: str) -> str:
+        """Hash `password` with `pw_hasher`."""
+
+        return await self._run(_hash_password, password)
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        """Verify `password` against `password_hash` with `pw_hasher`.
+
+        Raises the same exceptions as `argon2.PasswordHasher.verify`.
+        """
+
+        return await self._run(_verify_password, password_hash, password)
+
+    def shutdown(self) -> None:
+        """Stop the workers once the calls that are already running are done."""
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        enqueued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            waited = time.perf_counter() - enqueued
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.completed += 1
+            self._slots.release()
+
+
+_HASH_POOL: PasswordHashPool | None = None
+
+
+def get_hash_pool() -> PasswordHashPool:
+    """Return the process-wide pool that runs Argon2 calls."""
+
+    global _HASH_POOL
+    if _HASH_POOL is None:
+        _HASH_POOL = PasswordHashPool()
+    return _HASH_POOL
+
+
+def set_hash_pool(pool: PasswordHashPool) -> None:
+    """Replace the process-wide pool that runs Argon2 calls.
+
+    Should be called when the app is created, before any password is hashed.
+    """
+
+    global _HASH_POOL
+    if _HASH_POOL is not None:
+        _HASH_POOL.shutdown()
+    _HASH_POOL = pool
+
+
+RESUME_TOKEN_LIFETIME = datetime.timedelta(hours=12)
+"""How long a browser can log back in without its user hash being verified with Argon2."""
+
+
+def _resume_mac(user_hash: str, password_hash: str, expires: int) -> str:
+    message = f"resume:{expires}:{user_hash}:{password_hash}".encode()
+    return hmac.new(os.environ["JWT_SECRET"].encode(), message, hashlib.sha256).hexdigest()
+
+
+def issue_resume_token(
+    user_hash: str, password_hash: str, lifetime: datetime.timedelta = RESUME_TOKEN_LIFETIME
+) -> str:
+    """Issue a session-resume token for a login with `user_hash` that was just verified
+    against the stored Argon2 `password_hash`.
+
+    The token is an expiry time and an HMAC over it, the login hash, and the stored password
+    hash, so it is only accepted together with the same login hash, and it stops being
+    accepted once it expires or the user's password hash changes.
+    """
+
+    expires = int((utils.now() + lifetime).timestamp())
+    return f"{expires}.{_resume_mac(user_hash, password_hash, expires)}"
+
+
+def check_resume_token(resume_token: str, user_hash: str, password_hash: str) -> bool:
+    """Return whether `resume_token` was issued by `issue_resume_token` for `user_hash` and
+    `password_hash` and hasn't expired.
+
+    This is a single HMAC, so it is cheap enough to run on the event loop.
+    """
+
+    expires, _, mac = resume_token.partition(".")
+    if not expires.isdigit() or int(expires) <= utils.now().timestamp():
+        return False
+    return hmac.compare_digest(mac, _resume_mac(user_hash, password_hash, int(expires)))
+
+
 def parse_login_hash(login_hash: str) -> tuple[str, int]:
     """Parse the token hash and user id from the login string.
 
@@ -6,3 +6,16 @@ class UserData(TypedDict):
 
     user_id: int
     user_name: str
+
+
+class MemberPresence(TypedDict):
+    """Represents the latest status of a member in a chatroom.
+
+    This is a member-status message with the time of the user's last status change added in
+    ISO 8601 format.
+    """
+
+    user_id: int
+    user_name: str
+    user_status: str
+    last_changed: str
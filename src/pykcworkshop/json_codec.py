@@ -0,0 +1,146 @@
+"""The JSON codec used by the http responses, the websockets, and the logs of the app.
+
+Every http response, websocket frame, and log line is encoded as JSON, so the app does a
+lot of it. When [orjson](https://github.com/ijl/orjson) is installed, `async_create_app`
+switches the whole app over to it, which is several times faster than the `json` module
+of the standard library. The codec can also be chosen with the `JSON_CODEC` environment
+variable, which is one of `auto`, `orjson`, or `stdlib`.
+
+Code that encodes or decodes JSON calls `dumps` and `loads` through this module, so it
+always uses the codec that is currently set. Until one is set, that is the standard
+library, whose output is the same as `json.dumps` with its default arguments. Output of the
+other codecs differs from it in whitespace, but not in meaning.
+"""
+
+import json
+from typing import Any, Callable, Protocol
+
+from quart.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+class Codec(Protocol):
+    """Encodes values to JSON text and decodes them back."""
+
+    name: str
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        """Encode `obj`, calling `default` on any value the codec doesn't know how to
+        encode. `default` returns an encodable value or raises a `TypeError`."""
+        ...
+
+    def loads(self, data: str | bytes) -> Any:
+        """Decode `data`."""
+        ...
+
+
+class StdlibCodec:
+    """The `json` module of the standard library."""
+
+    name = "stdlib"
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        return json.dumps(obj, default=default)
+
+    def loads(self, data: str | bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """The orjson library.
+
+    When a `default` is given, datetimes and dataclasses go through it like they would with
+    the standard library, instead of being encoded by orjson itself.
+    """
+
+    name = "orjson"
+
+    def dumps(self, obj: Any, default: Callable[[Any], Any] | None = None) -> str:
+        if default is None:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        return orjson.dumps(obj, default=default, option=option).decode()
+
+    def loads(self, data: str | bytes) -> Any:
+        return orjson.loads(data)
+
+
+STDLIB = StdlibCodec()
+"""The standard library codec, which is always available."""
+
+dumps: Callable[..., str] = STDLIB.dumps
+"""Encode a value with the current codec. See `Codec.dumps` for the arguments."""
+
+loads: Callable[[str | bytes], Any] = STDLIB.loads
+"""Decode a value with the current codec."""
+
+_codec: Codec = STDLIB
+
+
+def get_codec() -> Codec:
+    """Return the codec currently used by the app."""
+
+    return _codec
+
+
+def set_codec(codec: Codec) -> None:
+    """Use `codec` for all JSON encoding and decoding from now on."""
+
+    global _codec, dumps, loads
+    _codec = codec
+    dumps = codec.dumps
+    loads = codec.loads
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """Quart JSON provider that encodes and decodes with the current codec.
+
+    Pretty-printed responses, which Quart only sends in debug mode, are left to the
+    standard library. Keys are only sorted with the standard library codec.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if _codec is STDLIB or "indent" in kwargs:
+            return super().dumps(obj, **kwargs)
+        return _codec.dumps(obj, default=kwargs.get("default", self.default))
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return _codec.loads(s)
+
+
+def choose_codec(name: str) -> Codec:
+    """Return the codec named `name`, or the fastest installed codec if `name` is `auto`.
+
+    Raises:
+        ValueError:
+            If `name` isn't a known codec, or is `orjson` and orjson isn't installed.
+
+    Example:
+
+        >>> from pykcworkshop import json_codec
+        >>> json_codec.choose_codec("stdlib").name
+        'stdlib'
+        >>> json_codec.choose_codec("auto").name in ("orjson", "stdlib")
+        True
+    """
+
+    match name:
+        case "auto":
+            return STDLIB if orjson is None else OrjsonCodec()
+        case "stdlib":
+            return STDLIB
+        case "orjson":
+            if orjson is None:
+                raise ValueError("The orjson JSON codec requires the orjson package")
+            return OrjsonCodec()
+    raise ValueError(f"Unknown JSON codec: {name}")
@@ -1,13 +1,158 @@
+"""JSON-lines file logging that stays off the event loop.
+
+Each logger made by `make_logger` writes one JSON object per line to its own file. Log
+calls don't write anything themselves. They hand the record to the process's `LogWriter`,
+whose background thread formats the record, serializes it to JSON, formats any traceback,
+and writes it to the file, so a burst of errors doesn't turn into disk I/O on the event
+loop. The payload passed to a log call is serialized on that thread, so it MUST NOT be
+changed after the call.
+
+The writer's queue is bounded. When the thread falls behind by `QUEUE_SIZE` records, new
+records are dropped and counted, and the next record written is preceded by a warning with
+the number of records that were dropped. Until the writer is started, which the app does
+when it starts serving, records are written synchronously by the caller instead.
+"""
+
 import datetime
-import json
 import logging
+import logging.handlers
 import os
-import traceback
+import queue
+import threading
 
 from dotenv import load_dotenv
 
+from pykcworkshop import json_codec
+
 load_dotenv()
 
+QUEUE_SIZE: int = 10_000
+"""The number of records that can wait for the writer thread before new ones are dropped."""
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record whose message is a payload dict as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = record.msg if isinstance(record.msg, dict) else {"msg": record.getMessage()}
+        payload = {
+            **payload,
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+        }
+        if record.exc_info:
+            payload["err"] = repr(record.exc_info[1])
+            payload["traceback"] = self.formatException(record.exc_info)
+        return json_codec.dumps(payload, default=repr)
+
+
+class LogWriter:
+    """A bounded queue of log records that a background thread writes to their handlers."""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE) -> None:
+        self.queue: queue.Queue[tuple[logging.Handler, logging.LogRecord] | None] = queue.Queue(
+            maxsize
+        )
+        self._thread: threading.Thread | None = None
+        # Held while deciding where a record goes, so `stop` can't queue its sentinel between
+        # a log call's check of the thread and its put.
+        self._lock = threading.Lock()
+        self._reported = 0
+        self.written = 0
+        """The number of records written by the background thread."""
+        self.dropped = 0
+        """The number of records dropped because the queue was full."""
+
+    @property
+    def running(self) -> bool:
+        """Whether records are written by the background thread."""
+
+        return self._thread is not None
+
+    def submit(self, handler: logging.Handler, record: logging.LogRecord) -> None:
+        """Queue `record` to be written by `handler` without blocking, or write it right away
+        if the writer isn't running."""
+
+        with self._lock:
+            if self._thread is not None:
+                try:
+                    self.queue.put_nowait((handler, record))
+                except queue.Full:
+                    self.dropped += 1
+                return
+        handler.handle(record)
+
+    def start(self) -> None:
+        """Start the background thread."""
+
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write every queued record and stop the background thread."""
+
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            # Records logged from now on are written by their callers, and every record
+            # queued before now is ahead of the sentinel.
+            self._thread = None
+            self.queue.put(None)
+        thread.join()
+
+    def _run(self) -> None:
+        while (item := self.queue.get()) is not None:
+            handler, record = item
+            try:
+                self._write(handler, record)
+            except Exception:
+                # A broken handler must not stop the thread, or `stop` would never return.
+                handler.handleError(record)
+
+    def _write(self, handler: logging.Handler, record: logging.LogRecord) -> None:
+        dropped = self.dropped
+        if dropped > self._reported:
+            handler.handle(
+                logging.makeLogRecord(
+                    {
+                        "name": record.name,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": {
+                            "msg": "Dropped log records",
+                            "dropped": dropped - self._reported,
+                        },
+                    }
+                )
+            )
+            self._reported = dropped
+        handler.handle(record)
+        self.written += 1
+
+
+writer = LogWriter()
+"""The log writer shared by every logger of this process."""
+
+
+class _DeferredHandler(logging.handlers.QueueHandler):
+    """Hands records to `writer` unformatted, to be written by `target`."""
+
+    def __init__(self, target: logging.Handler) -> None:
+        super().__init__(writer.queue)
+        self.target = target
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the writer thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        writer.submit(self.target, record)
+
 
 def make_logger(log_name: str) -> logging.Logger:
     """Create and return a file-based logger."""
@@ -16,50 +161,26 @@ def make_logger(log_name: str) -> logging.Logger:
     logger.setLevel(getattr(logging, os.environ["LOG_LEVEL"]))
     log_handler = logging.FileHandler(filename=f"{log_name}.log", mode="w", encoding="utf-8")
     log_handler.setLevel(getattr(logging, os.environ["LOG_LEVEL"]))
-    logger.addHandler(log_handler)
+    log_handler.setFormatter(JSONFormatter())
+    logger.addHandler(_DeferredHandler(log_handler))
     return logger
 
 
 def debug(logger: logging.Logger, payload: dict, err: BaseException | None = None) -> None:
-    payload["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    payload["level"] = "DEBUG"
-    if err is not None:
-        payload["err"] = repr(err)
-        payload["traceback"] = traceback.format_exc()
-    logger.debug(json.dumps(payload))
+    logger.debug(payload, exc_info=err)
 
 
 def info(logger: logging.Logger, payload: dict, err: BaseException | None = None) -> None:
-    payload["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    payload["level"] = "INFO"
-    if err is not None:
-        payload["err"] = repr(err)
-        payload["traceback"] = traceback.format_exc()
-    logger.info(json.dumps(payload))
+    logger.info(payload, exc_info=err)
 
 
 def warning(logger: logging.Logger, payload: dict, err: BaseException | None = None) -> None:
-    payload["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    payload["level"] = "WARNING"
-    if err is not None:
-        payload["err"] = repr(err)
-        payload["traceback"] = traceback.format_exc()
-    logger.warning(json.dumps(payload))
+    logger.warning(payload, exc_info=err)
 
 
 def error(logger: logging.Logger, payload: dict, err: BaseException | None = None) -> None:
-    payload["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    payload["level"] = "ERROR"
-    if err is not None:
-        payload["err"] = repr(err)
-        payload["traceback"] = traceback.format_exc()
-    logger.error(json.dumps(payload))
+    logger.error(payload, exc_info=err)
 
 
 def critical(logger: logging.Logger, payload: dict, err: BaseException | None = None) -> None:
-    payload["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    payload["level"] = "CRITICAL"
-    if err is not None:
-        payload["err"] = repr(err)
-        payload["traceback"] = traceback.format_exc()
-    logger.critical(json.dumps(payload))
+    logger.critical(payload, exc_info=err)
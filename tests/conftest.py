@@ -6,6 +6,7 @@ from typing import Generator
 import jwt
 import pytest
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
 import tests
 from pykcworkshop import async_create_app, chat
@@ -109,7 +110,12 @@ async def fixt_testy():
         async with chat.db.get_session() as session:
             return (
                 await session.execute(
-                    select(chat.db.models.User).where(chat.db.models.User.name == "Testy")
+                    select(chat.db.models.User)
+                    .where(chat.db.models.User.name == "Testy")
+                    .options(
+                        selectinload(chat.db.models.User.token),
+                        selectinload(chat.db.models.User.joined_rooms),
+                    )
                 )
             ).scalar_one()
 
@@ -127,7 +133,12 @@ async def fixt_testier():
         async with chat.db.get_session() as session:
             return (
                 await session.execute(
-                    select(chat.db.models.User).where(chat.db.models.User.name == "Testier")
+                    select(chat.db.models.User)
+                    .where(chat.db.models.User.name == "Testier")
+                    .options(
+                        selectinload(chat.db.models.User.token),
+                        selectinload(chat.db.models.User.joined_rooms),
+                    )
                 )
             ).scalar_one()
 
@@ -140,7 +151,12 @@ async def fixt_testiest():
         async with chat.db.get_session() as session:
             return (
                 await session.execute(
-                    select(chat.db.models.User).where(chat.db.models.User.name == "Testiest")
+                    select(chat.db.models.User)
+                    .where(chat.db.models.User.name == "Testiest")
+                    .options(
+                        selectinload(chat.db.models.User.token),
+                        selectinload(chat.db.models.User.joined_rooms),
+                    )
                 )
             ).scalar_one()
 
@@ -0,0 +1,47 @@
+import tests
+from pykcworkshop import chat, utils
+
+
+async def test_chat_history_is_one_query(fixt_test_room):
+    """Fetching a chunk of chat history should take a single query, no matter how many
+    messages and authors it contains."""
+
+    test_room = await fixt_test_room()
+    async with chat.db.get_session() as session:
+        with tests.helpers.count_queries() as queries:
+            rows = await chat.db.get_chat_history(
+                session, room_id=test_room.id, reference=utils.now(), limit=50
+            )
+    assert rows
+    assert len(queries) == 1
+
+
+async def test_chat_history_page_is_one_query(fixt_test_room):
+    """Fetching a keyset page of chat history should take a single query."""
+
+    test_room = await fixt_test_room()
+    async with chat.db.get_session() as session:
+        first = await chat.db.get_chat_history_page(
+            session, room_id=test_room.id, after=None, limit=5
+        )
+        with tests.helpers.count_queries() as queries:
+            rows = await chat.db.get_chat_history_page(
+                session, room_id=test_room.id, after=(first[-1][3], first[-1][0]), limit=5
+            )
+    assert len(rows) == 5
+    assert len(queries) == 1
+
+
+async def test_room_members_are_projected(fixt_testy, fixt_testier, fixt_test_room):
+    """The room members query should return plain (id, name) rows in a single query."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    testier = await fixt_testier()
+    async with chat.db.get_session() as session:
+        with tests.helpers.count_queries() as queries:
+            members = await chat.db.get_room_members(session, test_room.id)
+    assert sorted(tuple(member) for member in members) == sorted(
+        [(testy.id, testy.name), (testier.id, testier.name)]
+    )
+    assert len(queries) == 1
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import sqlite3
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from pykcworkshop import chat, utils
+
+
+async def _count_messages(prefix: str) -> int:
+    async with chat.db.get_session() as session:
+        return (
+            await session.execute(
+                select(func.count()).where(chat.db.models.ChatMessage.content.startswith(prefix))
+            )
+        ).scalar_one()
+
+
+def _lock_db(monkeypatch, failures: int) -> None:
+    """Make the next `failures` writes of any writer fail like they would on a locked
+    SQLite db."""
+
+    get_session = chat.db.sessions.get_session
+
+    @contextlib.asynccontextmanager
+    async def locked_session():
+        nonlocal failures
+        if failures:
+            failures -= 1
+            raise OperationalError(
+                "INSERT INTO chat_message", None, sqlite3.OperationalError("database is locked")
+            )
+        async with get_session() as session:
+            yield session
+
+    monkeypatch.setattr(chat.db.writer.sessions, "get_session", locked_session)
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_rows_are_written_in_batches(fixt_testy, fixt_test_room):
+    """The writer should group buffered rows into batches of at most `max_batch` rows and
+    write every row by the time it is stopped."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    writer = chat.db.writer.ChatMessageWriter(max_batch=50, max_delay=0.05)
+    for i in range(120):
+        await writer.submit(
+            author_id=testy.id, room_id=test_room.id, content=f"batched {i}", timestamp=utils.now()
+        )
+    await writer.stop()
+    assert await _count_messages("batched ") == 120
+    assert writer.rows_written == 120
+    assert 3 <= writer.batches_written < 120
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_rows_are_flushed_after_max_delay(fixt_testy, fixt_test_room):
+    """A partial batch should be written once `max_delay` has passed without waiting for
+    more rows."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    writer = chat.db.writer.ChatMessageWriter(max_batch=50, max_delay=0.01)
+    await writer.submit(
+        author_id=testy.id, room_id=test_room.id, content="delayed", timestamp=utils.now()
+    )
+    async with asyncio.timeout(5):
+        while await _count_messages("delayed") == 0:
+            await asyncio.sleep(0.01)
+    assert writer.batches_written == 1
+    await writer.stop()
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_invalid_rows_do_not_drop_the_batch(fixt_testy, fixt_test_room):
+    """A row that violates a db constraint should be dropped without losing the valid rows
+    that were written in the same batch."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    writer = chat.db.writer.ChatMessageWriter(max_batch=50, max_delay=0.05)
+    for room_id in [test_room.id, "not-a-room", test_room.id]:
+        await writer.submit(
+            author_id=testy.id, room_id=room_id, content="mixed batch", timestamp=utils.now()
+        )
+    await writer.stop()
+    assert await _count_messages("mixed batch") == 2
+    assert writer.rows_written == 2
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_rows_survive_a_locked_db(fixt_testy, fixt_test_room, monkeypatch):
+    """A batch that fails because the db is locked should be retried, and go back to the
+    front of the buffer if the db is still locked after every retry, so no row is lost."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    writer = chat.db.writer.ChatMessageWriter(
+        max_batch=50, max_delay=0.01, retry_delays=(0.001, 0.001)
+    )
+    _lock_db(monkeypatch, failures=4)
+    for i in range(5):
+        await writer.submit(
+            author_id=testy.id, room_id=test_room.id, content=f"locked {i}", timestamp=utils.now()
+        )
+    async with asyncio.timeout(5):
+        while await _count_messages("locked ") < 5:
+            await asyncio.sleep(0.01)
+    await writer.stop()
+    assert writer.rows_written == 5
+    assert writer.rows_lost == 0
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_rows_are_counted_as_lost_if_the_db_stays_locked(
+    fixt_testy, fixt_test_room, monkeypatch
+):
+    """Rows that still can't be written when the writer is stopped should be counted as
+    lost."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    writer = chat.db.writer.ChatMessageWriter(max_batch=50, max_delay=0.01, retry_delays=())
+    _lock_db(monkeypatch, failures=1_000)
+    for i in range(3):
+        await writer.submit(
+            author_id=testy.id, room_id=test_room.id, content=f"lost {i}", timestamp=utils.now()
+        )
+    await writer.stop()
+    assert await _count_messages("lost ") == 0
+    assert writer.rows_written == 0
+    assert writer.rows_lost == 3
@@ -2,6 +2,7 @@ import asyncio
 from contextlib import contextmanager
 
 import pytest
+from sqlalchemy import event
 
 from pykcworkshop.chat import db
 
@@ -16,6 +17,23 @@ def does_not_raise(exception):
         raise pytest.fail("Raised {0}".format(exception))
 
 
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed on the db engine while the block runs."""
+
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.sessions._engine.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 _TESTY_PASSWORD: str = ""
 _TESTIER_PASSWORD: str = ""
 _TESTIEST_PASSWORD: str = ""
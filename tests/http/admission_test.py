@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from pykcworkshop.chat.api.http import admission
+
+
+async def test_waiting_clients_are_served_round_robin():
+    """Queued requests should be admitted one client at a time, so a client with several
+    requests waiting doesn't starve a client with one."""
+
+    queue = admission.AdmissionQueue(capacity=1, max_queued_per_client=3)
+    await queue.acquire("running")
+    admitted = []
+
+    async def request(client: str) -> None:
+        await queue.acquire(client)
+        admitted.append(client)
+        queue.release(0.01)
+
+    tasks = []
+    for client in ["flood", "flood", "flood", "polite"]:
+        tasks.append(asyncio.create_task(request(client)))
+        await asyncio.sleep(0)
+    assert queue.depth == 4
+    queue.release(0.01)
+    await asyncio.gather(*tasks)
+    assert admitted == ["flood", "polite", "flood", "flood"]
+    assert (queue.accepted, queue.queued, queue.shed) == (1, 4, 0)
+
+
+async def test_requests_over_the_limits_are_shed():
+    """A client over its own limit should get a 429, and anyone should get a 503 once the
+    queue is full, both with a retry delay."""
+
+    queue = admission.AdmissionQueue(capacity=1, max_queued=2, max_queued_per_client=1)
+    await queue.acquire("running")
+    waiting = [asyncio.create_task(queue.acquire(client)) for client in ["a", "b"]]
+    await asyncio.sleep(0)
+    with pytest.raises(admission.Overloaded) as err:
+        await queue.acquire("a")
+    assert err.value.status == 429
+    assert err.value.retry_after >= 1
+    with pytest.raises(admission.Overloaded) as err:
+        await queue.acquire("c")
+    assert err.value.status == 503
+    assert queue.shed == 2
+    for _ in range(3):
+        queue.release()
+    await asyncio.gather(*waiting)
+    assert queue.depth == 0
+
+
+async def test_requests_that_wait_too_long_are_shed():
+    """A request that isn't admitted within `max_wait` should be shed with a 503 and leave
+    the queue."""
+
+    queue = admission.AdmissionQueue(capacity=1, max_wait=0.01)
+    await queue.acquire("running")
+    with pytest.raises(admission.Overloaded) as err:
+        await queue.acquire("late")
+    assert err.value.status == 503
+    assert queue.depth == 0
+    queue.release()
+    await queue.acquire("next")
+    assert queue.accepted == 2
+
+
+async def test_login_is_shed_when_overloaded(
+    fixt_client, fixt_testy_password, fixt_http_headers_csrf_only, monkeypatch
+):
+    """The login route should answer with a 503 and a `Retry-After` header instead of
+    hashing when its admission queue is full."""
+
+    queue = admission.AdmissionQueue(capacity=1, max_queued=0)
+    monkeypatch.setattr(admission, "queue", queue)
+    await queue.acquire("someone else")
+    res = await fixt_client.post(
+        "/chat/api/v1/user/login",
+        json={"user_hash": fixt_testy_password},
+        headers=fixt_http_headers_csrf_only,
+    )
+    assert res.status_code == 503
+    assert int(res.headers["Retry-After"]) >= 1
+    queue.release()
+    res = await fixt_client.post(
+        "/chat/api/v1/user/login",
+        json={"user_hash": fixt_testy_password},
+        headers=fixt_http_headers_csrf_only,
+    )
+    assert res.status_code == 200
+    assert queue.accepted == 2
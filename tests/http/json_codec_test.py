@@ -0,0 +1,51 @@
+import datetime
+
+import pytest
+
+from pykcworkshop import json_codec
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+orjson = pytest.importorskip("orjson")
+
+_payload = {
+    "room_name": "Test Room",
+    "members": [{"id": 1, "name": "Testy"}, {"id": 2, "name": "Ümlaut Üser"}],
+    "messages": [{"content": 'Hello\n"world"', "timestamp": "2024-01-01T00:00:00+00:00"}],
+    "next_page_cursor": None,
+    "validation_failed": False,
+}
+
+
+def test_codecs_agree():
+    """Every codec should decode what any codec encodes to the same value."""
+
+    codecs = [json_codec.choose_codec("stdlib"), json_codec.choose_codec("orjson")]
+    for encoder in codecs:
+        for decoder in codecs:
+            assert decoder.loads(encoder.dumps(_payload)) == _payload
+
+
+def test_unknown_codec_is_rejected():
+    """Choosing a codec that doesn't exist should raise a `ValueError`."""
+
+    with pytest.raises(ValueError):
+        json_codec.choose_codec("simplejson")
+
+
+def test_app_uses_fastest_codec(fixt_app):
+    """The app factory should switch the app to orjson when it is installed."""
+
+    assert json_codec.get_codec().name == "orjson"
+    assert Frame(_payload).data == orjson.dumps(_payload).decode()
+
+
+async def test_provider_keeps_quart_defaults(fixt_app, monkeypatch):
+    """The Quart JSON provider should encode the types only Quart knows how to encode the way
+    Quart does, whichever codec is used."""
+
+    value = {"created": datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)}
+    monkeypatch.setattr(json_codec, "_codec", json_codec.STDLIB)
+    expected = fixt_app.json.loads(fixt_app.json.dumps(value))
+    monkeypatch.setattr(json_codec, "_codec", json_codec.choose_codec("orjson"))
+    assert fixt_app.json.loads(fixt_app.json.dumps(value)) == expected
+    assert expected == {"created": "Mon, 01 Jan 2024 00:00:00 GMT"}
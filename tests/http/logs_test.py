@@ -0,0 +1,125 @@
+import json
+import logging
+import logging.handlers
+import threading
+
+from pykcworkshop import logs
+
+
+class BlockingHandler(logging.Handler):
+    """A handler that holds up the writer thread on its first record until released."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records: list[logging.LogRecord] = []
+        self.blocked = threading.Event()
+        self.unblock = threading.Event()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        if not self.blocked.is_set():
+            self.blocked.set()
+            self.unblock.wait(5)
+
+
+def test_records_are_serialized_on_the_writer_thread(tmp_path, monkeypatch):
+    """Log calls should leave formatting, serialization, and writing to the writer thread,
+    which writes every queued record before it stops."""
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(logs, "writer", logs.LogWriter())
+    format_threads = []
+    format_record = logs.JSONFormatter.format
+
+    def recording_format(self, record):
+        format_threads.append(threading.current_thread().name)
+        return format_record(self, record)
+
+    monkeypatch.setattr(logs.JSONFormatter, "format", recording_format)
+    logger = logs.make_logger("deferred")
+    logs.writer.start()
+    try:
+        raise ValueError("Something broke")
+    except ValueError as e:
+        logs.error(logger, {"msg": "Handled an error", "user_id": 1}, err=e)
+    logs.info(logger, {"msg": "Carrying on"})
+    logs.writer.stop()
+    lines = [json.loads(line) for line in (tmp_path / "deferred.log").read_text().splitlines()]
+    assert [line["msg"] for line in lines] == ["Handled an error", "Carrying on"]
+    assert lines[0]["level"] == "ERROR"
+    assert lines[0]["user_id"] == 1
+    assert lines[0]["err"] == "ValueError('Something broke')"
+    assert "raise ValueError" in lines[0]["traceback"]
+    assert "timestamp" in lines[1] and "err" not in lines[1]
+    assert format_threads == ["log-writer", "log-writer"]
+    assert logs.writer.written == 2
+
+
+def test_records_are_written_directly_until_the_writer_starts(tmp_path, monkeypatch):
+    """Log calls made while the writer isn't running should be written right away."""
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(logs, "writer", logs.LogWriter())
+    logger = logs.make_logger("direct")
+    logs.warning(logger, {"msg": "No writer yet"})
+    line = json.loads((tmp_path / "direct.log").read_text())
+    assert line["msg"] == "No writer yet"
+    assert line["level"] == "WARNING"
+
+
+def test_records_are_dropped_when_the_queue_is_full(monkeypatch):
+    """Log calls should drop their record instead of blocking when the writer thread has
+    fallen behind, and the writer should report how many records it dropped."""
+
+    monkeypatch.setattr(logs, "writer", logs.LogWriter(maxsize=2))
+    handler = BlockingHandler()
+    logger = logging.getLogger("blocked_log")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logs._DeferredHandler(handler))
+    try:
+        logs.writer.start()
+        logs.info(logger, {"msg": "first"})
+        assert handler.blocked.wait(5)
+        for i in range(5):
+            logs.info(logger, {"msg": f"queued {i}"})
+        assert logs.writer.dropped == 3
+        handler.unblock.set()
+        logs.writer.stop()
+    finally:
+        logger.handlers.clear()
+    assert [record.msg["msg"] for record in handler.records] == [
+        "first",
+        "Dropped log records",
+        "queued 0",
+        "queued 1",
+    ]
+    assert handler.records[1].msg["dropped"] == 3
+
+
+def test_records_logged_while_stopping_are_written(monkeypatch):
+    """A record logged while the writer is stopping should be written, even when the log
+    call saw the writer running just before `stop` was called."""
+
+    monkeypatch.setattr(logs, "writer", logs.LogWriter())
+    handler = logging.handlers.BufferingHandler(capacity=100)
+    logger = logging.getLogger("stopping_log")
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logs._DeferredHandler(handler))
+    stopper = threading.Thread(target=logs.writer.stop)
+    put_nowait = logs.writer.queue.put_nowait
+
+    def put_nowait_while_stopping(item):
+        # Stop the writer between the log call's check of the thread and its put.
+        stopper.start()
+        stopper.join(0.2)
+        put_nowait(item)
+
+    monkeypatch.setattr(logs.writer.queue, "put_nowait", put_nowait_while_stopping)
+    try:
+        logs.writer.start()
+        logs.info(logger, {"msg": "while stopping"})
+        stopper.join(5)
+    finally:
+        logger.handlers.clear()
+    assert not stopper.is_alive()
+    assert [record.msg["msg"] for record in handler.buffer] == ["while stopping"]
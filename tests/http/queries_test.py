@@ -0,0 +1,64 @@
+import pytest
+
+import tests
+
+# The number of SQL statements each route should emit for a successful request. A route
+# that starts emitting more is either lazy loading a relationship or querying in a loop.
+_route_queries = [
+    ("GET", "/room/{room_hash}", None, 1, "room-data"),
+    ("GET", "/room/{room_hash}/members", None, 1, "room-members"),
+    ("GET", "/room/{room_hash}/presence", None, 0, "room-presence"),
+    ("GET", "/user/rooms/joined", None, 1, "user-joined-rooms"),
+    ("GET", "/user/rooms/owned", None, 1, "user-owned-rooms"),
+    ("POST", "/room/create", {"room_name": "Counted Room"}, 5, "create-room"),
+    ("POST", "/user/create", {"user_name": "Counted User"}, 3, "create-user"),
+]
+
+
+@pytest.mark.usefixtures("reset_db")
+@pytest.mark.parametrize(
+    "method,path,body,expected",
+    [route[:4] for route in _route_queries],
+    ids=[route[4] for route in _route_queries],
+)
+async def test_route_query_counts(
+    fixt_client, fixt_test_room, fixt_http_headers_testy, method, path, body, expected
+):
+    """Each http route should emit a fixed number of SQL statements."""
+
+    test_room = await fixt_test_room()
+    url = "/chat/api/v1" + path.format(room_hash=test_room.id)
+    with tests.helpers.count_queries() as queries:
+        res = await getattr(fixt_client, method.lower())(
+            url, json=body, headers=fixt_http_headers_testy
+        )
+    assert res.status_code < 300
+    assert len(queries) == expected
+
+
+async def test_login_query_count(fixt_client, fixt_testy_password, fixt_http_headers_csrf_only):
+    """The login route should fetch the user and their token in a single query."""
+
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.post(
+            "/chat/api/v1/user/login",
+            json={"user_hash": fixt_testy_password},
+            headers=fixt_http_headers_csrf_only,
+        )
+    assert res.status_code == 200
+    assert len(queries) == 1
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_join_room_query_count(
+    fixt_client, fixt_testiest, fixt_test_room, fixt_http_headers_csrf_only
+):
+    """The join room route should emit a fixed number of SQL statements."""
+
+    testiest = await fixt_testiest()
+    test_room = await fixt_test_room()
+    headers = {"Authorization": f"Bearer {testiest.token.token}", **fixt_http_headers_csrf_only}
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.put(f"/chat/api/v1/room/{test_room.id}/join", headers=headers)
+    assert res.status_code == 200
+    assert len(queries) == 5
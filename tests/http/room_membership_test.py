@@ -1,5 +1,8 @@
 import pytest
 
+import tests
+from pykcworkshop.chat import presence
+
 
 async def test_get_joined_rooms_for_user_basic_usage(
     fixt_client, fixt_test_room, fixt_http_headers_testy
@@ -8,8 +11,12 @@ async def test_get_joined_rooms_for_user_basic_usage(
     for all rooms that the provided user token has joined."""
 
     test_room = await fixt_test_room()
-    res = await fixt_client.get("/chat/api/v1/user/rooms/joined", headers=fixt_http_headers_testy)
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.get(
+            "/chat/api/v1/user/rooms/joined", headers=fixt_http_headers_testy
+        )
     data = await res.get_json()
+    assert len(queries) == 1
     assert len(data) == 1
     assert data[0]["room_name"] == test_room.name
     assert data[0]["room_hash"] == test_room.id
@@ -53,10 +60,12 @@ async def test_get_room_members_basic_usage(
     test_room = await fixt_test_room()
     testy = await fixt_testy()
     testier = await fixt_testier()
-    res = await fixt_client.get(
-        f"/chat/api/v1/room/{test_room.id}/members", headers=fixt_http_headers_testy
-    )
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.get(
+            f"/chat/api/v1/room/{test_room.id}/members", headers=fixt_http_headers_testy
+        )
     assert res.status_code == 200
+    assert len(queries) == 1
     data = sorted(await res.get_json(), key=lambda d: d["user_name"])
     assert len(data) == 2
     assert data[0]["user_name"] == testier.name
@@ -70,8 +79,37 @@ async def test_get_user_owned_rooms(fixt_client, fixt_test_room, fixt_http_heade
     the logged in user owns."""
 
     test_room = await fixt_test_room()
-    res = await fixt_client.get("/chat/api/v1/user/rooms/owned", headers=fixt_http_headers_testy)
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.get(
+            "/chat/api/v1/user/rooms/owned", headers=fixt_http_headers_testy
+        )
     data = await res.get_json()
+    assert len(queries) == 1
     assert len(data) == 1
     assert data[0]["room_name"] == test_room.name
     assert data[0]["room_hash"] == test_room.id
+
+
+async def test_get_room_presence_basic_usage(
+    fixt_client, fixt_testy, fixt_test_room, fixt_http_headers_testy, monkeypatch
+):
+    """The room presence endpoint should return the latest status of every member who is
+    present in the provided room."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    registry = presence.PresenceRegistry()
+    monkeypatch.setattr(presence, "registry", registry)
+    registry.update(
+        test_room.id, {"user_id": testy.id, "user_name": testy.name, "user_status": "Typing"}
+    )
+    res = await fixt_client.get(
+        f"/chat/api/v1/room/{test_room.id}/presence", headers=fixt_http_headers_testy
+    )
+    assert res.status_code == 200
+    data = await res.get_json()
+    assert len(data) == 1
+    assert data[0]["user_id"] == testy.id
+    assert data[0]["user_name"] == testy.name
+    assert data[0]["user_status"] == "Typing"
+    assert "last_changed" in data[0]
@@ -10,10 +10,12 @@ async def test_room_data_basic_usage(fixt_client, fixt_test_room, fixt_http_head
     """The room data endpoint should return the room name and hash."""
 
     test_room = await fixt_test_room()
-    res = await fixt_client.get(
-        f"{utils.get_domain()}/chat/api/v1/room/{test_room.id}", headers=fixt_http_headers_testy
-    )
+    with tests.helpers.count_queries() as queries:
+        res = await fixt_client.get(
+            f"{utils.get_domain()}/chat/api/v1/room/{test_room.id}", headers=fixt_http_headers_testy
+        )
     assert res.status_code == 200
+    assert len(queries) == 1
     data = await res.get_json()
     assert data["room_name"] == test_room.name
     assert data["room_hash"] == test_room.id
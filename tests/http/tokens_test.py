@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import os
+import time
+
+import argon2
+import jwt
+import pytest
+
+from pykcworkshop import utils
+from pykcworkshop.chat import tokens
+
+
+def _token(lifetime: datetime.timedelta) -> str:
+    now = utils.now()
+    return jwt.encode(
+        {"user_id": 1, "exp": now + lifetime, "iat": now},
+        os.environ["JWT_SECRET"],
+        algorithm="HS256",
+    )
+
+
+def test_validated_tokens_are_cached(monkeypatch):
+    """A token should only be decoded the first time it is validated, and each caller should
+    get its own copy of the payload."""
+
+    monkeypatch.setattr(tokens, "token_cache", tokens.TokenCache())
+    decode_calls = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decode_calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    token = _token(datetime.timedelta(days=1))
+    first = tokens.validate_token(token)
+    first["user_id"] = 2
+    assert tokens.validate_token(token)["user_id"] == 1
+    assert len(decode_calls) == 1
+    assert tokens.token_cache.hits == 1
+
+
+def test_invalid_tokens_are_not_cached(monkeypatch):
+    """Tokens that fail validation should never be stored, so they fail every time."""
+
+    monkeypatch.setattr(tokens, "token_cache", tokens.TokenCache())
+    forged = jwt.encode({"user_id": 1}, "bad_signing_secret", algorithm="HS256")
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidTokenError):
+            tokens.validate_token(forged)
+    assert tokens.token_cache.hits == 0
+
+
+def test_cached_tokens_expire(monkeypatch):
+    """A cached token should stop being accepted once its `exp` claim or the cache's TTL
+    has passed."""
+
+    cache = tokens.TokenCache(ttl=datetime.timedelta(minutes=5))
+    short_lived = _token(datetime.timedelta(seconds=30))
+    long_lived = _token(datetime.timedelta(days=1))
+    cache.put(short_lived, jwt.decode(short_lived, os.environ["JWT_SECRET"], algorithms=["HS256"]))
+    cache.put(long_lived, jwt.decode(long_lived, os.environ["JWT_SECRET"], algorithms=["HS256"]))
+    assert cache.get(short_lived) is not None
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert cache.get(short_lived) is None
+    assert cache.get(long_lived) is not None
+    monkeypatch.setattr(time, "time", lambda: now + 6 * 60)
+    assert cache.get(long_lived) is None
+
+
+def test_token_cache_is_bounded():
+    """The token cache should drop the least recently used token once it is full."""
+
+    cache = tokens.TokenCache(maxsize=2)
+    for name in ["a", "b"]:
+        cache.put(name, {"name": name})
+    cache.get("a")
+    cache.put("c", {"name": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+async def test_hash_pool_round_trip():
+    """Passwords hashed on the hash pool should verify on it, and wrong passwords should
+    fail verification."""
+
+    pool = tokens.PasswordHashPool(workers=1)
+    password_hash = await pool.hash("hunter2")
+    assert await pool.verify(password_hash, "hunter2")
+    with pytest.raises(argon2.exceptions.VerifyMismatchError):
+        await pool.verify(password_hash, "hunter3")
+    assert pool.completed == 3
+    pool.shutdown()
+
+
+async def test_hash_pool_caps_concurrency_and_keeps_the_loop_responsive():
+    """No more than `workers` hashes should run at once, the rest should wait on the event
+    loop with their wait recorded, and the event loop should keep running in the meantime."""
+
+    pool = tokens.PasswordHashPool(workers=1)
+    loop = asyncio.get_running_loop()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    burst = asyncio.gather(*[pool.hash(f"password {i}") for i in range(4)])
+    await asyncio.sleep(0)
+    assert pool.waiting == 3
+    start = loop.time()
+    await burst
+    elapsed = loop.time() - start
+    ticker.cancel()
+    assert pool.completed == 4
+    assert pool.waiting == 0
+    assert pool.queue_wait_max > 0
+    assert pool.queue_wait_total > pool.queue_wait_max
+    # Hashing on the loop would leave no room for the ticker at all.
+    assert ticks > elapsed / 0.01
+    pool.shutdown()
+
+
+def test_resume_tokens_are_bound_and_expire():
+    """A resume token should only check out for the login hash and password hash it was
+    issued for, and only until it expires."""
+
+    resume_token = tokens.issue_resume_token("login hash", "password hash")
+    assert tokens.check_resume_token(resume_token, "login hash", "password hash")
+    assert not tokens.check_resume_token(resume_token, "other login hash", "password hash")
+    assert not tokens.check_resume_token(resume_token, "login hash", "new password hash")
+    assert not tokens.check_resume_token("not a token", "login hash", "password hash")
+    expired = tokens.issue_resume_token(
+        "login hash", "password hash", lifetime=datetime.timedelta(seconds=-1)
+    )
+    assert not tokens.check_resume_token(expired, "login hash", "password hash")
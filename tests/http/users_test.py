@@ -124,3 +124,57 @@ async def test_create_user_400_when_user_name_is_empty_string(
         headers=fixt_http_headers_csrf_only,
     )
     assert res.status_code == 400
+
+
+async def test_user_login_resumes_without_argon2(
+    fixt_client, fixt_testy, fixt_testy_password, fixt_http_headers_csrf_only, monkeypatch
+):
+    """A login with the resume token from an earlier login should succeed without verifying
+    the user hash with Argon2, and should get the same resume token back."""
+
+    url = f"{utils.get_domain()}/chat/api/v1/user/login"
+    res = await fixt_client.post(
+        url, json={"user_hash": fixt_testy_password}, headers=fixt_http_headers_csrf_only
+    )
+    resume_token = (await res.get_json())["resume_token"]
+
+    async def fail_verify(*args):
+        raise AssertionError("Argon2 verification should be skipped")
+
+    monkeypatch.setattr(chat.tokens.get_hash_pool(), "verify", fail_verify)
+    res = await fixt_client.post(
+        url,
+        json={"user_hash": fixt_testy_password, "resume_token": resume_token},
+        headers=fixt_http_headers_csrf_only,
+    )
+    assert res.status_code == 200
+    data = await res.get_json()
+    assert data["user_id"] == (await fixt_testy()).id
+    assert data["resume_token"] == resume_token
+
+
+async def test_user_login_resume_token_needs_matching_user_hash(
+    fixt_client, fixt_testy, fixt_testy_password, fixt_http_headers_csrf_only
+):
+    """A resume token should only be accepted with the user hash it was issued for, and an
+    invalid resume token should fall back to a full verification."""
+
+    url = f"{utils.get_domain()}/chat/api/v1/user/login"
+    res = await fixt_client.post(
+        url, json={"user_hash": fixt_testy_password}, headers=fixt_http_headers_csrf_only
+    )
+    resume_token = (await res.get_json())["resume_token"]
+    forged_hash = "0" * 40 + str((await fixt_testy()).id)
+    res = await fixt_client.post(
+        url,
+        json={"user_hash": forged_hash, "resume_token": resume_token},
+        headers=fixt_http_headers_csrf_only,
+    )
+    assert res.status_code == 401
+    res = await fixt_client.post(
+        url,
+        json={"user_hash": tests.helpers.testier_password(), "resume_token": resume_token},
+        headers=fixt_http_headers_csrf_only,
+    )
+    assert res.status_code == 200
+    assert (await res.get_json())["resume_token"] != resume_token
@@ -1,6 +1,7 @@
+import pytest
 import websockets
 
-from pykcworkshop import chat
+from pykcworkshop import chat, utils
 
 
 async def test_secured_websockets_require_auth(fixt_client, fixt_ws_secured_endpoints):
@@ -37,3 +38,41 @@ async def test_all_websockets_require_csrf(
         assert e.status_code == 401
     else:
         assert False, "Did not raise"
+
+
+@pytest.mark.parametrize("path", ["chat-message", "member-status", "client-sync", "chat-history"])
+async def test_room_websockets_require_membership(
+    fixt_client, fixt_test_room, fixt_ws_headers_testiest, path
+):
+    """All room websockets should return a 403 response if the user hasn't joined the
+    room."""
+
+    test_room = await fixt_test_room()
+    url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}/{path}"
+
+    try:
+        await websockets.connect(url, extra_headers=fixt_ws_headers_testiest)
+    except websockets.exceptions.InvalidStatusCode as e:
+        assert e.status_code == 403
+    else:
+        assert False, "Did not raise"
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_room_websockets_accept_new_members(
+    fixt_client, fixt_test_room, fixt_testiest, fixt_ws_headers_testiest
+):
+    """A user who was turned away from a room websocket should be let in once they join
+    the room."""
+
+    test_room = await fixt_test_room()
+    url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}/client-sync"
+    with pytest.raises(websockets.exceptions.InvalidStatusCode):
+        await websockets.connect(url, extra_headers=fixt_ws_headers_testiest)
+    async with chat.db.get_session() as session:
+        await chat.db.add_user_to_room(
+            session, user_id=(await fixt_testiest()).id, room_id=test_room.id
+        )
+        await session.commit()
+    conn = await websockets.connect(url, extra_headers=fixt_ws_headers_testiest)
+    await conn.close()
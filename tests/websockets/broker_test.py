@@ -0,0 +1,150 @@
+import contextlib
+import json
+
+from pykcworkshop import json_codec
+from pykcworkshop.chat.api.websockets import broker
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+async def test_publish_reaches_all_room_subscribers():
+    """Publishing to a room should deliver the message to every subscriber of that room
+    and no subscribers of other rooms."""
+
+    room_broker = broker.Broker("test")
+    frame = Frame.raw("message")
+    with room_broker.subscription("room") as first, room_broker.subscription("room") as second:
+        with room_broker.subscription("other-room") as other:
+            room_broker.publish("room", frame)
+            assert first.queue.get_nowait() is frame
+            assert second.queue.get_nowait() is frame
+            assert other.queue.empty()
+
+
+async def test_unsubscribe_cleans_up_empty_rooms():
+    """The broker should not keep an entry for a room once its last subscriber leaves."""
+
+    room_broker = broker.Broker("test")
+    with room_broker.subscription("room"):
+        assert room_broker.subscriber_count("room") == 1
+    assert room_broker.subscriber_count("room") == 0
+    assert "room" not in room_broker._rooms
+    assert room_broker.deliver("room", Frame.raw("message")) == 0
+
+
+async def test_subscriber_queue_is_bounded():
+    """A subscriber that falls behind should keep only the most recent messages instead of
+    growing without bound."""
+
+    room_broker = broker.Broker("test")
+    with room_broker.subscription("room", maxsize=2) as subscriber:
+        for i in range(5):
+            room_broker.publish("room", Frame(i))
+        assert subscriber.queue.qsize() == 2
+        assert subscriber.queue.get_nowait().payload == 3
+        assert subscriber.queue.get_nowait().payload == 4
+
+
+async def test_publish_forwards_to_backend(monkeypatch):
+    """Publishing should deliver to local subscribers and hand the same frame to the backend
+    for the other worker processes, while frames from other workers are only delivered
+    locally."""
+
+    forwarded = []
+
+    class RecordingBackend(broker.LocalBackend):
+        def publish(self, channel, room_id, frame):
+            forwarded.append((channel, room_id, frame))
+
+    monkeypatch.setattr(broker, "_backend", RecordingBackend())
+    room_broker = broker.Broker("test-backend")
+    frame = Frame.raw("message")
+    with room_broker.subscription("room") as subscriber:
+        room_broker.publish("room", frame)
+        assert subscriber.queue.get_nowait() is frame
+        assert forwarded == [("test-backend", "room", frame)]
+        assert broker.deliver("test-backend", "room", Frame.raw("remote")) == 1
+        assert subscriber.queue.get_nowait().data == "remote"
+    assert len(forwarded) == 1
+
+
+async def test_broadcast_encodes_once(monkeypatch):
+    """A broadcast should be serialized once and the same encoded object should be sent to
+    every subscriber regardless of the size of the room."""
+
+    encode_calls = 0
+    real_dumps = json_codec.dumps
+
+    def counting_dumps(*args, **kwargs):
+        nonlocal encode_calls
+        encode_calls += 1
+        return real_dumps(*args, **kwargs)
+
+    monkeypatch.setattr(json_codec, "dumps", counting_dumps)
+    room_broker = broker.Broker("test")
+    with contextlib.ExitStack() as stack:
+        subscribers = [stack.enter_context(room_broker.subscription("room")) for i in range(50)]
+        room_broker.publish("room", Frame({"user_name": "Testy", "content": "Hello"}))
+        sent = [subscriber.queue.get_nowait().data for subscriber in subscribers]
+    assert encode_calls == 1
+    assert all(data is sent[0] for data in sent)
+
+
+async def test_envelope_encodes_once(monkeypatch):
+    """Wrapping a broadcast in the same channel envelope for every subscriber should encode
+    the envelope once."""
+
+    encode_calls = 0
+    real_dumps = json_codec.dumps
+
+    def counting_dumps(*args, **kwargs):
+        nonlocal encode_calls
+        encode_calls += 1
+        return real_dumps(*args, **kwargs)
+
+    monkeypatch.setattr(json_codec, "dumps", counting_dumps)
+    frame = Frame({"user_name": "Testy", "content": "Hello"})
+    sent = [frame.envelope("room/abc/chat-message") for _ in range(50)]
+    assert encode_calls == 2  # The message itself, then the envelope.
+    assert all(data is sent[0] for data in sent)
+    assert json.loads(json.loads(sent[0])["data"]) == {"user_name": "Testy", "content": "Hello"}
+
+
+async def test_user_index_reaches_every_tab_of_the_conversation():
+    """Sending to a user should reach each of their connections to that conversation, and
+    none of their connections to other conversations or other users' connections."""
+
+    index = broker.UserIndex("test-users")
+    frame = Frame.raw("message")
+    with index.connection(1, 2) as first_tab, index.connection(1, 2) as second_tab:
+        with index.connection(1, 3) as other_dm, index.connection(2, 1) as interlocutor:
+            assert index.deliver("1:2", frame) == 2
+            assert first_tab.queue.get_nowait() is frame
+            assert second_tab.queue.get_nowait() is frame
+            assert other_dm.queue.empty()
+            assert interlocutor.queue.empty()
+
+
+async def test_user_index_drops_closed_connections():
+    """The index should not keep an entry for a user once their last connection closes,
+    including when the connection's handler fails."""
+
+    index = broker.UserIndex("test-users")
+    with contextlib.suppress(RuntimeError):
+        with index.connection(1, 2), index.connection(1, 3):
+            assert index.connection_count(1) == 2
+            raise RuntimeError
+    assert index.connection_count(1) == 0
+    assert index._rooms == {}
+
+
+async def test_disconnect_policy_flags_overflow():
+    """A subscriber with the disconnect policy should stop accepting frames once its queue is
+    full instead of discarding frames the client hasn't seen."""
+
+    subscriber = broker.Subscriber(2, overflow=broker.Overflow.DISCONNECT)
+    for i in range(4):
+        subscriber.deliver(Frame(i))
+    assert subscriber.overflowed
+    assert subscriber.dropped == 2
+    assert subscriber.depth == subscriber.peak_depth == 2
+    assert subscriber.queue.get_nowait().payload == 0
@@ -145,7 +145,9 @@ async def test_result_is_older_than_ref_timestamp(
 
     testy = await fixt_testy()
     history_room = await fixt_history_room()
-    newer = utils.now()
+    # Keep both messages newer than the "has joined" message created with the history room,
+    # even when the tests in this module run in less than a second.
+    newer = utils.now() + datetime.timedelta(seconds=10)
     older = newer - datetime.timedelta(seconds=1)
     async with chat.db.get_session() as session:
         newer_message = await chat.db.create_chat_message(
@@ -172,3 +174,38 @@ async def test_result_is_older_than_ref_timestamp(
     await conn.close()
     data = json.loads(msg)
     assert data[0]["content"] == older_message.content
+
+
+async def test_page_cursor_handles_equal_timestamps(fixt_ws_headers_testy, fixt_testy):
+    """Paging the chat-history websocket with page cursors should return every message
+    exactly once in order, even when many messages share a timestamp."""
+
+    testy = await fixt_testy()
+    tied = utils.now() - datetime.timedelta(days=1)
+    async with chat.db.get_session() as session:
+        room = await chat.db.create_room(session, room_name="Tied Room", creator_id=testy.id)
+        for i in range(25):
+            await chat.db.create_chat_message(
+                session, author_id=testy.id, room_id=room.id, content=f"Tied {i}", timestamp=tied
+            )
+        await session.commit()
+
+    url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{room.id}/chat-history"
+    for newer in [True, False]:
+        pages = []
+        page_cursor = None
+        async with websockets.connect(url, extra_headers=fixt_ws_headers_testy) as conn:
+            while True:
+                await conn.send(
+                    json.dumps({"page_cursor": page_cursor, "chunk_size": 7, "newer": newer})
+                )
+                page = json.loads(await conn.recv())
+                pages.append(page["messages"])
+                page_cursor = page["next_page_cursor"]
+                if page_cursor is None:
+                    break
+        contents = [message["content"] for page in pages for message in page]
+        # The room's "has joined" message is newer than the tied messages.
+        expected = [f"Tied {i}" for i in range(25)] + [f"{testy.name} has joined the chat."]
+        assert contents == (expected if newer else expected[::-1])
+        assert [len(page) for page in pages] == [7, 7, 7, 5]
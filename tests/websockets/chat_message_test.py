@@ -24,6 +24,24 @@ async def test_chat_message_timestamp(fixt_ws_headers_testy, fixt_test_room, fix
     assert "timestamp" in data
 
 
+async def test_chat_message_uses_authenticated_name(
+    fixt_ws_headers_testy, fixt_test_room, fixt_testy
+):
+    """The chat message websocket should send the name of the authenticated user, not the
+    name the client put in the message."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    sock_url = (
+        f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}/chat-message"
+    )
+    testy_conn = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    await testy_conn.send(json.dumps({"user_name": "Not Testy", "content": "Spoofed"}))
+    msg = await testy_conn.recv()
+    await testy_conn.close()
+    assert json.loads(msg)["user_name"] == testy.name
+
+
 async def test_throw_out_empty_messages(fixt_ws_headers_testy, fixt_test_room, fixt_testy):
     """The chat message websocket should silently discard messages with an empty content
     field."""
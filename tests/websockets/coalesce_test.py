@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+
+from pykcworkshop.chat.api.websockets import broker, coalesce
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+def _drain(subscriber: broker.Subscriber) -> list:
+    frames = []
+    while not subscriber.queue.empty():
+        frames.append(subscriber.queue.get_nowait().payload)
+    return frames
+
+
+async def test_latest_status_wins_within_a_tick():
+    """Only the first status in an idle room and the latest status of each user in the
+    following window should be published."""
+
+    room_broker = broker.Broker("test-coalesce")
+    coalescer = coalesce.StatusCoalescer(room_broker, interval=0.05)
+    with room_broker.subscription("room") as subscriber:
+        coalescer.submit("room", 1, Frame({"user_id": 1, "user_status": "Online"}))
+        for status in ["Typing", "Online", "Typing"]:
+            coalescer.submit("room", 1, Frame({"user_id": 1, "user_status": status}))
+            coalescer.submit("room", 2, Frame({"user_id": 2, "user_status": status}))
+        assert _drain(subscriber) == [{"user_id": 1, "user_status": "Online"}]
+        await asyncio.sleep(0.1)
+        assert _drain(subscriber) == [
+            {"user_id": 1, "user_status": "Typing"},
+            {"user_id": 2, "user_status": "Typing"},
+        ]
+        await asyncio.sleep(0.1)
+        coalescer.submit("room", 2, Frame({"user_id": 2, "user_status": "Online"}))
+        assert _drain(subscriber) == [{"user_id": 2, "user_status": "Online"}]
+
+
+async def test_publish_now_skips_the_window():
+    """An immediate status should be published right away and replace the user's pending
+    status, so the pending status can't overwrite it at the end of the window."""
+
+    room_broker = broker.Broker("test-coalesce")
+    coalescer = coalesce.StatusCoalescer(room_broker, interval=0.05)
+    with room_broker.subscription("room") as subscriber:
+        coalescer.submit("room", 2, Frame({"user_id": 2, "user_status": "Online"}))
+        coalescer.submit("room", 1, Frame({"user_id": 1, "user_status": "Typing"}))
+        coalescer.publish_now("room", 1, Frame({"user_id": 1, "user_status": "Offline"}))
+        assert _drain(subscriber)[-1] == {"user_id": 1, "user_status": "Offline"}
+        await asyncio.sleep(0.1)
+        assert _drain(subscriber) == []
+
+
+async def test_typing_storm_fan_out():
+    """A typing storm in a large room should publish an order of magnitude fewer status
+    frames than the clients send."""
+
+    room_broker = broker.Broker("test-coalesce")
+    coalescer = coalesce.StatusCoalescer(room_broker, interval=0.05)
+    with contextlib.ExitStack() as stack:
+        subscribers = [
+            stack.enter_context(room_broker.subscription("room", maxsize=1000)) for _ in range(200)
+        ]
+        for _ in range(4):
+            for keystroke in range(12):
+                for user_id in range(20):
+                    frame = Frame({"user_id": user_id, "user_status": "Typing"})
+                    coalescer.submit("room", user_id, frame)
+            await asyncio.sleep(0.06)
+        await asyncio.sleep(0.06)
+        assert coalescer.received == 960
+        assert coalescer.published * 10 <= coalescer.received
+        assert subscribers[0].queue.qsize() == coalescer.published
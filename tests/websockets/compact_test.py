@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import websockets
+
+from pykcworkshop import utils
+from pykcworkshop.chat.api.websockets import compact
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+def _subprotocols(headers: dict) -> list[str]:
+    return [i.strip() for i in headers["Sec-WebSocket-Protocol"].split(",")]
+
+
+@pytest.mark.parametrize(
+    "encoder,payload",
+    [
+        (
+            compact.encode_chat_message,
+            {
+                "user_name": "Testy",
+                "content": "Hi ✨",
+                "timestamp": "2024-07-01T12:00:00.123000+00:00",
+                "cursor": "3f2a9c1e-17",
+            },
+        ),
+        (
+            compact.encode_chat_history,
+            [
+                {"user_name": "Testy", "content": "", "timestamp": "1999-12-31T00:00:00+00:00"},
+                {"user_name": "Testier", "content": "b", "timestamp": "2000-01-01T00:00:01+00:00"},
+                {
+                    "user_name": "Testy",
+                    "content": "replayed",
+                    "timestamp": "2000-01-01T00:00:02+00:00",
+                    "cursor": "3f2a9c1e-18",
+                },
+            ],
+        ),
+        (
+            compact.encode_member_status,
+            [
+                {
+                    "user_id": 1,
+                    "user_name": "Testy",
+                    "user_status": "Online",
+                    "last_changed": "2024-07-01T12:00:00+00:00",
+                }
+            ],
+        ),
+    ],
+    ids=["chat-message", "chat-history", "member-snapshot"],
+)
+def test_round_trip(encoder, payload):
+    """Decoding a compact frame should give back the payload of the equivalent JSON frame."""
+
+    encoded = encoder(payload)
+    assert len(encoded) < len(json.dumps(payload))
+    assert compact.decode(encoded) == payload
+
+
+def test_unencodable_payload_falls_back_to_json():
+    """A frame whose payload doesn't fit the compact format should be sent as JSON text."""
+
+    frame = Frame.raw('{"user_name": "Testy", "user_status": "Online"}')
+    assert frame.compact(compact.encode_member_status) == frame.data
+    with pytest.raises(ValueError):
+        compact.decode(b"\x01\x00")
+
+
+async def test_compact_chat_message(fixt_ws_headers_testy, fixt_test_room, fixt_testy):
+    """The chat message websocket should send binary frames with the replay cursor to a client
+    that opts into the compact encoding."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    sock_url = (
+        f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}/chat-message"
+    )
+    async with websockets.connect(
+        sock_url, subprotocols=[compact.PROTOCOL, *_subprotocols(fixt_ws_headers_testy)]
+    ) as testy_conn:
+        assert testy_conn.subprotocol == compact.PROTOCOL
+        await testy_conn.send(json.dumps({"user_name": testy.name, "content": "Compact"}))
+        msg = await testy_conn.recv()
+    assert isinstance(msg, bytes)
+    data = compact.decode(msg)
+    assert data["user_name"] == testy.name
+    assert data["content"] == "Compact"
+    assert data["cursor"]
+
+
+async def test_unsupported_socket_ignores_compact(fixt_ws_headers_testy, fixt_test_room):
+    """A websocket without a compact encoding should not accept the compact subprotocol."""
+
+    test_room = await fixt_test_room()
+    sock_url = (
+        f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}/client-sync"
+    )
+    async with websockets.connect(
+        sock_url, subprotocols=[compact.PROTOCOL, *_subprotocols(fixt_ws_headers_testy)]
+    ) as testy_conn:
+        assert testy_conn.subprotocol is None
+        await testy_conn.send(json.dumps({"key": "value"}))
+        assert json.loads(await testy_conn.recv()) == {"key": "value"}
@@ -2,15 +2,19 @@ import asyncio
 import json
 import time
 
+import pytest
 import websockets
 
-from pykcworkshop import utils
+from pykcworkshop import chat, utils
 from tests.websockets.helpers import validInputMsg
 
 
+@pytest.mark.usefixtures("reset_db")
 async def test_m2m_broadcast(
     fixt_ws_m2m_endpoints,
     fixt_testy,
+    fixt_testiest,
+    fixt_test_room,
     fixt_ws_headers_testy,
     fixt_ws_headers_testier,
     fixt_ws_headers_testiest,
@@ -19,6 +23,11 @@ async def test_m2m_broadcast(
     other clients."""
 
     testy = await fixt_testy()
+    async with chat.db.get_session() as session:
+        await chat.db.add_user_to_room(
+            session, user_id=(await fixt_testiest()).id, room_id=(await fixt_test_room()).id
+        )
+        await session.commit()
     sock_url = fixt_ws_m2m_endpoints
     testy_conn = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
     testier_conn = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testier)
@@ -157,16 +166,21 @@ async def test_121_broadcast(
                 await testier_conn.send(
                     json.dumps({"type": "chat-message", "form_data": {"content": f"testier_{i}"}})
                 )
-    for i in range(3):
-        testy_data = json.loads(await testy_conn.recv())
-        testier_data = json.loads(await testier_conn.recv())
-        match fixt_ws_121_endpoints.split("/").pop():
-            case "chat-history":
+    match fixt_ws_121_endpoints.split("/").pop():
+        case "chat-history":
+            for i in range(3):
+                testy_data = json.loads(await testy_conn.recv())
+                testier_data = json.loads(await testier_conn.recv())
                 assert len(testy_data) == 2
                 assert len(testier_data) == 0
-            case "form-validation":
-                assert testy_data["form_data"]["content"] == f"testy_{i}"
-                assert testier_data["form_data"]["content"] == f"testier_{i}"
+        case "form-validation":
+            # Forms superseded by a newer one are skipped, but the latest is always answered.
+            for conn, name in [(testy_conn, "testy"), (testier_conn, "testier")]:
+                contents = []
+                while not contents or contents[-1] != f"{name}_2":
+                    contents.append(json.loads(await conn.recv())["form_data"]["content"])
+                assert contents == sorted(contents)
+                assert {content.split("_")[0] for content in contents} == {name}
 
     await testy_conn.close()
     await testier_conn.close()
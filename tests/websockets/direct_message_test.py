@@ -21,6 +21,22 @@ async def test_direct_message_timestamp(fixt_ws_headers_testy, fixt_testy, fixt_
     assert "timestamp" in data
 
 
+async def test_direct_message_uses_authenticated_name(
+    fixt_ws_headers_testy, fixt_testy, fixt_testier
+):
+    """The direct message websocket should send the name of the authenticated user, not the
+    name the client put in the message."""
+
+    testy = await fixt_testy()
+    testier = await fixt_testier()
+    sock_url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/{testier.id}/direct-message"
+    testy_conn = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    await testy_conn.send(json.dumps({"user_name": testier.name, "content": "Spoofed"}))
+    msg = await testy_conn.recv()
+    await testy_conn.close()
+    assert json.loads(msg)["user_name"] == testy.name
+
+
 async def test_throw_out_empty_messages(fixt_ws_headers_testy, fixt_testy, fixt_testier):
     """The direct-message websocket should silently discard messages with an empty content
     field."""
@@ -1,13 +1,38 @@
+import asyncio
+import contextlib
 import json
+import sqlite3
 
 import pytest
 import websockets
+from sqlalchemy.exc import OperationalError
 
-from pykcworkshop import utils
+from pykcworkshop import logs, utils
+from pykcworkshop.chat import names
+from pykcworkshop.chat.api.websockets import channels
+from pykcworkshop.chat.api.websockets.frames import Frame
 
 form_types = ["create-user", "create-room", "chat-message"]
 
 
+class ScriptedChannel(channels.Channel):
+    """A channel whose client has sent every message in `received` before it is read."""
+
+    def __init__(self) -> None:
+        self.name = "scripted"
+        self.received: asyncio.Queue[str] = asyncio.Queue()
+        self.sent: list[Frame] = []
+
+    async def accept(self, encoder=None) -> None:
+        pass
+
+    async def receive(self) -> str:
+        return await self.received.get()
+
+    async def send(self, frame: Frame) -> None:
+        self.sent.append(frame)
+
+
 @pytest.fixture(params=form_types, ids=form_types)
 async def fixt_valid_form_messages(request, fixt_testy):
     testy = await fixt_testy()
@@ -243,3 +268,99 @@ async def test_form_validation_chat_message_too_long(fixt_ws_headers_csrf_only):
     await sock.close()
     data = json.loads(msg)
     assert data["validation_failed"]
+
+
+async def test_form_validation_skips_superseded_forms():
+    """The form validation channel should only validate the newest pending form of each type,
+    skipping the forms that were superseded before it got to them."""
+
+    channel = ScriptedChannel()
+    for i in range(10):
+        channel.received.put_nowait(
+            json.dumps({"type": "create-user", "form_data": {"user_name": f"NewUser{i}"}})
+        )
+        if i % 3 == 0:
+            channel.received.put_nowait(
+                json.dumps({"type": "chat-message", "form_data": {"content": f"content_{i}"}})
+            )
+    handler = asyncio.create_task(channels.form_validation(channel))
+    try:
+        while len(channel.sent) < 2:
+            await asyncio.sleep(0.01)
+        assert [frame.payload["form_data"] for frame in channel.sent] == [
+            {"user_name": "NewUser9"},
+            {"content": "content_9"},
+        ]
+        channel.received.put_nowait(
+            json.dumps({"type": "create-user", "form_data": {"user_name": "NewUser10"}})
+        )
+        while len(channel.sent) < 3:
+            await asyncio.sleep(0.01)
+        assert channel.sent[2].payload["form_data"] == {"user_name": "NewUser10"}
+    finally:
+        handler.cancel()
+
+
+async def test_form_validation_survives_failing_validators(monkeypatch):
+    """A form whose validation raises should be skipped without ending the channel or
+    losing the other forms, and closing the channel should stop its validation task."""
+
+    calls = 0
+
+    async def flaky_is_user_name_taken(user_name):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise OperationalError("SELECT", None, sqlite3.OperationalError("database is locked"))
+        return False
+
+    monkeypatch.setattr(names.index, "is_user_name_taken", flaky_is_user_name_taken)
+    channel = ScriptedChannel()
+    channel.received.put_nowait(
+        json.dumps({"type": "create-user", "form_data": {"user_name": "NewUser"}})
+    )
+    channel.received.put_nowait(json.dumps({"type": "chat-message", "form_data": {"content": ""}}))
+    handler = asyncio.create_task(channels.form_validation(channel))
+    try:
+        while len(channel.sent) < 1:
+            await asyncio.sleep(0.01)
+        assert channel.sent[0].payload["form_data"] == {"content": ""}
+        channel.received.put_nowait(
+            json.dumps({"type": "create-user", "form_data": {"user_name": "NewUser1"}})
+        )
+        while len(channel.sent) < 2:
+            await asyncio.sleep(0.01)
+        assert channel.sent[1].payload["form_data"] == {"user_name": "NewUser1"}
+        assert not channel.sent[1].payload["validation_failed"]
+        channel.received.put_nowait(
+            json.dumps({"type": "create-user", "form_data": {"user_name": "NewUser2"}})
+        )
+        await asyncio.sleep(0)
+    finally:
+        handler.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await handler
+    assert not [
+        task
+        for task in asyncio.all_tasks()
+        if task.get_coro().__qualname__.endswith("validate_pending")
+    ]
+
+
+async def test_form_validation_logs_rule_counters_on_close(monkeypatch):
+    """Closing the form-validation channel should log the rule counters of the form types
+    the client sent."""
+
+    logged = []
+    monkeypatch.setattr(logs, "debug", lambda logger, payload, err=None: logged.append(payload))
+    channel = ScriptedChannel()
+    channel.received.put_nowait(json.dumps({"type": "chat-message", "form_data": {"content": ""}}))
+    handler = asyncio.create_task(channels.form_validation(channel))
+    while len(channel.sent) < 1:
+        await asyncio.sleep(0.01)
+    handler.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await handler
+    (closed,) = [payload for payload in logged if payload["msg"] == "Form validation closed"]
+    assert list(closed["rules"]) == ["chat-message"]
+    assert closed["rules"]["chat-message"]["content is text"]["calls"] >= 1
@@ -0,0 +1,98 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from pykcworkshop import chat, utils
+from pykcworkshop.chat.api.websockets import history
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+async def _from_db(room_id: str, reference: datetime.datetime, limit: int, newer: bool) -> list:
+    async with chat.db.get_session() as session:
+        rows = await chat.db.get_chat_history(
+            session, room_id=room_id, reference=reference, limit=limit, newer=newer
+        )
+    return [
+        {"user_name": user_name, "content": content, "timestamp": timestamp.isoformat()}
+        for user_name, content, timestamp in rows
+    ]
+
+
+async def test_first_page_matches_db(fixt_test_room):
+    """The history cache should load a room on its first page and then answer the first
+    page and scroll-back requests exactly like the db would."""
+
+    test_room = await fixt_test_room()
+    cache = history.HistoryCache()
+    now = utils.now()
+    pages = await asyncio.gather(*[cache.get(test_room.id, now, 5, False) for _ in range(10)])
+    assert all(page is not None for page in pages)
+    assert json.loads(pages[0].data) == await _from_db(test_room.id, now, 5, False)
+    oldest = datetime.datetime.fromisoformat(json.loads(pages[0].data)[-1]["timestamp"])
+    scroll_back = await cache.get(test_room.id, oldest, 100, False)
+    assert json.loads(scroll_back.data) == await _from_db(test_room.id, oldest, 100, False)
+    assert cache.misses == 0
+
+
+async def test_new_messages_update_the_cache(fixt_test_room):
+    """Chat messages broadcast in a cached room should show up in its first page without a
+    reload, and an invalidated room should be reloaded from the db."""
+
+    test_room = await fixt_test_room()
+    cache = history.HistoryCache()
+    await cache.get(test_room.id, utils.now(), 5, False)
+    message = {"user_name": "Testy", "content": "Fresh", "timestamp": utils.now().isoformat()}
+    cache.record(test_room.id, Frame(message))
+    page = await cache.get(test_room.id, utils.now(), 1, False)
+    assert json.loads(page.data) == [message]
+    cache.discard(test_room.id)
+    page = await cache.get(test_room.id, utils.now(), 1, False)
+    assert json.loads(page.data) != [message]
+
+
+async def test_misses_fall_back_to_the_db(fixt_test_room, monkeypatch):
+    """Requests that reach past the cached messages or into rooms that were evicted should
+    be left to the db."""
+
+    monkeypatch.setattr(history, "CACHE_SIZE", 3)
+    monkeypatch.setattr(history, "MAX_ROOMS", 1)
+    test_room = await fixt_test_room()
+    cache = history.HistoryCache()
+    now = utils.now()
+    assert await cache.get(test_room.id, now, 3, False) is not None
+    assert await cache.get(test_room.id, now, 4, False) is None
+    assert await cache.get(test_room.id, now - datetime.timedelta(days=1), 1, True) is None
+    await cache.get("other-room", now, 1, False)
+    assert await cache.get(test_room.id, now - datetime.timedelta(days=1), 1, False) is None
+    assert cache.misses == 3
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_messages_waiting_to_be_written_are_loaded(fixt_testy, fixt_test_room):
+    """A message broadcast in an uncached room right before its first page is requested
+    should be in that page, even though it hasn't been written to the db yet, and messages
+    that only look the same should all be kept."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    cache = history.HistoryCache()
+    writer = chat.db.writer.ChatMessageWriter(max_delay=60)
+    timestamp = utils.now()
+    message = {"user_name": "Testy", "content": "Again", "timestamp": timestamp.isoformat()}
+    await writer.submit(
+        author_id=testy.id, room_id=test_room.id, content="Again", timestamp=timestamp
+    )
+    cache.record(test_room.id, Frame(message))
+    page = await cache.get(test_room.id, utils.now(), 1, False)
+    assert json.loads(page.data) == [message]
+
+    # The same message sent again, while the first one has been written.
+    await writer.stop()
+    cache = history.HistoryCache()
+    cache.record(test_room.id, Frame(message))
+    cache.record(test_room.id, Frame(message))
+    page = await cache.get(test_room.id, utils.now(), 3, False)
+    assert json.loads(page.data)[:2] == [message, message]
+    assert json.loads(page.data)[2] != message
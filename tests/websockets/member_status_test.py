@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import websockets
@@ -24,3 +25,73 @@ async def test_member_status_disconnection(
     assert data["user_id"] == testy.id
     assert data["user_name"] == testy.name
     assert data["user_status"] == "Offline"
+
+
+async def test_member_status_snapshot_on_connect(
+    fixt_test_room, fixt_testier, fixt_ws_headers_testy, fixt_ws_headers_testier
+):
+    """The member status websocket connection should send a newly connected client a single
+    snapshot of the statuses of the other members already present in the room."""
+
+    test_room = await fixt_test_room()
+    testier = await fixt_testier()
+    sock_url = f"{utils.get_domain().replace('http', 'ws')}\
+/chat/api/v1/room/{test_room.id}/member-status"
+    first_connection = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testier)
+    status = {"user_id": testier.id, "user_name": testier.name, "user_status": "Typing"}
+    await first_connection.send(json.dumps(status))
+    await first_connection.recv()
+    second_connection = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    msg = await second_connection.recv()
+    await second_connection.close()
+    await first_connection.close()
+    data = json.loads(msg)
+    assert len(data) == 1
+    for key, value in status.items():
+        assert data[0][key] == value
+    assert "last_changed" in data[0]
+
+
+async def test_member_status_stays_online_with_another_connection(
+    fixt_test_room, fixt_testy, fixt_ws_headers_testy, fixt_ws_headers_testier
+):
+    """A user who is connected to a room more than once should only go offline when their
+    last connection closes."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    sock_url = f"{utils.get_domain().replace('http', 'ws')}\
+/chat/api/v1/room/{test_room.id}/member-status"
+    observer = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testier)
+    first_tab = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    second_tab = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    await first_tab.close()
+    await asyncio.sleep(0.1)
+    status = {"user_id": testy.id, "user_name": testy.name, "user_status": "Typing"}
+    await second_tab.send(json.dumps(status))
+    assert json.loads(await observer.recv()) == status
+    await second_tab.close()
+    assert json.loads(await observer.recv())["user_status"] == "Offline"
+    await observer.close()
+
+
+async def test_member_status_of_another_user_is_rejected(
+    fixt_test_room, fixt_testy, fixt_testier, fixt_ws_headers_testy, fixt_ws_headers_testier
+):
+    """A status sent for another user should not be broadcast."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    testier = await fixt_testier()
+    sock_url = f"{utils.get_domain().replace('http', 'ws')}\
+/chat/api/v1/room/{test_room.id}/member-status"
+    observer = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testier)
+    sender = await websockets.connect(sock_url, extra_headers=fixt_ws_headers_testy)
+    spoofed = {"user_id": testier.id, "user_name": testier.name, "user_status": "Typing"}
+    own = {"user_id": testy.id, "user_name": testy.name, "user_status": "Online"}
+    await sender.send(json.dumps(spoofed))
+    await sender.send(json.dumps(own))
+    msg = await observer.recv()
+    await sender.close()
+    await observer.close()
+    assert json.loads(msg) == own
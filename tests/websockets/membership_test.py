@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import tests
+from pykcworkshop import chat
+from pykcworkshop.chat import membership
+
+
+async def test_members_are_checked_from_memory(fixt_testy, fixt_testier, fixt_test_room):
+    """The membership index should load a room with one query for a burst of checks and
+    then answer checks for its members without going to the db."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    testier = await fixt_testier()
+    index = membership.MembershipIndex()
+    with tests.helpers.count_queries() as queries:
+        checks = await asyncio.gather(*[index.is_member(test_room.id, testy.id) for _ in range(10)])
+    assert all(checks)
+    assert len(queries) == 1
+    with tests.helpers.count_queries() as queries:
+        assert await index.is_member(test_room.id, testier.id)
+        assert await index.is_member(test_room.id, testy.id)
+    assert queries == []
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_non_members_are_rechecked(fixt_testy, fixt_testiest, fixt_test_room):
+    """A user who isn't in the cached members of a room should be looked up in the db again
+    with a single point query, so a join the index missed doesn't lock them out."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    testiest = await fixt_testiest()
+    index = membership.MembershipIndex()
+    assert await index.is_member(test_room.id, testy.id)
+    with tests.helpers.count_queries() as queries:
+        assert not await index.is_member(test_room.id, testiest.id)
+    assert len(queries) == 1
+    assert "room_member.member_id = " in queries[0]
+    async with chat.db.get_session() as session:
+        await chat.db.add_user_to_room(session, user_id=testiest.id, room_id=test_room.id)
+        await session.commit()
+    with tests.helpers.count_queries() as queries:
+        assert await index.is_member(test_room.id, testiest.id)
+    assert len(queries) == 1
+    with tests.helpers.count_queries() as queries:
+        assert await index.is_member(test_room.id, testiest.id)
+    assert queries == []
+    assert not await index.is_member("not-a-room", testy.id)
+
+
+async def test_failed_load_fails_every_waiter(fixt_testy, fixt_test_room, monkeypatch):
+    """When loading a room's members fails, every check waiting for the load should get the
+    same error instead of being turned away, and the next check should load the room again."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    get_room_member_ids = chat.db.get_room_member_ids
+    calls = 0
+
+    async def failing_query(session, room_id):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(0.01)
+            raise OperationalError("SELECT", None, sqlite3.OperationalError("database is locked"))
+        return await get_room_member_ids(session, room_id)
+
+    monkeypatch.setattr(chat.db, "get_room_member_ids", failing_query)
+    index = membership.MembershipIndex()
+    checks = await asyncio.gather(
+        index.is_member(test_room.id, testy.id),
+        index.is_member(test_room.id, testy.id),
+        return_exceptions=True,
+    )
+    assert [type(check) for check in checks] == [OperationalError, OperationalError]
+    assert calls == 1
+    assert await index.is_member(test_room.id, testy.id)
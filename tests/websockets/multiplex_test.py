@@ -0,0 +1,146 @@
+import json
+
+import pytest
+import websockets
+
+from pykcworkshop import chat, utils
+
+
+@pytest.fixture
+async def fixt_v2_url():
+    return f"{utils.get_domain().replace('http', 'ws')}/chat/api/v2/socket"
+
+
+async def _recv_envelope(conn, op: str, ch: str | None) -> dict:
+    """Receive envelopes until one with the given `op` and `ch` arrives."""
+
+    while True:
+        envelope = json.loads(await conn.recv())
+        if envelope["op"] == op and envelope["ch"] == ch:
+            return envelope
+
+
+async def _subscribe(conn, ch: str) -> None:
+    await conn.send(json.dumps({"op": "subscribe", "ch": ch}))
+    await _recv_envelope(conn, "subscribed", ch)
+
+
+async def test_v2_requires_auth(fixt_v2_url):
+    """The multiplexed websocket should return a 401 response if accessed without a valid
+    user token."""
+
+    headers = {"Sec-WebSocket-Protocol": f"Bearerbad_token, csrf{chat.tokens.generate_csrf()}"}
+    try:
+        await websockets.connect(fixt_v2_url, extra_headers=headers)
+    except websockets.exceptions.InvalidStatusCode as e:
+        assert e.status_code == 401
+    else:
+        assert False, "Did not raise"
+
+
+async def test_v2_channels_share_one_connection(
+    fixt_v2_url, fixt_testy, fixt_test_room, fixt_ws_headers_testy
+):
+    """Several channels should be usable over one multiplexed connection, and every message
+    should be delivered in an envelope naming its channel."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    chat_ch = f"room/{test_room.id}/chat-message"
+    sync_ch = f"room/{test_room.id}/client-sync"
+    conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testy)
+    await _subscribe(conn, chat_ch)
+    await _subscribe(conn, sync_ch)
+    payload = {"user_name": testy.name, "content": "Multiplexed hello"}
+    await conn.send(json.dumps({"op": "send", "ch": chat_ch, "data": json.dumps(payload)}))
+    await conn.send(json.dumps({"op": "send", "ch": sync_ch, "data": "member-status"}))
+    chat_envelope = await _recv_envelope(conn, "message", chat_ch)
+    sync_envelope = await _recv_envelope(conn, "message", sync_ch)
+    await conn.close()
+    data = json.loads(chat_envelope["data"])
+    for key, value in payload.items():
+        assert data[key] == value
+    assert "timestamp" in data
+    assert sync_envelope["data"] == "member-status"
+
+
+async def test_v2_interoperates_with_v1(
+    fixt_v2_url, fixt_testier, fixt_test_room, fixt_ws_headers_testy, fixt_ws_headers_testier
+):
+    """Messages sent on a v1 websocket should reach the subscribers of the same channel on
+    multiplexed connections."""
+
+    testier = await fixt_testier()
+    test_room = await fixt_test_room()
+    chat_ch = f"room/{test_room.id}/chat-message"
+    v2_conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testy)
+    await _subscribe(v2_conn, chat_ch)
+    v1_url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/{chat_ch}"
+    v1_conn = await websockets.connect(v1_url, extra_headers=fixt_ws_headers_testier)
+    await v1_conn.send(json.dumps({"user_name": testier.name, "content": "From v1"}))
+    envelope = await _recv_envelope(v2_conn, "message", chat_ch)
+    await v1_conn.close()
+    await v2_conn.close()
+    assert json.loads(envelope["data"])["content"] == "From v1"
+
+
+async def test_v2_unsubscribe_runs_channel_cleanup(
+    fixt_v2_url, fixt_testy, fixt_test_room, fixt_ws_headers_testy, fixt_ws_headers_testier
+):
+    """Unsubscribing from a channel should close only that channel and run the same cleanup
+    as disconnecting the equivalent v1 websocket."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    status_ch = f"room/{test_room.id}/member-status"
+    testy_conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testy)
+    testier_conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testier)
+    await _subscribe(testier_conn, status_ch)
+    await _subscribe(testy_conn, status_ch)
+    await testy_conn.send(json.dumps({"op": "unsubscribe", "ch": status_ch}))
+    await _recv_envelope(testy_conn, "unsubscribed", status_ch)
+    envelope = await _recv_envelope(testier_conn, "message", status_ch)
+    await testy_conn.close()
+    await testier_conn.close()
+    data = json.loads(envelope["data"])
+    assert data["user_id"] == testy.id
+    assert data["user_status"] == "Offline"
+
+
+async def test_v2_tagged_channels(fixt_v2_url, fixt_ws_headers_testy):
+    """The same channel should be openable more than once on a connection by tagging its
+    name, and each copy should only answer its own messages."""
+
+    conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testy)
+    await _subscribe(conn, "form-validation#room")
+    await _subscribe(conn, "form-validation#dm")
+    for ch, length in [("form-validation#room", 10), ("form-validation#dm", 1000)]:
+        form = {"type": "chat-message", "form_data": {"content": "c" * length}}
+        await conn.send(json.dumps({"op": "send", "ch": ch, "data": json.dumps(form)}))
+    room_result = json.loads(
+        (await _recv_envelope(conn, "message", "form-validation#room"))["data"]
+    )
+    dm_result = json.loads((await _recv_envelope(conn, "message", "form-validation#dm"))["data"])
+    await conn.close()
+    assert not room_result["validation_failed"]
+    assert dm_result["validation_failed"]
+
+
+async def test_v2_rejects_bad_envelopes(fixt_v2_url, fixt_ws_headers_testy):
+    """The multiplexed websocket should answer malformed envelopes, unknown channels, and
+    messages for channels that aren't open with an error envelope without closing the
+    connection."""
+
+    conn = await websockets.connect(fixt_v2_url, extra_headers=fixt_ws_headers_testy)
+    await conn.send("not json")
+    assert (await _recv_envelope(conn, "error", None))["reason"] == "Malformed envelope"
+    await conn.send(json.dumps({"op": "subscribe", "ch": "no/such/channel"}))
+    assert (await _recv_envelope(conn, "error", "no/such/channel"))["reason"] == "Unknown channel"
+    await conn.send(json.dumps({"op": "send", "ch": "form-validation", "data": "{}"}))
+    assert (await _recv_envelope(conn, "error", "form-validation"))["reason"] == "Not subscribed"
+    await conn.send(json.dumps({"op": "subscribe", "ch": "abc/direct-message"}))
+    assert (await _recv_envelope(conn, "error", "abc/direct-message"))[
+        "reason"
+    ] == "Invalid user id"
+    await _subscribe(conn, "form-validation")
+    await conn.close()
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import tests
+from pykcworkshop import chat
+from pykcworkshop.chat import names
+from pykcworkshop.chat.api.websockets import validation
+
+
+async def test_taken_names_are_checked_from_memory(fixt_testy, fixt_test_room):
+    """Form validation should answer whether a name is taken without going to the db once
+    the name index is loaded, ignoring the case of ASCII letters."""
+
+    testy = await fixt_testy()
+    test_room = await fixt_test_room()
+    await names.index.load()
+    with tests.helpers.count_queries() as queries:
+        assert await validation.validate_create_user({"user_name": testy.name.upper()})
+        assert not await validation.validate_create_user({"user_name": "Not Testy"})
+        assert await validation.validate_create_room(
+            {"room_name": test_room.name.lower(), "user_id": testy.id}
+        )
+        assert not await validation.validate_create_room(
+            {"room_name": test_room.name, "user_id": testy.id + 1000}
+        )
+    assert queries == []
+
+
+@pytest.mark.usefixtures("reset_db")
+@pytest.mark.parametrize("user_name", ["Testy", "TESTY", "tEsTy", "Testy ", "Tésty", "ÄÖÜ", "äöü"])
+async def test_name_index_agrees_with_unique_constraint(user_name):
+    """The name index should report a name as taken exactly when the unique constraint on
+    the name column rejects it."""
+
+    index = names.NameIndex()
+    async with chat.db.get_session() as session:
+        await chat.db.create_user(session, user_name="ÄÖÜ")
+        await session.commit()
+    taken = await index.is_user_name_taken(user_name)
+    try:
+        async with chat.db.get_session() as session:
+            await chat.db.create_user(session, user_name=user_name)
+            await session.commit()
+    except IntegrityError:
+        assert taken
+    else:
+        assert not taken
+
+
+@pytest.mark.usefixtures("reset_db")
+async def test_name_index_answers_misses_from_memory(fixt_testy, monkeypatch):
+    """Once loaded, the name index should answer every check from memory, including checks
+    for names that aren't taken, and names announced by the routes should be seen straight
+    away."""
+
+    testy = await fixt_testy()
+    index = names.NameIndex()
+    monkeypatch.setattr(names, "index", index)
+    assert not await index.is_user_name_taken("Nobody")
+    async with chat.db.get_session() as session:
+        await chat.db.create_room(session, room_name="Fresh Room", creator_id=testy.id)
+        await session.commit()
+    with tests.helpers.count_queries() as queries:
+        for _ in range(10):
+            assert not await index.is_user_name_taken("Nobody")
+            assert not await index.is_room_name_taken(testy.id, "Fresh Room")
+        names.announce_room_name(testy.id, "Fresh Room")
+        names.announce_user_name("Somebody")
+        assert await index.is_room_name_taken(testy.id, "FRESH ROOM")
+        assert await index.is_user_name_taken("somebody")
+    assert queries == []
+    assert index.loads == 1
@@ -0,0 +1,62 @@
+import asyncio
+
+from pykcworkshop.chat.api.websockets import broker, channels
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+class StalledChannel(channels.Channel):
+    """A channel whose client never reads anything after the first frame."""
+
+    def __init__(self) -> None:
+        self.name = "stalled"
+        self.sent: list[Frame] = []
+        self.disconnected = asyncio.Event()
+        self.unstall = asyncio.Event()
+
+    async def accept(self, encoder=None) -> None:
+        pass
+
+    async def send(self, frame: Frame) -> None:
+        self.sent.append(frame)
+        await self.unstall.wait()
+
+    async def disconnect(self) -> None:
+        self.disconnected.set()
+
+
+async def test_slow_consumer_is_disconnected():
+    """A channel with the disconnect policy should disconnect a client that lets its outbox
+    overflow without ever blocking the publisher, even while the client isn't reading."""
+
+    channel = StalledChannel()
+    async with channel.open(broker.Overflow.DISCONNECT, maxsize=4) as outbox:
+        outbox.deliver(Frame(0))
+        while not channel.sent:
+            await asyncio.sleep(0)
+        for i in range(1, 10):
+            outbox.deliver(Frame(i))
+        assert outbox.overflowed
+        await asyncio.wait_for(channel.disconnected.wait(), 1)
+        assert [frame.payload for frame in channel.sent] == [0]
+        assert outbox.dropped == 5
+
+
+async def test_slow_consumer_drops_oldest():
+    """A channel with the drop-oldest policy should keep its client connected and send only
+    the most recent frames once the client catches up."""
+
+    channel = StalledChannel()
+    async with channel.open(broker.Overflow.DROP_OLDEST, maxsize=4) as outbox:
+        outbox.deliver(Frame(0))
+        while not channel.sent:
+            await asyncio.sleep(0)
+        for i in range(1, 10):
+            outbox.deliver(Frame(i))
+        channel.unstall.set()
+        while outbox.depth:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert not channel.disconnected.is_set()
+        assert [frame.payload for frame in channel.sent] == [0, 6, 7, 8, 9]
+        assert outbox.dropped == 5
+        assert outbox.peak_depth == 4
@@ -0,0 +1,57 @@
+from pykcworkshop.chat import presence
+
+
+def test_presence_tracks_latest_status():
+    """The presence registry should keep the latest status of each member in a room and
+    only update the time of the last change when the status changes."""
+
+    registry = presence.PresenceRegistry()
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Online"})
+    first_change = registry.snapshot("room")[0]["last_changed"]
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Online"})
+    assert registry.snapshot("room")[0]["last_changed"] == first_change
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Typing"})
+    registry.update("room", {"user_id": 2, "user_name": "Testier", "user_status": "Online"})
+    snapshot = sorted(registry.snapshot("room"), key=lambda status: status["user_id"])
+    assert [(status["user_id"], status["user_status"]) for status in snapshot] == [
+        (1, "Typing"),
+        (2, "Online"),
+    ]
+    assert [status["user_id"] for status in registry.snapshot("room", exclude_user_id=1)] == [2]
+    assert registry.snapshot("other-room") == []
+
+
+def test_offline_members_are_removed():
+    """An offline member should be removed from the room, and the room should be dropped
+    once its last member goes offline."""
+
+    registry = presence.PresenceRegistry()
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Online"})
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Offline"})
+    assert registry.snapshot("room") == []
+    assert "room" not in registry._rooms
+
+
+def test_malformed_statuses_are_ignored():
+    """Messages that aren't member-status messages should not change the registry."""
+
+    registry = presence.PresenceRegistry()
+    for status in [{"user_id": "abc", "user_name": "Testy", "user_status": "Online"}, {}, []]:
+        registry.update("room", status)  # type: ignore[arg-type]
+    assert registry.snapshot("room") == []
+
+
+def test_members_stay_while_they_have_a_connection():
+    """A relayed offline status should not remove a member who is still connected to the
+    room in this process, and only their last connection should count as leaving."""
+
+    registry = presence.PresenceRegistry()
+    registry.connect("room", 1)
+    registry.connect("room", 1)
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Online"})
+    assert registry.disconnect("room", 1) is False
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Offline"})
+    assert [status["user_id"] for status in registry.snapshot("room")] == [1]
+    assert registry.disconnect("room", 1) is True
+    registry.update("room", {"user_id": 1, "user_name": "Testy", "user_status": "Offline"})
+    assert registry.snapshot("room") == []
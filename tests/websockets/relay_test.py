@@ -0,0 +1,139 @@
+import asyncio
+import sys
+
+import pytest
+
+from pykcworkshop.chat.api.websockets import broker, relay
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="Requires Unix domain sockets")
+
+
+@pytest.fixture
+async def fixt_relays(tmp_path):
+    """Three relay backends sharing one socket path, standing in for three workers."""
+
+    path = str(tmp_path / "broker.sock")
+    inboxes: list[list[tuple[str, str, str | bytes]]] = [[], [], []]
+
+    def _make_deliver(inbox):
+        def _deliver(channel, room_id, frame):
+            inbox.append((channel, room_id, frame.data))
+            return 1
+
+        return _deliver
+
+    relays = [relay.UnixSocketRelay(path, deliver=_make_deliver(inbox)) for inbox in inboxes]
+    for backend in relays:
+        await backend.start()
+    async with asyncio.timeout(5):
+        while not all(backend.is_connected for backend in relays):
+            await asyncio.sleep(0.01)
+    yield relays, inboxes
+    for backend in relays:
+        await backend.stop()
+
+
+async def _wait_for(inboxes, count):
+    async with asyncio.timeout(5):
+        while sum(len(inbox) for inbox in inboxes) < count:
+            await asyncio.sleep(0.01)
+
+
+async def test_single_hub_is_elected(fixt_relays):
+    """Exactly one worker should act as the relay hub."""
+
+    relays, _ = fixt_relays
+    assert sum(backend.is_hub for backend in relays) == 1
+
+
+async def test_frames_reach_every_other_worker(fixt_relays):
+    """A frame published in one worker should be delivered once to each of the other workers
+    and not be echoed back to the publishing worker."""
+
+    relays, inboxes = fixt_relays
+    relays[1].publish("chat-message", "room", Frame.raw('{"content": "hello"}'))
+    relays[1].publish("client-sync", "room", Frame.raw(b"\x00binary"))
+    await _wait_for(inboxes, 4)
+    await asyncio.sleep(0.1)
+    assert inboxes[1] == []
+    for inbox in (inboxes[0], inboxes[2]):
+        assert inbox == [
+            ("chat-message", "room", '{"content": "hello"}'),
+            ("client-sync", "room", b"\x00binary"),
+        ]
+
+
+async def test_new_hub_is_elected_when_hub_exits(fixt_relays):
+    """When the hub worker stops, the remaining workers should elect a new hub and keep
+    relaying frames between each other."""
+
+    relays, inboxes = fixt_relays
+    hub = next(backend for backend in relays if backend.is_hub)
+    await hub.stop()
+    survivors = [backend for backend in relays if backend is not hub]
+    async with asyncio.timeout(5):
+        while not (
+            sum(backend.is_hub for backend in survivors) == 1
+            and all(backend.is_connected for backend in survivors)
+        ):
+            await asyncio.sleep(0.01)
+    survivors[0].publish("member-status", "room", Frame.raw("status"))
+    survivor_inboxes = [inboxes[relays.index(backend)] for backend in survivors]
+    await _wait_for(survivor_inboxes, 1)
+    assert survivor_inboxes[1] == [("member-status", "room", "status")]
+
+
+async def test_failed_deliveries_do_not_stop_the_relay(tmp_path):
+    """A relayed frame that a broker listener fails on should be skipped without stopping
+    the worker from receiving the frames after it."""
+
+    room_broker = broker.Broker("test-relay")
+    received = []
+
+    def listener(room_id, frame):
+        if frame.data == "boom":
+            raise ValueError("Listener failed")
+        received.append(frame.data)
+
+    room_broker.add_listener(listener)
+    path = str(tmp_path / "broker.sock")
+    relays = [relay.UnixSocketRelay(path), relay.UnixSocketRelay(path)]
+    for backend in relays:
+        await backend.start()
+    try:
+        async with asyncio.timeout(5):
+            while not all(backend.is_connected for backend in relays):
+                await asyncio.sleep(0.01)
+            relays[0].publish("test-relay", "room", Frame.raw("boom"))
+            relays[0].publish("test-relay", "room", Frame.raw("after"))
+            while not received:
+                await asyncio.sleep(0.01)
+        assert received == ["after"]
+        assert all(backend.is_connected for backend in relays)
+    finally:
+        for backend in relays:
+            await backend.stop()
+
+
+async def test_failed_hub_start_is_retried(tmp_path, monkeypatch):
+    """A worker that fails to start the hub should release the hub lock and try again."""
+
+    start = relay._Hub.start
+    failures = [OSError("Address in use")]
+
+    async def flaky_start(self):
+        if failures:
+            raise failures.pop()
+        await start(self)
+
+    monkeypatch.setattr(relay._Hub, "start", flaky_start)
+    backend = relay.UnixSocketRelay(str(tmp_path / "broker.sock"))
+    await backend.start()
+    try:
+        async with asyncio.timeout(5):
+            while not (backend.is_hub and backend.is_connected):
+                await asyncio.sleep(0.01)
+        assert failures == []
+    finally:
+        await backend.stop()
@@ -0,0 +1,67 @@
+import json
+
+import websockets
+
+from pykcworkshop import utils
+from pykcworkshop.chat.api.websockets import replay
+from pykcworkshop.chat.api.websockets.frames import Frame
+
+
+def _record(buffer: replay.ReplayBuffer, room_id: str, count: int) -> list[str]:
+    return [
+        buffer.record(room_id, Frame({"content": str(i)})).payload["cursor"] for i in range(count)
+    ]
+
+
+async def test_resume_from_memory():
+    """Resuming after a cursor should return the messages sent after it in order, up to the
+    limit, without any messages from other rooms."""
+
+    buffer = replay.ReplayBuffer()
+    cursors = _record(buffer, "room", 5)
+    _record(buffer, "other-room", 5)
+    missed = buffer.after("room", cursors[1], limit=2)
+    assert [message["content"] for message in missed] == ["2", "3"]
+    assert [message["cursor"] for message in missed] == cursors[2:4]
+    assert buffer.after("room", cursors[-1], limit=10) == []
+
+
+async def test_evicted_and_foreign_cursors_fall_back(monkeypatch):
+    """Resuming should report a miss for cursors whose messages were evicted and for cursors
+    issued by another process."""
+
+    monkeypatch.setattr(replay, "ROOM_SIZE", 4)
+    monkeypatch.setattr(replay, "MAX_ROOMS", 1)
+    buffer = replay.ReplayBuffer()
+    cursors = _record(buffer, "room", 6)
+    assert buffer.after("room", cursors[0], limit=10) is None
+    assert len(buffer.after("room", cursors[1], limit=10)) == 4
+    assert buffer.after("room", "x" + cursors[1], limit=10) is None
+    assert buffer.after("room", "garbage", limit=10) is None
+    _record(buffer, "other-room", 1)
+    assert buffer.after("room", cursors[-1], limit=10) is None
+
+
+async def test_reconnect_catch_up(fixt_ws_headers_testy, fixt_test_room, fixt_testy):
+    """A client that reconnects with the cursor of the last message it saw should receive
+    the messages it missed."""
+
+    test_room = await fixt_test_room()
+    testy = await fixt_testy()
+    base_url = f"{utils.get_domain().replace('http', 'ws')}/chat/api/v1/room/{test_room.id}"
+    async with websockets.connect(
+        f"{base_url}/chat-message", extra_headers=fixt_ws_headers_testy
+    ) as conn:
+        received = []
+        for i in range(3):
+            await conn.send(json.dumps({"user_name": testy.name, "content": f"Missed {i}"}))
+            received.append(json.loads(await conn.recv()))
+    async with websockets.connect(
+        f"{base_url}/chat-history", extra_headers=fixt_ws_headers_testy
+    ) as conn:
+        last_seen = received[0]
+        await conn.send(
+            json.dumps({"timestamp": 0, "chunk_size": 10, "after": last_seen["cursor"]})
+        )
+        missed = json.loads(await conn.recv())
+    assert missed == received[1:]
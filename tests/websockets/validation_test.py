@@ -0,0 +1,65 @@
+from pykcworkshop.chat import constants
+from pykcworkshop.chat.api.websockets import validation
+
+
+async def test_cheap_rules_run_first():
+    """A form should check its rules from the cheapest tier up, whatever order they were
+    declared in, and stop at the first rule that fails."""
+
+    checked = []
+
+    def rule(name: str, tier: validation.Tier, failure_reason: str = "") -> validation.Rule:
+        def check(form_data: dict) -> str:
+            checked.append(name)
+            return failure_reason
+
+        return validation.Rule(name, tier, check)
+
+    lookup = rule("lookup", validation.Tier.LOOKUP)
+    form = validation.Form(
+        lookup,
+        rule("length", validation.Tier.LENGTH, "Too long"),
+        rule("shape", validation.Tier.SHAPE),
+    )
+    assert await form({}) == "Too long"
+    assert checked == ["shape", "length"]
+    assert lookup.calls == 0
+
+
+async def test_length_limits_come_from_columns():
+    """The length rules should use the character limits of the db columns the fields are
+    saved in."""
+
+    too_long_name = "c" * (constants.NAME_LENGTH + 1)
+    assert await validation.validate_create_user({"user_name": too_long_name}) == (
+        f"User name must be at most {constants.NAME_LENGTH} characters"
+    )
+    assert await validation.validate_create_room({"room_name": too_long_name, "user_id": 1})
+    assert await validation.validate_chat_message({"content": "c" * 512}) == ""
+    assert await validation.validate_chat_message({"content": "c" * 513})
+
+
+async def test_rules_count_calls_and_time():
+    """Every rule should count how often it ran, how often it failed, and how long it took."""
+
+    form = validation.validate_chat_message
+    before = [(rule.calls, rule.failures, rule.seconds) for rule in form.rules]
+    await form({"content": "Some chat message text"})
+    await form({"content": None})
+    after = [(rule.calls, rule.failures, rule.seconds) for rule in form.rules]
+    (shape_calls, shape_failures, shape_seconds), (length_calls, length_failures, _) = [
+        (a[0] - b[0], a[1] - b[1], a[2] - b[2]) for a, b in zip(after, before)
+    ]
+    assert (shape_calls, shape_failures) == (2, 1)
+    assert (length_calls, length_failures) == (1, 0)
+    assert shape_seconds > 0
+    assert form.stats()["content is text"]["calls"] == after[0][0]
+
+
+async def test_is_int_rejects_bools():
+    """The integer rule should reject booleans, even though they are ints in Python."""
+
+    form = validation.Form(validation.is_int("user_id", "Invalid user"))
+    assert await form({"user_id": 1}) == ""
+    assert await form({"user_id": True}) == "Invalid user"
+    assert await form({"user_id": "1"}) == "Invalid user"